@@ -0,0 +1,50 @@
+""" Compare the column-wise GaitCycleBatch with the original object array of GaitCycle instances
+
+The baseline keeps one GaitCycle per row, each holding a reference to its FloorRecording, so pickling it drags every
+recording along.
+
+Run from the python/ directory with:
+
+    python -m benchmarks.batch [path] [repeats]
+"""
+import pickle
+import re
+import sys
+
+import numpy as np
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def legacy_partition(cycles, pattern):
+    """The original `partition_names`: two list comprehensions over the cycle objects"""
+    regex_hit = re.compile(pattern)
+    return (np.array([cycle for cycle in cycles if regex_hit.match(cycle.name)]),
+            np.array([cycle for cycle in cycles if not regex_hit.match(cycle.name)]))
+
+
+def legacy_with_style(cycles, style):
+    """Select cycles by re-parsing each cycle's name, as results.py did with the object array"""
+    return np.array([cycle for cycle in cycles if cycle.name.split('_')[1] == style])
+
+
+def main(path='data/1_131.2lbs.csv', repeats=5):
+    for n in (3, 30):
+        floors = [sf.FloorRecording.from_csv(path, trimmed=True, name=f'{i}_normal_1') for i in range(1, n + 1)]
+        legacy = np.array([cycle for floor in floors for cycle in floor.gait_cycles])
+        batch = sf.GaitCycleBatch.from_floors(floors)
+        assert np.allclose(np.array([cycle.features for cycle in legacy]), batch.features, atol=1e-6)
+        kb_before = len(pickle.dumps(legacy)) / len(legacy) / 1024
+        kb_after = len(pickle.dumps(batch)) / len(batch) / 1024
+        ms_before = best_time(lambda: legacy_partition(legacy, r'1_.*'), repeats)
+        ms_after = best_time(lambda: batch.partition_names(r'1_.*'), repeats)
+        ms_style_before = best_time(lambda: legacy_with_style(legacy, 'normal'), repeats)
+        ms_style_after = best_time(lambda: batch[batch.styles == 'normal'], repeats)
+        print(f'  {len(batch):5d} cycles: pickled {kb_before:8.1f} KiB -> {kb_after:4.2f} KiB per cycle, '
+              f'partition {ms_before:5.2f} ms -> {ms_after:5.2f} ms, '
+              f'style {ms_style_before:5.2f} ms -> {ms_style_after:5.2f} ms')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
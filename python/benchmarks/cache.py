@@ -0,0 +1,35 @@
+""" Memory held by reify properties over a batch of recordings, with and without a cache budget
+
+Run from the python/ directory with:
+
+    python -m benchmarks.cache [path] [n_floors]
+"""
+import sys
+
+import smartfloor as sf
+
+
+def process(floors):
+    """Touch the signals footstep detection needs, then the COP again as later analysis would"""
+    peak = 0
+    for floor in floors:
+        floor.extrema_markers
+        peak = max(peak, sf.reify_cache.nbytes())
+    for floor in floors:
+        floor.cop
+    return peak
+
+
+def main(path='data/1_131.2lbs.csv', n_floors=20):
+    for max_bytes in (None, 4 << 20):
+        sf.reify_cache.release()
+        sf.reify_cache.max_bytes = max_bytes
+        floors = [sf.FloorRecording.from_csv(path) for _ in range(n_floors)]
+        sf.reify_cache.hits = sf.reify_cache.misses = sf.reify_cache.evictions = 0
+        peak = process(floors)
+        budget = 'unbounded' if max_bytes is None else f'{max_bytes / 1e6:.1f} MB budget'
+        print(f'  {n_floors} floors, {budget:<14} peak {peak / 1e6:6.2f} MB held, {sf.reify_cache.stats()}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
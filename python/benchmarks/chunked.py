@@ -0,0 +1,54 @@
+""" Time and memory-profile chunked processing against loading the whole recording, on the sample recording and on
+synthetic recordings of growing duration
+
+Footsteps and gait cycles of both are checked to be identical. The in-memory peak grows with the recording, the
+chunked peak should level off once the recording is longer than one chunk of packets.
+
+Run from the python/ directory with:
+
+    python -m benchmarks.chunked [path] [repeats]
+"""
+import sys
+import tempfile
+
+import numpy as np
+
+import chunked
+import smartfloor as sf
+import synthetic
+from benchmarks.ingest import best_time
+from benchmarks.resample import peak_mb
+
+
+def in_memory(path):
+    floor = sf.FloorRecording.from_csv(path, cache=False)
+    return floor.footstep_positions, sf.GaitCycleBatch.from_floors([floor])
+
+
+def chunked_pass(path, chunk):
+    with chunked.ChunkedRecording(path, chunk=chunk) as recording:
+        steps = list(recording.footstep_stream())
+        return steps, recording.gait_cycle_batch()
+
+
+def compare(name, path, repeats, chunk=4096):
+    (footsteps, batch), (steps, chunked_batch) = in_memory(path), chunked_pass(path, chunk)
+    same = (np.array_equal([step.time for step in steps], footsteps.time.values)
+            and np.array_equal(chunked_batch.features, batch.features, equal_nan=True))
+    ms_before = best_time(lambda: in_memory(path), repeats)
+    ms_after = best_time(lambda: chunked_pass(path, chunk), repeats)
+    mb_before, mb_after = peak_mb(lambda: in_memory(path)), peak_mb(lambda: chunked_pass(path, chunk))
+    print(f'  {name}: {ms_before:8.1f} ms -> {ms_after:8.1f} ms, {mb_before:7.1f} MB -> {mb_after:5.1f} MB peak, '
+          f'{len(steps)} footsteps, {len(batch)} cycles, {"identical" if same else "DIFFERENT"}', flush=True)
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    compare(path, path, repeats)
+    with tempfile.TemporaryDirectory() as tmp:
+        for minutes in (2, 8, 32):
+            csv = synthetic.synthetic_csv(f'{tmp}/0_synthetic_1.csv', duration=60.0 * minutes)
+            compare(f'{minutes:2d} min synthetic', csv, repeats)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
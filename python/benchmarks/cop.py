@@ -0,0 +1,41 @@
+""" Time the fused center of pressure against the original xarray reductions
+
+Run from the python/ directory with:
+
+    python -m benchmarks.cop [path] [repeats]
+"""
+import sys
+
+import numpy as np
+import xarray as xr
+
+import smartfloor as sf
+from benchmarks.denoise import repeated
+from benchmarks.ingest import best_time
+from benchmarks.resample import peak_mb
+
+
+def legacy_cop(da):
+    """The original approach: three separate sums and two full size weighted copies of the recording"""
+    x_cop = (da * da.x).sum(dim=('x', 'y')) / da.sum(dim=('x', 'y'))
+    y_cop = (da * da.y).sum(dim=('x', 'y')) / da.sum(dim=('x', 'y'))
+    magnitude = da.sum(dim=('x', 'y'))
+    return xr.Dataset({'x': x_cop, 'y': y_cop, 'magnitude': magnitude})
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    floor = sf.FloorRecording.from_csv(path)
+    for n in (1, 10, 50):
+        pressure = repeated(floor.pressure, n)
+        before, after = legacy_cop(pressure), sf.FloorRecording._get_cop_dataset(pressure)
+        assert all(np.allclose(before[var], after[var], equal_nan=True) for var in ('x', 'y', 'magnitude'))
+        ms_before = best_time(lambda: legacy_cop(pressure), repeats)
+        ms_after = best_time(lambda: sf.FloorRecording._get_cop_dataset(pressure), repeats)
+        mb_before = peak_mb(lambda: legacy_cop(pressure))
+        mb_after = peak_mb(lambda: sf.FloorRecording._get_cop_dataset(pressure))
+        print(f'  {len(pressure.time):6d} frames: {ms_before:8.2f} ms -> {ms_after:6.2f} ms '
+              f'({ms_before / ms_after:5.1f}x), {mb_before:7.2f} MB -> {mb_after:5.2f} MB peak')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,39 @@
+""" Time batched gait cycle normalization against one set of xarray interpolations per cycle
+
+Run from the python/ directory with:
+
+    python -m benchmarks.cycles [path] [repeats]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def legacy_normalize(floor, window, length=40):
+    """The original GaitCycle properties: four interpolations of cop_mlap and one of cop_vel_mlap per cycle"""
+    date_range = pd.date_range(*window, periods=length)
+    ant_i = floor.cop_mlap.interp(time=window[0]).ant.item()
+    ant_scale = floor.cop_mlap.interp(time=window[1]).ant.item() - ant_i
+    pos = floor.cop_mlap.interp(time=date_range)
+    med_scale = max(abs(pos.med.min()), abs(pos.med.max())) * 2
+    pos = floor.cop_mlap.interp(time=date_range).drop_vars('time')
+    vel = floor.cop_vel_mlap.interp(time=date_range).drop_vars('time')
+    return np.stack([pos.med / med_scale, (pos.ant - ant_i) / ant_scale, vel.med / med_scale, vel.ant / ant_scale])
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    floor = sf.FloorRecording.from_csv(path, trimmed=True)
+    recorded = floor.heelstrike_triplet_windows
+    for n in (1, 10, 50):
+        windows = np.tile(recorded, (n, 1))
+        ms_before = best_time(lambda: [legacy_normalize(floor, window) for window in windows], 1)
+        ms_after = best_time(lambda: floor.normalize_cycles(windows), repeats)
+        print(f'  {len(windows):4d} cycles: {ms_before:8.2f} ms -> {ms_after:6.2f} ms ({ms_before / ms_after:6.1f}x)')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,53 @@
+""" Time per-board demultiplexing of raw packets, before and after the single-pass demux
+
+Run from the python/ directory with:
+
+    python -m benchmarks.demux [path] [repeats]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def legacy_demux(df_floor, board_ids):
+    """The original approach: one masked scan of the whole table per board, then 32 Series pulled one at a time"""
+    boards = []
+    for board_id in board_ids:
+        df = df_floor[df_floor['board_id'] == board_id].drop(columns=['board_id'])
+        grid = np.array([[df[sensor_id] for sensor_id in row] for row in sf.BoardRecording.sensor_map])
+        boards.append((df.index, grid))
+    return boards
+
+
+def with_boards(df, n_boards):
+    """Relabel copies of a recording as extra boards, to get a floor with `n_boards` boards"""
+    ids = df['board_id'].unique()
+    copies = []
+    for i in range(0, n_boards, len(ids)):
+        copy = df.copy()
+        copy['board_id'] = copy['board_id'].map({board_id: i + j for j, board_id in enumerate(ids)})
+        copies.append(copy)
+    return pd.concat(copies), list(range(n_boards))
+
+
+def main(path='data/1_131.2lbs.csv', repeats=5):
+    df = sf._df_from_csv(path)
+    print(f'{path}: {len(df)} packets')
+    for n_boards in (4, 16, 64):
+        df_n, board_ids = with_boards(df, n_boards)
+        before = legacy_demux(df_n, board_ids)
+        after = sf.BoardRecording.demux(df_n, board_ids)
+        assert all((t1 == t2).all() and (np.moveaxis(g1, -1, 0) == g2).all()
+                   for (t1, g1), (t2, g2) in zip(before, after))
+        ms_before = best_time(lambda: legacy_demux(df_n, board_ids), repeats)
+        ms_after = best_time(lambda: sf.BoardRecording.demux(df_n, board_ids), repeats)
+        print(f'  {n_boards:3d} boards, {len(df_n):7d} packets: {ms_before:8.2f} ms -> {ms_after:6.2f} ms '
+              f'({ms_before / ms_after:5.1f}x)')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
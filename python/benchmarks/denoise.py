@@ -0,0 +1,51 @@
+""" Time pressure denoising with the NumPy kernel against the original xarray stack/argmax/where passes
+
+Run from the python/ directory with:
+
+    python -m benchmarks.denoise [path] [repeats]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def legacy_denoise(da, noise, dist=3):
+    """The original approach: stack the tiles, argmax per frame, then mask with two broadcast `where` passes"""
+    init_pass = sf._nonnegative_darray(da - noise)
+    stacked = init_pass.stack(tile=('x', 'y'))
+    coords_max = stacked.tile.isel(tile=stacked.argmax('tile'))
+    x_max, y_max = zip(*coords_max.data)
+    ds = xr.Dataset({'x': (['time'], list(x_max)), 'y': (['time'], list(y_max))}, coords={'time': stacked.time})
+    return init_pass.where(abs(init_pass.x - ds.x) <= dist).where(abs(init_pass.y - ds.y) <= dist).fillna(0)
+
+
+def repeated(da, n):
+    """Concatenate n copies of a recording back to back, to stand in for a longer session"""
+    step = da.time.values[1] - da.time.values[0]
+    times = da.time.values[0] + np.arange(len(da.time) * n) * step
+    return xr.concat([da] * n, dim='time').assign_coords(time=times)
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    floor = sf.FloorRecording.from_csv(path)
+    for n in (1, 10, 50):
+        samples = repeated(floor.samples, n)
+        before = legacy_denoise(samples, floor.noise)
+        after = floor._denoise(samples)
+        assert np.array_equal(before.values, after.values)
+        ms_before = best_time(lambda: legacy_denoise(samples, floor.noise), repeats)
+        ms_after = best_time(lambda: floor._denoise(samples), repeats)
+        print(f'  {len(samples.time):6d} frames: {ms_before:8.2f} ms -> {ms_after:6.2f} ms '
+              f'({ms_before / ms_after:5.1f}x)')
+    floor.baseline = pd.Timedelta('10s')
+    print(f'  moving 10 s baseline, {len(floor.samples.time)} frames: '
+          f'{best_time(lambda: floor._denoise(floor.samples), repeats):.2f} ms')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
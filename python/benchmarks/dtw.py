@@ -0,0 +1,45 @@
+""" Time DTW nearest neighbor search with lower bound pruning against one similaritymeasures.dtw call per pair
+
+Run from the python/ directory with:
+
+    python -m benchmarks.dtw [path] [repeats]
+"""
+import sys
+
+import numpy as np
+import similaritymeasures
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+from benchmarks.query import repeated
+
+
+def legacy_nearest(queries, references):
+    """The original approach: the DTW of every pair, then the closest reference of each query"""
+    distances = np.array([[similaritymeasures.dtw(query, reference)[0] for reference in references]
+                          for query in queries])
+    return distances.min(axis=1)
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    floors = [sf.FloorRecording.from_csv(path, trimmed=True, name=f'{i}_normal_1') for i in (1, 2)]
+    train, test = sf.GaitCycleBatch.from_floors(floors).partition_names(r'1_.*', reverse=True)
+    train, test = repeated(train, 10), repeated(test, 2)
+    queries, references = sf.cycle_trajectories(test.features), sf.cycle_trajectories(train.features)
+    pairs = len(queries) * len(references)
+    before = legacy_nearest(queries, references)
+    assert np.allclose(before, sf.dtw_nearest(queries, references).distances[:, 0])
+    ms_before = best_time(lambda: legacy_nearest(queries, references), 1)
+    ms_matrix = best_time(lambda: [sf.dtw_distances(query, references) for query in queries], repeats)
+    print(f'  {len(queries)} x {len(references)} cycles: pairwise {ms_before:8.2f} ms, '
+          f'batched full matrix {ms_matrix:6.2f} ms')
+    for band in (None, 8, 4):
+        for k in (1, 5):
+            result = sf.dtw_nearest(queries, references, k, band)
+            ms_search = best_time(lambda: sf.dtw_nearest(queries, references, k, band), repeats)
+            print(f'  band {str(band):>4}, k={k}: {ms_search:6.2f} ms, {result.pruned / pairs:4.0%} pruned by lower '
+                  f'bound, {result.abandoned / pairs:4.0%} abandoned, {result.computed / pairs:4.0%} computed')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,47 @@
+""" Time footstep left/right labeling and triplet construction as the number of steps grows
+
+The original groupby implementation no longer runs under current xarray, so the baseline here is its per-step logic
+as a plain Python loop over NumPy values, which is cheaper than the xarray version was.
+
+Run from the python/ directory with:
+
+    python -m benchmarks.footsteps [path] [repeats]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def loop_step_dirs(steps):
+    """One Python call per step, like the original `_middle_foot_dir` loop"""
+    x, y = steps.x.values, steps.y.values
+    feet = [np.nan] * len(x)
+    for i in range(1, len(x) - 1):
+        v_step = np.array([x[i] - x[i - 1], y[i] - y[i - 1]])
+        v_stride = np.array([x[i + 1] - x[i - 1], y[i + 1] - y[i - 1]])
+        feet[i] = 'right' if v_stride.dot([-v_step[1], v_step[0]]) > 0 else 'left'
+    feet = pd.Series(feet)
+    feet = feet.fillna(feet.shift(2))
+    return feet.fillna(feet.shift(-2)).values
+
+
+def main(path='data/1_131.2lbs.csv', repeats=5):
+    footsteps = sf.FloorRecording.from_csv(path, trimmed=True).footstep_positions
+    for n in (1, 10, 100):
+        steps = footsteps.isel(time=np.tile(np.arange(len(footsteps.time)), n))
+        steps = steps.assign_coords(time=np.arange(len(steps.time)))
+        assert list(sf.FloorRecording._step_dirs(steps).values) == list(loop_step_dirs(steps))
+        labeled = steps.assign(dir=sf.FloorRecording._step_dirs(steps))
+        ms_loop = best_time(lambda: loop_step_dirs(steps), repeats)
+        ms_dirs = best_time(lambda: sf.FloorRecording._step_dirs(steps), repeats)
+        ms_triplets = best_time(lambda: sf.FloorRecording._right_triplets(labeled), repeats)
+        print(f'  {len(steps.time):5d} steps: labels {ms_loop:7.2f} ms -> {ms_dirs:5.2f} ms, '
+              f'triplets {ms_triplets:5.2f} ms')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,53 @@
+""" Time cycle lookups with the exact and approximate indexes as the reference library grows
+
+The library is made of random blends of the recording's cycles plus noise, standing in for many participants.
+
+Run from the python/ directory with:
+
+    python -m benchmarks.index [path] [repeats]
+"""
+import sys
+import time
+
+import numpy as np
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def blended(batch, n, seed=0):
+    """n cycles that each mix two random cycles of the batch, with a little noise"""
+    rng = np.random.default_rng(seed)
+    first, second = rng.integers(len(batch), size=(2, n))
+    weight = rng.random((n, 1), dtype=np.float32)
+    blend = batch[first]  # keeps the metadata of the first cycle
+    blend.features = weight * batch.features[first] + (1 - weight) * batch.features[second]
+    blend.features += rng.normal(scale=0.05, size=blend.features.shape).astype(np.float32)
+    return blend
+
+
+def main(path='data/1_131.2lbs.csv', repeats=5):
+    cycles = sf.FloorRecording.from_csv(path, trimmed=True, name='1_normal_1').gait_cycles
+    base = sf.GaitCycleBatch.from_cycles(cycles)
+    queries = blended(base, 100, seed=1)
+    for n in (1000, 10000, 100000):
+        library = blended(base, n)
+        exact_distances, exact_indices = library.nearest(queries, 1, 'euclid')
+        ms_scan = best_time(lambda: library.nearest(queries, 1, 'euclid'), 1) / len(queries)
+        print(f'  {len(library):6d} cycles: linear scan {ms_scan:7.3f} ms per query')
+        for backend in ('kdtree', 'ivf'):
+            start = time.perf_counter()
+            index = library.build_index(backend)
+            ms_build = (time.perf_counter() - start) * 1000
+            distances, _ = index.query(queries)
+            recall = np.mean(np.isclose(distances[:, 0], exact_distances[:, 0]))
+            ms_query = best_time(lambda: index.query(queries[:1]), repeats)
+            start = time.perf_counter()
+            index.add(base)
+            ms_add = (time.perf_counter() - start) * 1000
+            print(f'    {backend:>6}: build {ms_build:8.1f} ms, {ms_query:6.3f} ms per query, recall@1 {recall:4.0%}, '
+                  f'add {len(base)} cycles {ms_add:6.2f} ms')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
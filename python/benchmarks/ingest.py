@@ -0,0 +1,60 @@
+""" Compare the typed packet reader and its binary cache against the original python-engine reader
+
+Run from the python/ directory with:
+
+    python -m benchmarks.ingest [path] [repeats]
+"""
+import shutil
+import sys
+import time
+
+import pandas as pd
+
+import smartfloor as sf
+
+
+def legacy_df_from_csv(path) -> pd.DataFrame:
+    """The original reader, kept here as the baseline"""
+    columns = ['board_id', 'time', *range(48)]  # column names
+    df_raw = pd.read_csv(path, engine='python', names=columns, index_col=1)
+    df_raw.index = pd.to_datetime(df_raw.index, unit='ms')
+    return df_raw
+
+
+def best_time(f, repeats):
+    """Best wall time of `repeats` calls to f, in milliseconds"""
+    times = []
+    for _ in range(repeats):
+        ts = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - ts)
+    return min(times) * 1000
+
+
+def main(path='data/1_131.2lbs.csv', repeats=5):
+    legacy = legacy_df_from_csv(path)
+    typed = sf._df_from_packets(sf.read_packets(path))
+    assert (legacy.values == typed.values).all() and (legacy.index == typed.index).all()
+
+    def cold_cache():
+        shutil.rmtree(f'{path}.npcache', ignore_errors=True)
+        sf.load_packets(path)
+
+    results = {
+        'python engine': best_time(lambda: legacy_df_from_csv(path), repeats),
+        'read_packets': best_time(lambda: sf.read_packets(path), repeats),
+        'read_packets (chunked)': best_time(lambda: list(sf.read_packets(path, chunksize=1 << 16)), repeats),
+        '_df_from_csv': best_time(lambda: sf._df_from_csv(path), repeats),
+        'load_packets (cold)': best_time(cold_cache, repeats),
+        'load_packets (warm)': best_time(lambda: sf.load_packets(path), repeats),
+        '_df_from_csv (warm)': best_time(lambda: sf._df_from_csv(path, cache=True), repeats),
+    }
+    print(f'{path}: {len(typed)} packets')
+    print(f'  memory: {legacy.memory_usage(deep=True).sum() / 1e6:.2f} MB -> '
+          f'{typed.memory_usage(deep=True).sum() / 1e6:.2f} MB')
+    for name, ms in results.items():
+        print(f'  {name:<24} {ms:8.2f} ms  ({results["python engine"] / ms:5.1f}x)')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
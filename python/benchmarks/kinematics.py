@@ -0,0 +1,56 @@
+""" Time the one-pass COP derivative engine against the original chain of xarray shift/rolling properties
+
+Run from the python/ directory with:
+
+    python -m benchmarks.kinematics [path] [repeats]
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+import smartfloor as sf
+from benchmarks.denoise import repeated
+from benchmarks.ingest import best_time
+
+
+def legacy_kinematics(cop, freq):
+    """The original properties, each a shift, a 2 sample rolling mean and a Timedelta division"""
+    def roc(ds):
+        return (ds.shift(time=-1) - ds).rolling(time=2).mean() / (freq / pd.Timedelta('1s'))
+
+    vel = roc(cop)
+    vel_mag = np.sqrt(np.square(vel.x) + np.square(vel.y))
+    vel_mag_roc = roc(vel_mag)
+    accel = roc(vel)
+    accel_mag = np.sqrt(np.square(accel.x) + np.square(accel.y))
+    return {'vel': vel, 'vel_mag': vel_mag, 'vel_mag_roc': vel_mag_roc,
+            'vel_mag_smoothed': vel_mag.rolling(time=10, center=True).mean().dropna('time'),
+            'vel_mag_roc_smoothed': vel_mag_roc.rolling(time=10, center=True).mean().dropna('time'),
+            'accel': accel, 'accel_mag': accel_mag, 'accel_mag_roc': roc(accel_mag)}
+
+
+def kinematics(floor, cop):
+    """Recompute floor.kinematics from the given COP"""
+    floor.cop = cop
+    del floor.kinematics
+    return floor.kinematics
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    floor = sf.FloorRecording.from_csv(path)
+    recorded = floor.cop
+    for n in (1, 10, 50):
+        cop = repeated(recorded, n)
+        before, after = legacy_kinematics(cop, floor.freq), kinematics(floor, cop)
+        assert np.allclose(before['vel_mag_roc'], after.vel_mag_roc, equal_nan=True)
+        assert np.allclose(before['accel_mag_roc'], after.accel_mag_roc, equal_nan=True)
+        ms_before = best_time(lambda: legacy_kinematics(cop, floor.freq), repeats)
+        ms_after = best_time(lambda: kinematics(floor, cop), repeats)
+        print(f'  {len(cop.time):6d} frames: {ms_before:8.2f} ms -> {ms_after:6.2f} ms ({ms_before / ms_after:5.1f}x)')
+    floor.derivative = 'savgol'
+    print(f'  savgol, {len(recorded.time)} frames: {best_time(lambda: kinematics(floor, recorded), repeats):.2f} ms')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,37 @@
+""" Time demux, resampling, denoising and the center of pressure on synthetic floors of 4, 16 and 64 boards
+
+The per-tile cost of every stage should stay flat as the floor grows. There is no baseline, the original code could
+only load a strip of four boards.
+
+Run from the python/ directory with:
+
+    python -m benchmarks.layout [path] [repeats]
+"""
+import sys
+
+import smartfloor as sf
+import synthetic
+from benchmarks.ingest import best_time
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    packets = sf.load_packets(path)
+    duration = (packets.time.max() - packets.time.min()) / 1000
+    print(f'{duration:.1f} s synthetic recordings, as long as {path}')
+    for n_boards in (4, 16, 64):
+        layout = synthetic.grid_layout(n_boards)
+        df = sf._df_from_packets(synthetic.synthetic_packets(duration, layout=layout))
+        floor = sf.FloorRecording(df, layout=layout)
+        tiles = layout.width * layout.height
+        times = {
+            'demux': best_time(lambda: sf.BoardRecording.demux(df, layout.board_ids, layout.sensor_maps), repeats),
+            'samples': best_time(lambda: floor._resample(floor.samples.time.values), repeats),
+            'pressure': best_time(lambda: floor._denoise(floor.samples), repeats),
+            'cop': best_time(lambda: sf.FloorRecording._get_cop_dataset(floor.pressure), repeats),
+        }
+        print(f'  {n_boards:3d} boards, {layout.width}x{layout.height} tiles, {len(df)} packets: ' +
+              ', '.join(f'{stage} {ms:7.2f} ms ({1000 * ms / tiles:5.1f} us/tile)' for stage, ms in times.items()))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,65 @@
+""" Time the leave-one-participant-out evaluation of results.py from one cached distance matrix against a separate
+query per fold
+
+The experiment is made of 7 participants x 6 styles of blended cycles from the recording.
+
+Run from the python/ directory with:
+
+    python -m benchmarks.lopo [path] [repeats]
+"""
+import contextlib
+import io
+import shutil
+import sys
+
+import numpy as np
+
+import results
+import smartfloor as sf
+from benchmarks.index import blended
+from benchmarks.ingest import best_time
+
+
+def legacy_entries(batch, metric):
+    """The original loop: partition the batch and query the held out cycles of every participant and style"""
+    for pid in range(7):
+        train, test = batch.partition_names(rf'{pid + 1}_.*', reverse=True)
+        for style in results.styles:
+            test_cycles = results.cycles_with_style(test, style)
+            dist, neighbors = train.nearest(test_cycles, len(train), metric)
+            num_correct = np.count_nonzero(train.styles[neighbors[:, 0]] == style)
+            yield {'pid': pid + 1, 'style': style, 'correct': num_correct, 'total': len(test_cycles)}
+
+
+def experiment(base, per_recording=9):
+    """A batch with one recording of blended cycles per participant and style"""
+    batches = []
+    for i, (pid, style) in enumerate((pid, style) for pid in results.participants for style in results.styles):
+        cycles = blended(base, per_recording, seed=i)
+        batches.append(sf.GaitCycleBatch(cycles.features, [f'{pid}_{style}_1_c{c}' for c in range(per_recording)],
+                                         [f'{pid}_{style}_1'] * per_recording, cycles.windows, cycles.med_scale,
+                                         cycles.ant_scale, cycles.ant_offset))
+    return sf.GaitCycleBatch.concatenate(batches)
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    base = sf.GaitCycleBatch.from_cycles(sf.FloorRecording.from_csv(path, trimmed=True, name='1_normal_1').gait_cycles)
+    batch = experiment(base)
+    cache_dir = 'benchmarks/.distance_cache'
+    for metric in ('weighted_mix', 'dtw'):
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            before = list(legacy_entries(batch, metric))
+            assert before == list(results.result_entries_generator(batch, metric, cache_dir=cache_dir))
+            ms_before = best_time(lambda: list(legacy_entries(batch, metric)), 1)
+            shutil.rmtree(cache_dir)
+            ms_cold = best_time(lambda: list(results.result_entries_generator(batch, metric, cache_dir=cache_dir)), 1)
+            ms_warm = best_time(lambda: list(results.result_entries_generator(batch, metric, cache_dir=cache_dir)),
+                                repeats)
+        print(f'  {metric}, {len(batch)} cycles: per fold queries {ms_before:8.2f} ms, one matrix {ms_cold:8.2f} ms, '
+              f'cached matrix {ms_warm:6.2f} ms')
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
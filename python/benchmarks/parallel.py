@@ -0,0 +1,49 @@
+""" Time building a cycle batch from a directory of recordings in worker processes against the sequential
+FloorRecordingBatch, with one corrupt file in the directory
+
+Run from the python/ directory with:
+
+    python -m benchmarks.parallel [path] [repeats]
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def main(path='data/1_131.2lbs.csv', repeats=1, n_files=8):
+    tmp = tempfile.mkdtemp()
+    try:
+        paths = [f'{tmp}/{i}_normal_1.csv' for i in range(1, n_files + 1)]
+        for copy in paths:
+            shutil.copy(path, copy)
+        with open(f'{tmp}/9_broken_1.csv', 'w') as f:
+            f.write('this is not a recording\n')
+        good, all_paths = paths, paths + [f'{tmp}/9_broken_1.csv']
+        with contextlib.redirect_stdout(io.StringIO()):
+            before = sf.FloorRecordingBatch.from_csv(good, trimmed=True).gait_cycle_batch
+            after, results = sf.FloorRecordingBatch.cycles_from_csv(all_paths, trimmed=True, workers=2)
+            assert np.array_equal(before.features, after.features)
+            assert [result.error is None for result in results] == [True] * n_files + [False]
+            ms_before = best_time(lambda: sf.FloorRecordingBatch.from_csv(good, trimmed=True).gait_cycle_batch,
+                                  repeats)
+            timings = {workers: best_time(lambda: sf.FloorRecordingBatch.cycles_from_csv(all_paths, trimmed=True,
+                                                                                         workers=workers), repeats)
+                       for workers in sorted({1, 2, os.cpu_count()})}
+        print(f'  {n_files} files and 1 corrupt file, {os.cpu_count()} CPUs: sequential batch {ms_before:7.1f} ms '
+              f'(stops at the corrupt file if included)')
+        for workers, ms in timings.items():
+            print(f'    {workers} workers: {ms:7.1f} ms ({ms_before / ms:4.1f}x)')
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,49 @@
+""" Memory, speed and accuracy of the single precision pipeline against double precision
+
+Run from the python/ directory with:
+
+    python -m benchmarks.precision [path] [repeats]
+"""
+import sys
+
+import numpy as np
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def nbytes(obj):
+    return obj.nbytes if hasattr(obj, 'nbytes') else sum(var.nbytes for var in obj.data_vars.values())
+
+
+def main(path='data/1_131.2lbs.csv', repeats=5):
+    floors = {precision: sf.FloorRecording.from_csv(path, precision=precision) for precision in sf.PRECISIONS}
+    double, single = floors['double'], floors['single']
+    print(f'{path}: {len(double.samples.time)} samples')
+    print(f'  {"":<24} {"double":>12} {"single":>12}')
+    for name in ('samples', 'pressure', 'cop', 'cop_vel_mag_smoothed'):
+        print(f'  {name + " memory":<24} ' +
+              ' '.join(f'{nbytes(getattr(floor, name)) / 1e3:9.1f} kB' for floor in floors.values()))
+    for name, f in {'_denoise': lambda floor: floor._denoise(floor.samples),
+                    '_get_cop_dataset': lambda floor: floor._get_cop_dataset(floor.pressure)}.items():
+        print(f'  {name + " time":<24} ' +
+              ' '.join(f'{best_time(lambda: f(floor), repeats):9.2f} ms' for floor in floors.values()))
+
+    print('  accuracy of single precision:')
+    for var in ('x', 'y', 'magnitude'):
+        err = np.abs(single.cop[var].values - double.cop[var].values)
+        print(f'    COP {var:<10} max abs error {np.nanmax(err):.2e}, mean {np.nanmean(err):.2e}, '
+              f'{np.sum(err > 1e-2)} frames off by more than 1e-2')
+    for name, label in (('_anchors', 'footstep anchors'), ('_weight_shifts', 'heel strike candidates')):
+        times_double, times_single = (set(getattr(floor, name).time.values) for floor in (double, single))
+        print(f'    {label:<22} {len(times_single & times_double)} of {len(times_double)} match, '
+              f'{len(times_single - times_double)} extra')
+    steps_double, steps_single = double.footstep_positions, single.footstep_positions
+    same_steps = np.array_equal(steps_double.time.values, steps_single.time.values)
+    same_feet = same_steps and list(steps_double.dir.values) == list(steps_single.dir.values)
+    print(f'    labelled footsteps     {len(steps_single.time)} vs {len(steps_double.time)}, same times: {same_steps}, '
+          f'same feet: {same_feet}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
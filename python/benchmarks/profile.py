@@ -0,0 +1,43 @@
+""" Time the full pipeline with the stage profiler disabled, enabled, and enabled with memory tracing, then print where
+the time went
+
+Run from the python/ directory with:
+
+    python -m benchmarks.profile [path] [repeats]
+"""
+import sys
+import tempfile
+
+import pandas as pd
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def pipeline(path):
+    floor = sf.FloorRecording.from_csv(path, trimmed=True)
+    return floor.gait_cycles
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    ms_off = best_time(lambda: pipeline(path), repeats)
+    sf.profiler.enable()
+    ms_on = best_time(lambda: pipeline(path), repeats)
+    sf.profiler.disable()
+    sf.profiler.enable(memory=True)
+    ms_memory = best_time(lambda: pipeline(path), 1)
+    sf.profiler.disable()
+    print(f'  disabled {ms_off:.1f} ms, enabled {ms_on:.1f} ms, with memory {ms_memory:.1f} ms')
+    sf.profiler.clear()
+    sf.profiler.enable(memory=True)
+    pipeline(path)
+    sf.profiler.disable()
+    with pd.option_context('display.width', 160, 'display.max_columns', None):
+        print(sf.profiler.summary().head(15))
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        sf.profiler.to_chrome_trace(f.name)
+        print(f'  {len(sf.profiler.records)} stages, Chrome trace written to {f.name}')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
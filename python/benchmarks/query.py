@@ -0,0 +1,52 @@
+""" Time nearest cycle queries with the blocked distance matrix against one xarray distance call per pair
+
+Run from the python/ directory with:
+
+    python -m benchmarks.query [path] [repeats]
+"""
+import sys
+
+import numpy as np
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def legacy_query_batch(train, test, metric):
+    """The original `query_batch`: a vectorized GaitCycle method per query, then a full sort"""
+    results = []
+    for query in test:
+        distances = np.vectorize(getattr(query, sf.GaitCycle.metrics[metric]))(train.cycles)
+        results.append((np.sort(distances), train.cycles[distances.argsort()]))
+    return results
+
+
+def repeated(batch, n):
+    """n copies of a batch with a little noise, to stand in for a larger experiment"""
+    rng = np.random.default_rng(0)
+    batch = sf.GaitCycleBatch.concatenate([batch] * n)
+    batch.features += rng.normal(scale=0.01, size=batch.features.shape).astype(batch.features.dtype)
+    return batch
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    floors = [sf.FloorRecording.from_csv(path, trimmed=True, name=f'{i}_normal_1') for i in (1, 2)]
+    train, test = sf.GaitCycleBatch.from_floors(floors).partition_names(r'1_.*', reverse=True)
+    for metric in ('weighted_mix', 'euclid'):
+        before = legacy_query_batch(train, test, metric)
+        after, _ = train.query_batch(test, metric)
+        assert np.allclose([distances for distances, _ in before], after, atol=1e-5)
+        ms_before = best_time(lambda: legacy_query_batch(train, test, metric), 1)
+        ms_after = best_time(lambda: train.nearest(test, 1, metric), repeats)
+        print(f'  {metric}, {len(test)} x {len(train)} cycles: {ms_before:8.2f} ms -> {ms_after:5.2f} ms '
+              f'({ms_before / ms_after:5.0f}x)')
+    for n in (10, 100):
+        big_train, big_test = repeated(train, n), repeated(test, n)
+        ms_top = best_time(lambda: big_train.nearest(big_test, 1), repeats)
+        ms_all = best_time(lambda: big_train.query_batch(big_test), 1)
+        print(f'  weighted_mix, {len(big_test)} x {len(big_train)} cycles: top match {ms_top:8.2f} ms, '
+              f'full ordering with neighbor cycles {ms_all:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,49 @@
+""" Compare direct per-board resampling against the original union-of-timestamps interpolation
+
+Run from the python/ directory with:
+
+    python -m benchmarks.resample [path] [repeats]
+"""
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def legacy_samples(floor, sample_times):
+    """The original approach: outer-join every board's timestamps, fill the NaNs, then interpolate onto the grid"""
+    return floor._get_darray().interp(time=sample_times)
+
+
+def peak_mb(f):
+    """Peak traced memory allocated by a call to f, in MB"""
+    tracemalloc.start()
+    f()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def main(path='data/1_131.2lbs.csv', repeats=5):
+    floor = sf.FloorRecording.from_csv(path)
+    sample_times = floor.samples.time.values
+    before = legacy_samples(floor, sample_times)
+    after = floor._resample(sample_times)
+    assert np.allclose(before.values, after.transpose(*before.dims).values, atol=1e-3, equal_nan=True)
+    results = {
+        'union + interp': (best_time(lambda: legacy_samples(floor, sample_times), repeats),
+                           peak_mb(lambda: legacy_samples(floor, sample_times))),
+        '_resample': (best_time(lambda: floor._resample(sample_times), repeats),
+                      peak_mb(lambda: floor._resample(sample_times))),
+    }
+    print(f'{path}: {len(sample_times)} samples at {pd.Timedelta(floor.freq).total_seconds() * 1000:.0f} ms')
+    for name, (ms, mb) in results.items():
+        print(f'  {name:<16} {ms:8.2f} ms  {mb:7.2f} MB peak')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,138 @@
+""" Time and memory-profile every pipeline stage on synthetic recordings of growing duration, sample rate, noise and
+number of boards
+
+Each run is saved as a .csv in the results directory and compared with the previous run there, so the effect of a
+change shows up as a ratio per stage and parameter.
+
+Run from the python/ directory with:
+
+    python -m benchmarks.scaling [path] [repeats]
+"""
+import glob
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import smartfloor as sf
+import synthetic
+
+BASE = {'duration': 60.0, 'hz': 25.0, 'noise': 0.5, 'boards': 4}  # parameters held fixed by the other sweeps
+SWEEPS = {
+    'duration': [30.0, 120.0, 480.0],
+    'hz': [25.0, 50.0, 100.0],
+    'noise': [0.5, 4.0, 16.0],
+    'boards': [4, 16, 64],
+}
+STAGES = ['_df_from_csv', 'samples', 'pressure', 'cop', 'footstep_positions', 'gait_cycles', 'query_batch']
+
+
+def run_stages(path, hz, layout, memory=False):
+    """Run the pipeline on one recording, each stage on the results of the last
+
+    Returns
+    -------
+    stages : List[Tuple[str, float, float]]
+        Name, wall time in ms and peak traced allocation in MB of each stage, NaN MB unless `memory`
+    cycles : int
+        Number of gait cycles found
+    """
+    stages = []
+
+    def run(stage, f):
+        if memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        ts = time.perf_counter()
+        value = f()
+        ms = (time.perf_counter() - ts) * 1000
+        stages.append((stage, ms, (tracemalloc.get_traced_memory()[1] - before) / 1e6 if memory else math.nan))
+        return value
+
+    def resample(df):
+        floor = sf.FloorRecording(df, freq=pd.Timedelta(seconds=1 / hz), name='0_synthetic_1', trimmed=True,
+                                  layout=layout)
+        floor.samples
+        return floor
+
+    df = run('_df_from_csv', lambda: sf._df_from_csv(path))
+    floor = run('samples', lambda: resample(df))
+    run('pressure', lambda: floor.pressure)
+    run('cop', lambda: floor.cop)
+    run('footstep_positions', lambda: floor.footstep_positions)
+    run('gait_cycles', lambda: floor.gait_cycles)
+    batch = sf.GaitCycleBatch.from_floors([floor])
+    run('query_batch', lambda: batch.query_batch(batch, k=min(5, len(batch))) if len(batch) else None)
+    return stages, len(batch)
+
+
+def profile(params: dict, path, repeats=1) -> pd.DataFrame:
+    """Best time over `repeats` runs and peak memory of one more traced run, per stage, on a synthetic recording"""
+    layout = synthetic.grid_layout(params['boards'])
+    packets = synthetic.synthetic_packets(params['duration'], params['hz'], layout, params['noise'])
+    synthetic.write_csv(path, packets)
+    runs = [run_stages(path, params['hz'], layout)[0] for _ in range(repeats)]
+    tracemalloc.start()
+    try:
+        traced, cycles = run_stages(path, params['hz'], layout, memory=True)
+    finally:
+        tracemalloc.stop()
+    rows = [{**params, 'packets': len(packets.time), 'cycles': cycles, 'stage': stage,
+             'ms': min(run[i][1] for run in runs), 'peak_mb': peak_mb}
+            for i, (stage, _, peak_mb) in enumerate(traced)]
+    return pd.DataFrame(rows)
+
+
+def sweep(repeats=1, sweeps=None) -> pd.DataFrame:
+    """Profile the pipeline at every value of every sweep, the other parameters held at `BASE`"""
+    frames = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, values in (sweeps or SWEEPS).items():
+            for value in values:
+                df = profile({**BASE, name: value}, f'{tmp}/0_synthetic_1.csv', repeats)
+                frames.append(df.assign(sweep=name, value=value))
+                total = df.ms.sum()
+                print(f'  {name} = {value:g}: {total:8.1f} ms, {df.peak_mb.max():7.1f} MB peak, '
+                      f'{df.cycles.iloc[0]} cycles', flush=True)
+    return pd.concat(frames, ignore_index=True)
+
+
+def revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Time and memory of each stage in two runs, side by side, with the speedup of `after` over `before`"""
+    keys = ['sweep', 'value', 'stage']
+    merged = before[keys + ['ms', 'peak_mb']].merge(after[keys + ['ms', 'peak_mb']], on=keys,
+                                                    suffixes=('_before', '_after'))
+    return merged.assign(speedup=merged.ms_before / merged.ms_after)
+
+
+def main(path='scaling_results', repeats=1):
+    os.makedirs(path, exist_ok=True)
+    previous = sorted(glob.glob(f'{path}/*.csv'))
+    results = sweep(repeats)
+    out = f'{path}/{time.strftime("%Y%m%d-%H%M%S")}-{revision()}.csv'
+    results.to_csv(out, index=False)
+    print(f'  saved {out}')
+    table = results.pivot_table(index=['sweep', 'value'], columns='stage', values='ms', sort=False)[STAGES]
+    with pd.option_context('display.width', 160, 'display.max_columns', None, 'display.precision', 1):
+        print(table)
+        if previous:
+            print(f'  against {previous[-1]}:')
+            ratios = compare(pd.read_csv(previous[-1]), results)
+            print(ratios.pivot_table(index=['sweep', 'value'], columns='stage', values='speedup', sort=False)[STAGES])
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,61 @@
+""" Compare saved cycle batches with pickles of the original object graph and of the batch
+
+Run from the python/ directory with:
+
+    python -m benchmarks.serialize [path] [repeats]
+"""
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(f'{path}/{name}') for name in os.listdir(path)) / 2 ** 20
+    return os.path.getsize(path) / 2 ** 20
+
+
+def main(path='data/1_131.2lbs.csv', repeats=5):
+    floors = [sf.FloorRecording.from_csv(path, trimmed=True, name=f'{i}_normal_1') for i in range(1, 11)]
+    legacy = np.array([cycle for floor in floors for cycle in floor.gait_cycles])  # every cycle pins its recording
+    batch = sf.GaitCycleBatch.from_floors(floors)
+    tmp = tempfile.mkdtemp()
+    try:
+        with open(f'{tmp}/legacy.p', 'wb') as f:
+            pickle.dump(legacy, f)
+        with open(f'{tmp}/batch.p', 'wb') as f:
+            pickle.dump(batch, f)
+        batch.save(f'{tmp}/batch')
+        loaded = sf.GaitCycleBatch.load(f'{tmp}/batch')
+        assert all(np.array_equal(getattr(batch, name), getattr(loaded, name)) for name in batch._columns)
+
+        def unpickle(name):
+            with open(f'{tmp}/{name}', 'rb') as f:
+                return pickle.load(f)
+
+        print(f'  {len(batch)} cycles:')
+        for label, file, load in (('object graph pickle', 'legacy.p', lambda: unpickle('legacy.p')),
+                                  ('batch pickle', 'batch.p', lambda: unpickle('batch.p')),
+                                  ('saved batch, read', 'batch', lambda: sf.GaitCycleBatch.load(f'{tmp}/batch', False)),
+                                  ('saved batch, mmap', 'batch', lambda: sf.GaitCycleBatch.load(f'{tmp}/batch'))):
+            print(f'    {label:>20}: {size_mb(f"{tmp}/{file}"):8.3f} MB, load {best_time(load, repeats):8.2f} ms')
+        script = (f'import sys, time; t = time.perf_counter(); import smartfloor; '
+                  f'smartfloor.GaitCycleBatch.load({tmp + "/batch"!r}); '
+                  f'print(f"{{(time.perf_counter() - t) * 1000:.0f}} ms", "matplotlib" in sys.modules)')
+        elapsed, matplotlib = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                             check=True).stdout.split()[-3::2]
+        print(f'    fresh interpreter import and load: {elapsed} ms, matplotlib imported: {matplotlib}')
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,29 @@
+""" Throughput of StreamingFloor against the real packet rate of a recording
+
+Run from the python/ directory with:
+
+    python -m benchmarks.streaming [path]
+"""
+import sys
+import time
+
+import smartfloor as sf
+from streaming import StreamingFloor
+
+
+def main(path='data/1_131.2lbs.csv'):
+    packets = sf.read_packets(path)
+    stream = list(zip(packets.board_id.tolist(), packets.time.tolist(), packets.sensors))
+    duration = (packets.time.max() - packets.time.min()) / 1000
+    floor = StreamingFloor()
+    ts = time.perf_counter()
+    ticks = floor.extend(stream)
+    elapsed = time.perf_counter() - ts
+    print(f'{path}: {len(stream)} packets from {len(floor.board_map)} boards over {duration:.1f} s')
+    print(f'  recorded rate   {len(stream) / duration:10.0f} packets/s')
+    print(f'  streaming floor {len(stream) / elapsed:10.0f} packets/s, {ticks / elapsed:.0f} ticks/s '
+          f'({duration / elapsed:.0f}x real time on one core)')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2])
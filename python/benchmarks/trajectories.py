@@ -0,0 +1,34 @@
+""" Time batched Frechet, Hausdorff and area distance matrices against the per-pair GaitCycle methods
+
+Run from the python/ directory with:
+
+    python -m benchmarks.trajectories [path] [repeats]
+"""
+import sys
+
+import numpy as np
+
+import smartfloor as sf
+from benchmarks.ingest import best_time
+
+
+def legacy_distances(train, test, metric):
+    """The original approach: convert both cycles and call similaritymeasures or scipy once per pair"""
+    method = sf.GaitCycle.metrics[metric]
+    return np.array([[getattr(query, method)(cycle) for cycle in train] for query in test])
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    floors = [sf.FloorRecording.from_csv(path, trimmed=True, name=f'{i}_normal_1') for i in (1, 2)]
+    train, test = sf.GaitCycleBatch.from_floors(floors).partition_names(r'1_.*', reverse=True)
+    for metric in ('frechet', 'hausdorff', 'area'):
+        before, after = legacy_distances(train, test, metric), train.distances(test, metric)
+        assert np.allclose(before, after, atol=1e-5)
+        ms_before = best_time(lambda: legacy_distances(train, test, metric), 1)
+        ms_after = best_time(lambda: train.distances(test, metric), repeats)
+        print(f'  {metric:>9}, {len(test)} x {len(train)} cycles: {ms_before:8.2f} ms -> {ms_after:6.2f} ms '
+              f'({ms_before / ms_after:4.0f}x)')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
@@ -0,0 +1,52 @@
+""" Time trim detection with the one-pass packet detector against the original denoised raw-rate floor sum
+
+Run from the python/ directory with:
+
+    python -m benchmarks.trim [path] [repeats]
+"""
+import sys
+
+import numpy as np
+
+import smartfloor as sf
+import synthetic
+from benchmarks.ingest import best_time
+from benchmarks.resample import peak_mb
+
+
+def legacy_loaded_window(floor):
+    """The original property: the full `_denoise` of `da` at the union of all boards' timestamps, summed per frame"""
+    mag = floor._denoise(floor._get_darray()).sum(('x', 'y'))
+    loaded_range = mag.where(mag > mag.mean(), drop=True).time.values
+    return loaded_range[0], loaded_range[-1]
+
+
+def loaded_window(floor):
+    del floor.trim_detector
+    return floor.trim_detector.windows()[0]
+
+
+def compare(name, floor, repeats):
+    before, after = legacy_loaded_window(floor), loaded_window(floor)
+    off = max(abs(np.datetime64(b, 'ms') - np.datetime64(a, 'ms')) for b, a in zip(before, after))
+    ms_before = best_time(lambda: legacy_loaded_window(floor), repeats)
+    ms_after = best_time(lambda: loaded_window(floor), repeats)
+    mb_before, mb_after = peak_mb(lambda: legacy_loaded_window(floor)), peak_mb(lambda: loaded_window(floor))
+    print(f'  {name}: {ms_before:8.2f} ms -> {ms_after:6.2f} ms ({ms_before / ms_after:5.1f}x), '
+          f'{mb_before:7.1f} MB -> {mb_after:5.1f} MB peak, windows differ by {off}')
+
+
+def main(path='data/1_131.2lbs.csv', repeats=3):
+    floor = sf.FloorRecording.from_csv(path)
+    compare(path, floor, repeats)
+    walks = floor.loaded_windows('1s').astype(str)
+    print(f'  separate walks: {", ".join(f"{start} to {end}" for start, end in walks)}')
+    duration = (floor.df.index.max() - floor.df.index.min()).total_seconds()
+    for n_boards in (4, 16, 64):
+        layout = synthetic.grid_layout(n_boards)
+        df = sf._df_from_packets(synthetic.synthetic_packets(duration, layout=layout))
+        compare(f'{n_boards:2d} synthetic boards', sf.FloorRecording(df, layout=layout), repeats)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
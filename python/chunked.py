@@ -0,0 +1,443 @@
+# Using NumPy style docstrings
+import os
+import re
+import shutil
+import tempfile
+import weakref
+from collections import deque
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+from scipy.signal import argrelmax, argrelmin
+
+from smartfloor import (PRECISIONS, FloorLayout, FloorRecording, GaitCycleBatch, Packets, center_of_pressure,
+                        cop_weights, denoise_frames, interpolate_boards, moving_average, moving_baseline,
+                        normalize_windows, read_packets, time_derivative, walk_rotation)
+
+KINEMATICS_MARGIN = 16  # samples of context the smoothed COP speed and its rate of change depend on, either side
+_NEVER = np.iinfo(np.int64).max
+
+
+class Footstep(NamedTuple):
+    """A foot position on the floor, as found by `FloorRecording.footstep_positions`
+
+    Heel strikes are footsteps too, timed at the weight shift onto the foot instead of when it is planted.
+    """
+    time: np.datetime64
+    x: float
+    y: float
+    magnitude: float
+    dir: Optional[str]  # 'right', 'left', or None when too few steps were taken to tell
+
+
+class _RunningExtrema:
+    """`argrelmin` or `argrelmax` of a signal arriving in blocks, as if run once on all of it with NaNs dropped
+
+    Only the last `2 * order` valid samples are carried between blocks, the most any undecided sample needs to be
+    compared against. Extrema within `order` samples of the end of the signal so far wait for the next block.
+    """
+
+    def __init__(self, find, order=5, n_payload=0, dtype=np.float64):
+        self.find = find
+        self.order = order
+        self.horizon = np.iinfo(np.int64).min  # Every extremum before this time has been found
+        self._t = np.empty(0, dtype=np.int64)
+        self._values = np.empty(0, dtype=dtype)
+        self._payload = np.empty((n_payload, 0), dtype=dtype)
+        self._decided = 0
+
+    def push(self, t: np.ndarray, values: np.ndarray, payload: np.ndarray = None, final=False):
+        """Add the next samples, and return the time, value and payload columns of every newly certain extremum"""
+        valid = ~np.isnan(values)
+        if payload is None:
+            payload = np.empty((len(self._payload), len(values)), dtype=self._payload.dtype)
+        self._t = np.concatenate([self._t, t[valid]])
+        self._values = np.concatenate([self._values, values[valid]])
+        self._payload = np.concatenate([self._payload, payload[:, valid]], axis=1)
+        n = len(self._values)
+        stop = n if final else max(self._decided, n - self.order)
+        ixs = self.find(self._values, order=self.order)[0]
+        ixs = ixs[(ixs >= self._decided) & (ixs < stop)]
+        found = self._t[ixs], self._values[ixs], self._payload[:, ixs]
+        if final:
+            self.horizon = _NEVER
+        elif stop < n:
+            self.horizon = self._t[stop]
+        elif len(t):
+            self.horizon = t[-1] + 1
+        keep = max(0, stop - self.order)
+        self._t, self._values, self._payload = self._t[keep:], self._values[keep:], self._payload[:, keep:]
+        self._decided = stop - keep
+        return found
+
+
+class ChunkedRecording:
+    """A recording processed in time blocks, for recordings too long to hold in memory
+
+    Packets are read in chunks and resampled, denoised and reduced to a center of pressure one block of `chunk`
+    samples at a time. Each block is computed with enough samples of the neighbouring blocks around it for every
+    rolling window and extremum to come out exactly as `FloorRecording` computes them on the whole recording. The COP
+    and its velocity are spilled to a memory-mapped file, footsteps and heel strikes are emitted as soon as they are
+    certain, and gait cycles are normalized from the spilled signals after the pass. Peak memory is set by `chunk`
+    and `packet_chunk`, not by the length of the recording, apart from the footsteps and cycles found.
+
+    The whole recording is processed, like an untrimmed `FloorRecording`. In single precision the center of pressure
+    may differ from it in the last bit, as the matrix product is blocked differently for a shorter array.
+
+    Attributes
+    ----------
+    name : str
+    layout : FloorLayout
+        Where the boards are on the floor
+    freq : pandas.Timedelta
+        Spacing of the samples
+    noise : numpy.ndarray
+        (y, x) base pressure, the first sample like `FloorRecording.noise`
+    start : numpy.datetime64
+        Time of the first sample, the first time at which all boards are recording
+    n_samples : int
+        Number of samples processed so far
+    footsteps : List[Footstep]
+        Footsteps emitted so far, like `FloorRecording.footstep_positions`
+    heelstrikes : List[Footstep]
+        Heel strikes found so far, like `FloorRecording.heelstrikes`
+    done : bool
+        Whether the whole recording has been processed
+    """
+
+    def __init__(self, source: Union[str, Iterable[Packets]], freq='40ms', name=None, precision='double',
+                 baseline=None, derivative='central', cycle_length=40, layout=None, chunk=4096, packet_chunk=1 << 16,
+                 spill_dir=None):
+        """
+        Parameters
+        ----------
+        source : str or Iterable[Packets]
+            Path of a raw .csv recording, read `packet_chunk` lines at a time, or chunks of packets in the order
+            they were logged. A board's packets may only arrive out of order within the samples not yet processed
+        chunk : int
+            Number of samples computed per block
+        spill_dir : str, optional
+            Directory for the spilled signals, by default a temporary directory removed by `close`, or once the
+            recording is garbage collected
+
+        See `FloorRecording` for the other parameters.
+        """
+        if isinstance(source, str):
+            name = name or re.match(r'(?:.*/)?(.*)\.csv', source).groups()[0]
+            source = read_packets(source, chunksize=packet_chunk)
+        self.source = source
+        self.name = name
+        self.freq = pd.Timedelta(freq)
+        self.dtype = PRECISIONS[precision]
+        self.baseline = pd.Timedelta(baseline) if baseline is not None else None
+        self.derivative = derivative
+        self.cycle_length = cycle_length
+        if layout is None:
+            layout = FloorLayout.strip(FloorRecording.board_map)
+        self.layout = FloorLayout.from_config(layout) if isinstance(layout, str) else layout
+        self.chunk = chunk
+        self.noise = None
+        self.start = None
+        self.n_samples = 0
+        self.footsteps: List[Footstep] = []
+        self.heelstrikes: List[Footstep] = []
+        self.done = False
+
+        self._step = self.freq.value
+        self._baseline_size = None if self.baseline is None else max(1, round(self.baseline / self.freq))
+        self._margin = KINEMATICS_MARGIN + (0 if self._baseline_size is None else self._baseline_size // 2 + 1)
+        self._weights = cop_weights(np.arange(self.layout.width), np.arange(self.layout.height)[::-1], self.dtype)
+        self._board_ids = np.array(self.layout.board_ids)
+        self._times = [np.empty(0, dtype=np.int64) for _ in self.layout.boards]
+        self._grids = [np.empty((0, *sensor_map.shape), dtype=np.uint16) for sensor_map in self.layout.sensor_maps]
+        self._n_total = None
+        # Spilled (time, [x, y, magnitude, vel_x, vel_y]) signals
+        self.spill_dir = tempfile.mkdtemp(prefix='smartfloor-') if spill_dir is None else spill_dir
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # Remove a directory of our own even if `close` is never called
+        self._cleanup = weakref.finalize(self, shutil.rmtree, self.spill_dir, True) if spill_dir is None else None
+        self._spill_path = os.path.join(self.spill_dir, f'{name or "recording"}.signals')
+        self._signals = None
+        # Event streams, each lagging the last by as little as it needs to be certain
+        self._anchor_extrema = _RunningExtrema(argrelmin, n_payload=3, dtype=self.dtype)
+        self._shift_extrema = _RunningExtrema(argrelmax, dtype=self.dtype)
+        self._anchors = deque()  # Anchors and heels not yet merged into extrema markers
+        self._marks = deque()
+        self._entry = None  # Last extrema marker, waiting on the next one
+        self._steps = []  # Footsteps from index `_step_base` on, the last few not yet labelled
+        self._step_base = 0
+        self._n_labelled = 0
+        self._heels = deque()  # Weight shifts waiting on the next labelled footstep
+        self._next_steps = deque()
+        self._filled = deque([None, None], maxlen=2)  # Footsteps of the last two weight shifts, before filling
+        self._last_heel = None
+        self._windows = []
+
+    def __repr__(self):
+        return f'<ChunkedRecording {self.name}>'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the spilled signals, removing the spill directory if it was created for this recording"""
+        self._signals = None
+        if self._cleanup is not None:
+            self._cleanup()
+
+    def footstep_stream(self) -> Iterator[Footstep]:
+        """Process the recording, yielding each footstep as soon as it is certain
+
+        Returns once the whole recording has been processed, after which `heelstrikes`, `heelstrike_triplet_windows`
+        and `gait_cycles` are available.
+        """
+        if self.done:
+            yield from self.footsteps
+            return
+        with open(self._spill_path, 'wb') as spill:
+            for packets in self.source:
+                self._add(packets)
+                while self._ready():
+                    yield from self._block(spill)
+            if self.start is None:
+                raise ValueError('Not every board of the layout sent a packet')
+            self._n_total = int((min(t[-1] for t in self._times) - self.start) // self._step) + 1
+            while self.n_samples < self._n_total:
+                yield from self._block(spill)
+            yield from self._events(done=True)
+        self._signals = np.memmap(self._spill_path, dtype=self.dtype, mode='r', shape=(self.n_samples, 5))
+        self.done = True
+
+    def run(self) -> 'ChunkedRecording':
+        """Process the whole recording, see `footstep_stream`"""
+        for _ in self.footstep_stream():
+            pass
+        return self
+
+    def _add(self, packets: Packets):
+        """Append a chunk of packets to the buffers of their boards"""
+        order = np.argsort(packets.board_id, kind='stable')
+        ids = packets.board_id[order]
+        lo = np.searchsorted(ids, self._board_ids, side='left')
+        hi = np.searchsorted(ids, self._board_ids, side='right')
+        for slot, (i, j, sensor_map) in enumerate(zip(lo, hi, self.layout.sensor_maps)):
+            if i == j:
+                continue
+            rows = order[i:j]
+            times = np.concatenate([self._times[slot], packets.time[rows].astype(np.int64) * 1_000_000])
+            grids = np.concatenate([self._grids[slot], packets.sensors[rows[:, None, None], sensor_map]])
+            if np.any(times[1:] < times[:-1]):  # Packets were logged out of order
+                by_time = np.argsort(times, kind='stable')
+                times, grids = times[by_time], grids[by_time]
+            self._times[slot], self._grids[slot] = times, grids
+        if self.start is None and all(len(t) for t in self._times):
+            self.start = max(t[0] for t in self._times)
+
+    def _ready(self) -> bool:
+        """Whether every board has a packet after the last sample the next block needs"""
+        if self.start is None:
+            return False
+        last = self.start + (self.n_samples + self.chunk + self._margin - 1) * self._step
+        return all(len(t) and t[-1] > last for t in self._times)
+
+    def _block(self, spill) -> Iterator[Footstep]:
+        """Compute the next `chunk` samples, with `_margin` samples of context either side, and emit their events"""
+        k0 = self.n_samples
+        k1 = k0 + self.chunk if self._n_total is None else min(k0 + self.chunk, self._n_total)
+        lo = max(0, k0 - self._margin)
+        hi = k1 + self._margin if self._n_total is None else min(k1 + self._margin, self._n_total)
+        t = self.start + np.arange(lo, hi, dtype=np.int64) * self._step
+        frames = interpolate_boards(self.layout, list(zip(self._times, self._grids)), t, self.dtype)
+        if self.noise is None:
+            self.noise = frames[..., 0].copy()
+        noise = self.noise if self._baseline_size is None else moving_baseline(frames, self._baseline_size)
+        x, y, magnitude = center_of_pressure(denoise_frames(frames, noise, 3), self._weights)
+        dt = self.freq / pd.Timedelta('1s')
+        vel = time_derivative(np.stack([x, y, magnitude]), dt, self.derivative)
+        mag = np.sqrt(np.square(vel[0]) + np.square(vel[1]))
+        mag_smoothed, mag_roc_smoothed = moving_average(np.stack([mag, time_derivative(mag, dt, self.derivative)]),
+                                                        10)
+        core = slice(k0 - lo, k1 - lo)
+        spill.write(np.ascontiguousarray(np.stack([x, y, magnitude, vel[0], vel[1]], axis=1)[core]).tobytes())
+        t_core = t[core]
+        anchors = self._anchor_extrema.push(t_core, mag_smoothed[core], np.stack([x, y, magnitude])[:, core])
+        shifts = self._shift_extrema.push(t_core, mag_roc_smoothed[core])
+        self._anchors.extend(zip(anchors[0], *anchors[2]))
+        self._marks.extend(shifts[0][shifts[1] > 2.5])
+        self._heels.extend(shifts[0][shifts[1] > 2.5])
+        self.n_samples = k1
+        first_kept = self.start + max(0, k1 - self._margin) * self._step
+        for slot, times in enumerate(self._times):  # Keep the packets the next block interpolates from
+            drop = max(0, np.searchsorted(times, first_kept, side='right') - 1)
+            self._times[slot], self._grids[slot] = times[drop:], self._grids[slot][drop:]
+        yield from self._events(done=False)
+
+    def _events(self, done: bool) -> Iterator[Footstep]:
+        if done:
+            anchors = self._anchor_extrema.push(np.empty(0, dtype=np.int64), np.empty(0, dtype=self.dtype),
+                                                np.empty((3, 0), dtype=self.dtype), final=True)
+            shifts = self._shift_extrema.push(np.empty(0, dtype=np.int64), np.empty(0, dtype=self.dtype), final=True)
+            self._anchors.extend(zip(anchors[0], *anchors[2]))
+            self._marks.extend(shifts[0][shifts[1] > 2.5])
+            self._heels.extend(shifts[0][shifts[1] > 2.5])
+        self._merge_markers(done)
+        for step in self._label_steps(done):
+            self.footsteps.append(step)
+            self._next_steps.append(step)
+            yield step
+        self._match_heels(done)
+
+    def _merge_markers(self, done: bool):
+        """Merge the anchors and heels certain so far into extrema markers, keeping anchors not followed by another
+
+        Follows `FloorRecording.footstep_positions`, markers at the same time are one marker.
+        """
+        horizon = min(self._anchor_extrema.horizon, self._shift_extrema.horizon)
+        markers = []
+        while self._anchors and self._anchors[0][0] < horizon:
+            anchor = self._anchors.popleft()
+            markers.append((anchor[0], anchor))
+        while self._marks and self._marks[0] < horizon:
+            markers.append((self._marks.popleft(), None))
+        markers.sort(key=lambda marker: marker[0])
+        merged = []
+        for t, anchor in markers:
+            if merged and merged[-1][0] == t:
+                merged[-1] = (t, merged[-1][1] or anchor)
+            else:
+                merged.append((t, anchor))
+        for entry in merged:
+            if self._entry is not None and self._entry[1] is not None and entry[1] is None:
+                self._steps.append(self._entry[1])
+            self._entry = entry
+        if done and self._entry is not None:
+            if self._entry[1] is not None:
+                self._steps.append(self._entry[1])
+            self._entry = None
+
+    def _turn(self, i: int) -> Optional[str]:
+        """Foot of step i from its complete triplet, like `FloorRecording._step_dirs` before filling"""
+        n = self._step_base + len(self._steps)
+        if i <= 0 or i >= n - 1:
+            return None
+        (_, x0, y0, m0), (_, x1, y1, m1), (_, x2, y2, m2) = self._steps[i - 1 - self._step_base:
+                                                                        i + 2 - self._step_base]
+        if np.isnan([x0, y0, m0, x1, y1, m1, x2, y2, m2]).any():
+            return None
+        turn = (y2 - y0) * (x1 - x0) - (x2 - x0) * (y1 - y0)
+        return 'right' if turn > 0 else 'left'
+
+    def _label_steps(self, done: bool) -> Iterator[Footstep]:
+        """Label each footstep once the steps its foot is inferred from are certain
+
+        The foot comes from the step's own triplet, failing that the one two steps before, failing that the one two
+        steps after, so a step is certain three steps later.
+        """
+        n = self._step_base + len(self._steps)
+        while self._n_labelled < n and (done or self._n_labelled + 3 < n):
+            i = self._n_labelled
+            foot = self._turn(i)
+            if foot is None and i >= 2:
+                foot = self._turn(i - 2)
+            if foot is None and i + 2 <= n - 1:
+                foot = self._turn(i + 2)
+            t, x, y, magnitude = self._steps[i - self._step_base]
+            yield Footstep(np.datetime64(int(t), 'ns'), x, y, magnitude, foot)
+            self._n_labelled += 1
+        drop = max(0, self._n_labelled - 3 - self._step_base)  # Keep the steps the next labels look back on
+        del self._steps[:drop]
+        self._step_base += drop
+
+    def _match_heels(self, done: bool):
+        """Give each weight shift the next footstep, and keep it as a heel strike like `FloorRecording.heelstrikes`"""
+        while self._heels:
+            heel = np.datetime64(int(self._heels[0]), 'ns')
+            while self._next_steps and self._next_steps[0].time < heel:
+                self._next_steps.popleft()
+            if not self._next_steps and not done:
+                return
+            self._heels.popleft()
+            step = self._next_steps[0] if self._next_steps else None
+            filled = step if step is not None else self._filled[0]  # Assume feet alternation
+            self._filled.append(step)
+            last, self._last_heel = self._last_heel, filled
+            if filled is None or filled.dir is None or np.isnan([filled.x, filled.y, filled.magnitude]).any():
+                continue
+            if last is not None and (filled.x == last.x or filled.y == last.y or filled.magnitude == last.magnitude
+                                     or filled.dir == last.dir):
+                continue  # Disallow repeated values
+            self.heelstrikes.append(filled._replace(time=heel))
+            first = self.heelstrikes[-3] if len(self.heelstrikes) >= 3 else None
+            if first is not None and first.dir == 'right':
+                self._windows.append((first.time, heel))
+
+    @property
+    def signals(self) -> np.ndarray:
+        """(n_samples, 5) memory-mapped x, y and magnitude of the COP, then its x and y velocity, of every sample"""
+        if not self.done:
+            self.run()
+        return self._signals
+
+    @property
+    def times(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(np.datetime64(int(self.start), 'ns') + np.arange(self.n_samples) * self.freq,
+                                name='time')
+
+    @property
+    def heelstrike_triplet_windows(self) -> np.ndarray:
+        """Start and end times of heel strike triplets starting on a right foot, with exceptionally long ones filtered
+
+        The filter compares against the mean duration over the whole recording, so this processes all of it.
+        """
+        if not self.done:
+            self.run()
+        windows = np.array(self._windows, dtype='datetime64[ns]').reshape(-1, 2)
+        durations = windows[:, 1] - windows[:, 0]
+        return windows[durations < durations.mean() * 1.5]
+
+    @property
+    def walk_line(self):
+        """x, y positions of the start and end of the overall trajectory, like `FloorRecording.walk_line`"""
+        if not self.done:
+            self.run()
+        xy = np.array([[step.x, step.y] for step in self.footsteps], dtype=self.dtype).reshape(-1, 2)
+        return xy[:2].mean(axis=0), xy[-2:].mean(axis=0)
+
+    def gait_cycles(self, batch_size=256) -> Iterator[GaitCycleBatch]:
+        """Normalize the gait cycles of the recording, `batch_size` at a time, from the spilled signals
+
+        Each batch only reads the samples its cycles span. The cycles and their names match
+        `GaitCycleBatch.from_floors` on the `FloorRecording` of the same recording.
+        """
+        windows = self.heelstrike_triplet_windows
+        if not len(windows):
+            return
+        start, end = self.walk_line
+        rotation = walk_rotation(start, end)
+        t0 = np.datetime64(int(self.start), 'ns')
+        ixs = ((windows - t0) // self.freq.to_timedelta64()).astype(np.int64)
+        for i in range(0, len(windows), batch_size):
+            batch = windows[i:i + batch_size]
+            lo, hi = max(0, ixs[i, 0] - 1), min(self.n_samples, ixs[i:i + batch_size, 1].max() + 2)
+            x, y, _, vel_x, vel_y = np.asarray(self.signals[lo:hi]).T
+            xy = np.array([x - start[0], y - start[1]])
+            vel = np.array([vel_x, vel_y])
+            pos_med, pos_ant = rotation.astype(xy.dtype).dot(xy)
+            vel_med, vel_ant = rotation.astype(vel.dtype).dot(vel)
+            tensor = normalize_windows(batch, t0 + np.arange(lo, hi) * self.freq.to_timedelta64(),
+                                       [pos_med, pos_ant, vel_med, vel_ant], self.cycle_length, self.dtype, t0=t0)
+            count = len(batch)
+            yield GaitCycleBatch(
+                features=tensor.data.transpose(0, 2, 1).reshape(count, 4 * self.cycle_length),
+                names=[f'{self.name}_c{j}' for j in range(i, i + count)], recordings=[str(self.name)] * count,
+                windows=tensor.windows, med_scale=tensor.med_scale, ant_scale=tensor.ant_scale,
+                ant_offset=tensor.ant_offset)
+
+    def gait_cycle_batch(self, batch_size=256) -> GaitCycleBatch:
+        """All gait cycles of the recording in one batch, see `gait_cycles`"""
+        return GaitCycleBatch.concatenate(list(self.gait_cycles(batch_size)) or
+                                          [GaitCycleBatch.from_floors([])])
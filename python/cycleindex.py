@@ -0,0 +1,230 @@
+# Using NumPy style docstrings
+import json
+from abc import ABC, abstractmethod
+from typing import Tuple, Union
+
+import numpy as np
+from scipy import spatial
+from scipy.cluster.vq import kmeans2
+
+from smartfloor import GaitCycleBatch, top_k
+
+INDEX_VERSION = 1  # bump when the saved layout changes; older files are refused rather than misread
+
+
+class CycleIndex(ABC):
+    """Nearest neighbor index over the features of a library of gait cycles, under the 'euclid' metric
+
+    The indexed cycles are kept as a GaitCycleBatch, so query results can be looked up in its metadata columns.
+    Cycles added after the index was built are searched exactly until the backend absorbs them.
+
+    Attributes
+    ----------
+    batch : GaitCycleBatch
+        Indexed cycles, in insertion order
+    backend : str
+        Name of the backend, used to restore the right subclass in `CycleIndex.load`
+    """
+    backend = None
+
+    def __init__(self, batch: GaitCycleBatch):
+        self.batch = batch
+        self._norms = np.einsum('ij,ij->i', batch.features, batch.features, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.batch)
+
+    def __repr__(self):
+        return f'<{type(self).__name__} of {len(self)} cycles>'
+
+    def add(self, batch: GaitCycleBatch):
+        """Insert new cycles, which get the next row numbers"""
+        start = len(self.batch)
+        self.batch = GaitCycleBatch.concatenate([self.batch, batch])
+        self._norms = np.concatenate([self._norms, np.einsum('ij,ij->i', batch.features, batch.features,
+                                                             dtype=np.float64)])
+        self._insert(start)
+
+    def query(self, other: Union[GaitCycleBatch, np.ndarray], k=1) -> Tuple[np.ndarray, np.ndarray]:
+        """ The k indexed cycles closest to each query
+
+        Parameters
+        ----------
+        other : GaitCycleBatch or numpy.ndarray
+            Query cycles, or their (n, 4 * length) features
+        k : int
+
+        Returns
+        -------
+        distances : numpy.ndarray
+            (n, k) distances in ascending order, inf where fewer than k cycles were found
+        indices : numpy.ndarray
+            (n, k) rows of `batch`, -1 where fewer than k cycles were found
+        """
+        queries = np.atleast_2d(other.features if isinstance(other, GaitCycleBatch) else other).astype(np.float64)
+        distances, indices = np.full((len(queries), k), np.inf), np.full((len(queries), k), -1)
+        if len(self):
+            found_distances, found_indices = self._search(queries, min(k, len(self)))
+            found = found_distances.shape[1]
+            distances[:, :found], indices[:, :found] = found_distances, found_indices
+        return distances, indices
+
+    def _scan(self, queries: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact k nearest among the given rows, using the cached squared norms of the indexed features"""
+        features = self.batch.features[rows].astype(np.float64)
+        squared = self._norms[rows] + np.einsum('ij,ij->i', queries, queries)[:, None] - 2 * queries @ features.T
+        distances, nearest = top_k(np.sqrt(np.maximum(squared, 0)), k)
+        return distances, rows[nearest]
+
+    @abstractmethod
+    def _insert(self, start: int):
+        """Make rows `start:` of `batch` searchable"""
+
+    @abstractmethod
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances and rows of `batch` of the k nearest indexed cycles to each query, nearest first"""
+
+    def _state(self) -> dict:
+        """Backend parameters and arrays to save, besides the batch"""
+        return {}
+
+    def save(self, path):
+        """Write the index and its cycles to a NumPy .npz file, readable without pickle"""
+        meta = {'version': INDEX_VERSION, 'backend': self.backend}
+        state = self._state()
+        meta['params'] = {name: value for name, value in state.items() if not isinstance(value, np.ndarray)}
+        arrays = {name: value for name, value in state.items() if isinstance(value, np.ndarray)}
+        columns = {f'batch_{name}': getattr(self.batch, name) for name in GaitCycleBatch._columns}
+        np.savez(path, meta=np.array(json.dumps(meta)), **columns, **arrays)
+
+    @staticmethod
+    def load(path) -> 'CycleIndex':
+        """Read an index written by `save`"""
+        with np.load(path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz['meta']))
+            if meta['version'] != INDEX_VERSION:
+                raise ValueError(f'{path} is a version {meta["version"]} index, expected {INDEX_VERSION}')
+            batch = GaitCycleBatch(**{name: npz[f'batch_{name}'] for name in GaitCycleBatch._columns})
+            arrays = {name: npz[name] for name in npz.files if name != 'meta' and not name.startswith('batch_')}
+        backend = {cls.backend: cls for cls in (KDTreeIndex, IVFIndex)}[meta['backend']]
+        return backend._restore(batch, meta['params'], arrays)
+
+    @classmethod
+    def _restore(cls, batch: GaitCycleBatch, params: dict, arrays: dict) -> 'CycleIndex':
+        return cls(batch, **params)
+
+
+class KDTreeIndex(CycleIndex):
+    """Exact search with a `scipy.spatial.cKDTree`
+
+    A k-d tree can't grow, so added cycles are scanned exactly alongside it until they make up `rebuild_fraction` of
+    the tree, when it is rebuilt. Saved files hold the features only and the tree is rebuilt on load.
+    """
+    backend = 'kdtree'
+
+    def __init__(self, batch: GaitCycleBatch, leafsize=16, rebuild_fraction=0.1):
+        super().__init__(batch)
+        self.leafsize, self.rebuild_fraction = leafsize, rebuild_fraction
+        self._build()
+
+    def _build(self):
+        self._tree = spatial.cKDTree(self.batch.features, leafsize=self.leafsize) if len(self) else None
+        self._n_tree = len(self)
+
+    def _insert(self, start: int):
+        if len(self) - self._n_tree > self.rebuild_fraction * self._n_tree:
+            self._build()
+
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances, indices = np.empty((len(queries), 0)), np.empty((len(queries), 0), dtype=int)
+        if self._n_tree:
+            distances, indices = self._tree.query(queries, min(k, self._n_tree))
+            distances, indices = distances.reshape(len(queries), -1), indices.reshape(len(queries), -1)
+        if self._n_tree < len(self):
+            pending = self._scan(queries, np.arange(self._n_tree, len(self)), k)
+            distances, order = top_k(np.concatenate([distances, pending[0]], axis=1), k)
+            indices = np.take_along_axis(np.concatenate([indices, pending[1]], axis=1), order, axis=1)
+        return distances, indices
+
+    def _state(self) -> dict:
+        return {'leafsize': self.leafsize, 'rebuild_fraction': self.rebuild_fraction}
+
+
+class IVFIndex(CycleIndex):
+    """Approximate search over an inverted file: cycles are bucketed by their nearest k-means centroid and a query
+    only scans the buckets of its `n_probe` nearest centroids
+
+    Added cycles go into the bucket of their nearest existing centroid, so the centroids drift out of date if the
+    library changes a lot; `train` fits them again.
+
+    Parameters
+    ----------
+    batch : GaitCycleBatch
+    n_lists : int, optional
+        Number of buckets, by default the square root of the number of cycles
+    n_probe : int
+        Number of buckets scanned per query. Higher is slower and finds the true neighbors more often
+    seed : int
+        Seed of the k-means sample and initialization
+    train_size : int
+        Number of cycles per bucket sampled to fit the centroids
+    """
+    backend = 'ivf'
+
+    def __init__(self, batch: GaitCycleBatch, n_lists=None, n_probe=8, seed=0, train_size=64, centroids=None,
+                 assignments=None):
+        super().__init__(batch)
+        self.n_lists, self.n_probe, self.seed, self.train_size = n_lists, n_probe, seed, train_size
+        if centroids is None:
+            self.train()
+        else:
+            self.centroids, self.assignments = centroids, assignments
+            self._invert()
+
+    def train(self):
+        """Fit the centroids to the current cycles and rebucket them"""
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(len(self)))), len(self))
+        if not n_lists:
+            self.centroids, self.assignments = np.empty((0, self.batch.features.shape[1])), np.empty(0, dtype=int)
+        else:
+            rng = np.random.default_rng(self.seed)
+            sample = rng.choice(len(self), min(len(self), self.train_size * n_lists), replace=False)
+            self.centroids, _ = kmeans2(self.batch.features[sample].astype(np.float64), n_lists, minit='points',
+                                        seed=rng)
+            self.assignments = self._nearest_centroids(self.batch.features.astype(np.float64), 1)[:, 0]
+        self._invert()
+
+    def _invert(self):
+        """Group the rows by bucket, as a permutation and the offset of each bucket in it"""
+        self._rows = np.argsort(self.assignments, kind='stable')
+        self._offsets = np.searchsorted(self.assignments[self._rows], np.arange(len(self.centroids) + 1))
+
+    def _nearest_centroids(self, queries: np.ndarray, n: int) -> np.ndarray:
+        squared = np.einsum('ij,ij->i', self.centroids, self.centroids) - 2 * queries @ self.centroids.T
+        return top_k(squared, n)[1]
+
+    def _insert(self, start: int):
+        if not len(self.centroids):
+            self.train()
+            return
+        added = self.batch.features[start:].astype(np.float64)
+        self.assignments = np.concatenate([self.assignments, self._nearest_centroids(added, 1)[:, 0]])
+        self._invert()
+
+    def _search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        probes = self._nearest_centroids(queries, min(self.n_probe, len(self.centroids)))
+        distances, indices = np.full((len(queries), k), np.inf), np.full((len(queries), k), -1)
+        for i, (query, buckets) in enumerate(zip(queries, probes)):
+            rows = np.concatenate([self._rows[self._offsets[b]:self._offsets[b + 1]] for b in buckets])
+            found_distances, found_indices = self._scan(query[None], rows, min(k, len(rows)))
+            found = found_distances.shape[1]
+            distances[i, :found], indices[i, :found] = found_distances[0], found_indices[0]
+        return distances, indices
+
+    def _state(self) -> dict:
+        return {'n_lists': self.n_lists, 'n_probe': self.n_probe, 'seed': self.seed, 'train_size': self.train_size,
+                'centroids': self.centroids, 'assignments': self.assignments}
+
+    @classmethod
+    def _restore(cls, batch: GaitCycleBatch, params: dict, arrays: dict) -> 'IVFIndex':
+        return cls(batch, **params, **arrays)
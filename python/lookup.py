@@ -3,8 +3,7 @@ import numpy as np
 import pandas as pd
 import xarray as xr
 
-from scipy import spatial
-from smartfloor import FloorRecording
+from smartfloor import FloorRecording, GaitCycleBatch
 from segments import test_run as walk_segments
 from segments import time_sync
 
@@ -24,9 +23,7 @@ def plot():
 train = recordings[3:]
 train_segments = walk_segments[3:]
 all_cycles = [(train_segments[i]['name'], cycle) for i, rec in enumerate(train) for cycle in rec.gait_cycles]
-all_feats = [cycle.features for _, cycle in all_cycles]
-tree = spatial.KDTree(all_feats)
+index = GaitCycleBatch.from_cycles([cycle for _, cycle in all_cycles]).build_index('kdtree')
 query_cycle = recordings[2].gait_cycles[0]
-query_feats = [cycle.features for cycle in recordings[2].gait_cycles]
-res = tree.query(query_feats)
-matches = [(all_cycles[i][0], dist) for dist, i in zip(*res)]
+distances, indices = index.query(GaitCycleBatch.from_cycles(recordings[2].gait_cycles))
+matches = [(all_cycles[i][0], dist) for dist, i in zip(distances[:, 0], indices[:, 0])]
@@ -0,0 +1,67 @@
+""" Replay a recorded SmartFloor .csv as a live packet stream
+
+Send a recording to a listening StreamingFloor (see streaming.read_socket), at real time or faster:
+
+    python replay.py data/1_131.2lbs.csv --speed 4 --udp localhost:5005
+
+Or feed it straight into an in-process StreamingFloor and print the center of pressure as it updates:
+
+    python replay.py data/1_131.2lbs.csv --speed 1
+"""
+import argparse
+import socket
+import time
+
+from streaming import StreamingFloor, format_packet, replay_csv
+
+
+def send(packets, address, protocol='udp'):
+    host, port = address.rsplit(':', 1)
+    kind = socket.SOCK_DGRAM if protocol == 'udp' else socket.SOCK_STREAM
+    with socket.socket(socket.AF_INET, kind) as sock:
+        sock.connect((host, int(port)))
+        n = 0
+        for packet in packets:
+            sock.sendall(format_packet(*packet))
+            n += 1
+    return n
+
+
+def print_tick(floor: StreamingFloor):
+    t, _, (x, y, magnitude) = floor.latest
+    print(f'\r{t.strftime("%H:%M:%S.%f")[:-3]}  cop=({x:5.2f}, {y:5.2f})  magnitude={magnitude:7.1f}', end='')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='raw SmartFloor .csv recording')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='playback speed relative to real time, 0 for no pacing')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--udp', metavar='HOST:PORT', help='send packets as UDP datagrams')
+    target.add_argument('--tcp', metavar='HOST:PORT', help='send packets over a TCP connection')
+    parser.add_argument('--quiet', action='store_true', help="don't print each tick of the in-process floor")
+    parser.add_argument('--stale-after', metavar='DURATION',
+                        help="hold a silent board's last readings after this long, e.g. '1s', instead of waiting")
+    args = parser.parse_args()
+
+    packets = replay_csv(args.path, speed=args.speed or None)
+    ts = time.perf_counter()
+    if args.udp or args.tcp:
+        n = send(packets, args.udp or args.tcp, 'udp' if args.udp else 'tcp')
+        ticks = ''
+    else:
+        floor = StreamingFloor(on_tick=None if args.quiet else print_tick, stale_after=args.stale_after)
+        n, ticks = 0, 0
+        for packet in packets:
+            ticks += floor.push(*packet)
+            n += 1
+        ticks = f', {ticks} ticks'
+        if floor.stalled:
+            print(f'\nOutput stalled waiting on boards {", ".join(map(str, floor.stalled))}, see --stale-after')
+    elapsed = time.perf_counter() - ts
+    print(f'\nReplayed {n} packets{ticks} in {elapsed:.2f} s ({n / elapsed:.0f} packets/s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,27 @@
 import os
-import re
+import json
+import hashlib
 import pickle
 import numpy as np
 import pandas as pd
 import smartfloor as sf
 directory = 'data/08-07-2019'
+distance_cache = 'distance_cache'
+participants = range(1, 8)
+styles = ['normal', 'slow', 'hunch', 'stppg', 'lhob', 'rhob']
 
 """ OVERVIEW
 
 The main items of interest are the batch of all gait cycles and the results table.
 
-If they have not yet been pickled you should do so with:
+If they have not yet been saved you should do so with:
 
-    batch = pickle_batch()
+    batch = save_batch()
     df = pickle_df_results(batch)
 
 You can access them later with:
 
-    batch = unpickle_batch()
+    batch = load_batch()
     df = unpickle_df_results()
 
 You can then look at some simple analytics of the results with:
@@ -28,8 +32,26 @@ You can then look at some simple analytics of the results with:
 """
 
 
+def save_batch(path='cycle_batch', workers=None) -> sf.GaitCycleBatch:
+    """ Make a batch of all data, loading the recordings in `workers` processes, and save it with
+    `sf.GaitCycleBatch.save`. Files that fail to load are listed and left out """
+    paths = [f'{directory}/{filename}' for filename in sorted(os.listdir(directory))]
+    cycle_batch, file_results = sf.FloorRecordingBatch.cycles_from_csv(paths, trimmed=True, workers=workers)
+    for result in file_results:
+        if result.error is not None:
+            print(f'Skipped {result.path}:\n{result.error}')
+    cycle_batch.save(path)
+    print(f'Cycles successfully saved to {path}')
+    return cycle_batch
+
+
+def load_batch(path='cycle_batch') -> sf.GaitCycleBatch:
+    """ Load the saved data batch, memory-mapped """
+    return sf.GaitCycleBatch.load(path)
+
+
 def pickle_batch(path='cycle_batch.p') -> sf.GaitCycleBatch:
-    """ Make a batch of all data and save to binary """
+    """ DEPRECATED, use save_batch """
     paths = [f'{directory}/{filename}' for filename in os.listdir(directory)]
     floor_batch = sf.FloorRecordingBatch.from_csv(paths, trimmed=True)
     cycle_batch = floor_batch.gait_cycle_batch
@@ -40,45 +62,91 @@ def pickle_batch(path='cycle_batch.p') -> sf.GaitCycleBatch:
 
 
 def unpickle_batch(path='cycle_batch.p') -> sf.GaitCycleBatch:
-    """ Load the saved data batch """
+    """ DEPRECATED, use load_batch """
     with open(path, 'rb') as f:
         return pickle.load(f)
 
 
-@np.vectorize
-def cycle_style(cycle) -> str:
-    """Extract the gait style string (e.g 'normal', 'lhob') from a data file path"""
-    return re.match(r'^\d_([^_]*)_.*', cycle.name).groups()[0]
-
-
 def cycles_with_style(cycles: sf.GaitCycleBatch, style: str) -> sf.GaitCycleBatch:
     """Filter a batch of cycles by a gait style string (e.g 'normal', 'lhob')"""
-    return sf.GaitCycleBatch([cycle for cycle in cycles if cycle_style(cycle) == style])
+    return cycles[cycles.styles == style]
+
+
+def distance_matrix_key(batch: sf.GaitCycleBatch, metric: str, band=None) -> str:
+    """Digest of everything a distance matrix depends on: the cycle features and names and the metric parameters"""
+    digest = hashlib.sha1(json.dumps({'metric': metric, 'band': band, 'shape': batch.features.shape}).encode())
+    digest.update(batch.features.tobytes())
+    digest.update('\n'.join(batch.names).encode())
+    return digest.hexdigest()
 
 
-def result_entries_generator(batch, *args, **kwargs):
+def distance_matrix(batch: sf.GaitCycleBatch, metric='weighted_mix', band=None, cache_dir=distance_cache) -> np.ndarray:
+    """
+    Distances between every pair of cycles in the batch, row = query and column = reference, computed once and
+    then loaded from `cache_dir`
+
+    Parameters
+    ----------
+    batch : sf.GaitCycleBatch
+        All cycles for the experiment
+    metric : str
+        Distance measure, see `sf.GaitCycle.metrics`
+    band : int, optional
+        Sakoe-Chiba band half width for 'dtw' and 'frechet'
+    cache_dir : str, optional
+        Directory of cached matrices, keyed by `distance_matrix_key`. None to always recompute
+
+    Returns
+    ----------
+    distances : np.ndarray
+        (len(batch), len(batch)) distances
+    """
+    path = f'{cache_dir}/{metric}-{distance_matrix_key(batch, metric, band)}.npy' if cache_dir else None
+    if path and os.path.exists(path):
+        return np.load(path)
+    distances = batch.distances(batch, metric, band)
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(f'{path}.tmp.npy', distances)
+        os.replace(f'{path}.tmp.npy', path)  # never leave a partial matrix under the real name
+    return distances
+
+
+def result_entries_generator(batch, metric='weighted_mix', band=None, cache_dir=distance_cache,
+                             pids=participants, gait_styles=styles):
     """
     Generate dictionaries representing the results of one style of cycles of one participant against all styles of
     cycles of all other participant
 
+    Every fold reads its top match from one distance matrix over the whole batch (see `distance_matrix`), with the
+    held out participant's columns masked out
+
     Parameters
     ----------
     batch : sf.GaitCycleBatch
         All cycles for the experiment
+    metric, band, cache_dir
+        Passed on to `distance_matrix`
+    pids : Iterable[int]
+        Participants to hold out in turn
+    gait_styles : Iterable[str]
+        Styles to report for each participant
 
     Yields
     ----------
     entry : dict
     """
-    for pid in range(7):
-        train, test = batch.partition_names(rf'{pid + 1}_.*', reverse=True)
-        for style in ['normal', 'slow', 'hunch', 'stppg', 'lhob', 'rhob']:
-            test_cycles = cycles_with_style(test, style)
-            dist, neighbors = train.query_batch(test_cycles, *args, **kwargs)
-            best_match_style = cycle_style(neighbors[:, 0])  # Style of the top match for each cycle
+    distances = distance_matrix(batch, metric, band, cache_dir)
+    for pid in pids:
+        held_out = batch.participants == pid
+        train = np.flatnonzero(~held_out)
+        for style in gait_styles:
+            test = np.flatnonzero(held_out & (batch.styles == style))
+            nearest = train[distances[np.ix_(test, train)].argmin(axis=1)] if len(train) else test[:0]
+            best_match_style = batch.styles[nearest]  # Style of the top match for each cycle
             num_correct = np.count_nonzero(best_match_style == style)
-            print(f'Participant {pid + 1} {style}: {num_correct} / {len(test_cycles)} = {num_correct / len(test_cycles) * 100:.0f}%')
-            yield {'pid': pid + 1, 'style': style, 'correct': num_correct, 'total': len(test_cycles)}
+            print(f'Participant {pid} {style}: {num_correct} / {len(test)} = {num_correct / len(test) * 100:.0f}%')
+            yield {'pid': pid, 'style': style, 'correct': num_correct, 'total': len(test)}
 
 
 def pickle_df_results(batch=None, df=None, path='df_results.p', *args, **kwargs) -> pd.DataFrame:
@@ -107,7 +175,6 @@ def res_style_accuracy(df) -> pd.Series:
 
 def res_style_summary(df) -> float:
     """ Overall accuracy for the entire experiment"""
-    styles = ['normal', 'slow', 'hunch', 'stppg', 'lhob', 'rhob']
     return df.groupby('style').sum().loc[styles]
 
 
@@ -125,10 +192,10 @@ def res_overall_accuracy(df) -> float:
 def main():
     try:
         global batch, train, test
-        batch = unpickle_batch()
+        batch = load_batch()
         train, test = batch.partition_names(rf'7_.*', reverse=True)
     except FileNotFoundError:
-        print("You haven't pickled a batch of cycles yet!")
+        print("You haven't saved a batch of cycles yet!")
 
 
 metrics = ['euclid', 'weighted_pos', 'weighted_vel', 'weighted_mix']
@@ -1,45 +1,1069 @@
 # Using NumPy style docstrings
 from datetime import datetime
-from typing import List, Tuple
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 import xarray as xr
 import re
-from scipy.signal import argrelmin, argrelmax
+import os
+import json
+import hashlib
+from scipy.signal import argrelmin, argrelmax, savgol_filter
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
 from scipy import spatial
-import matplotlib.pyplot as plt
 import time
 import functools
+import weakref
+import traceback
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import similaritymeasures
 
 
+class ReifyCache(object):
+    """Bookkeeping for the values cached by `reify` properties, with LRU eviction of large ones over a budget
+
+    Values stay on their instance like plain attributes. Evicting one just deletes it, so it is recomputed on its
+    next access. Only numeric arrays of at least `min_bytes` are evicted. Values that were assigned rather than
+    computed are pinned, since they could not be recomputed. Plain attributes are outside the budget. The only large
+    ones are the raw input of a recording: `FloorRecording.df` and the grids of its `boards`.
+
+    Attributes
+    ----------
+    max_bytes : int, optional
+        Budget for all cached values together, unbounded if None
+    max_instance_bytes : int, optional
+        Budget for the cached values of any one object, e.g. one FloorRecording, unbounded if None
+    min_bytes : int
+        Values smaller than this are never evicted
+    hits, misses, evictions : int
+        Counts of cached reads, computed reads and values evicted to stay within budget
+    """
+
+    def __init__(self, max_bytes=None, max_instance_bytes=None, min_bytes=1 << 16):
+        self.max_bytes = max_bytes
+        self.max_instance_bytes = max_instance_bytes
+        self.min_bytes = min_bytes
+        self.hits = self.misses = self.evictions = 0
+        self._lru = OrderedDict()  # (id(inst), name) -> nbytes, least recently used first
+        self._instances = {}  # id(inst) -> (weakref to inst, OrderedDict of name -> nbytes)
+        self._instance_bytes = {}
+        self._pinned = set()
+        self._nbytes = 0
+
+    @staticmethod
+    def sizeof(value) -> int:
+        """Bytes held by a cached value's numeric arrays. Anything else, e.g. arrays of GaitCycles, counts as zero"""
+        if isinstance(value, (list, tuple)):
+            return sum(ReifyCache.sizeof(v) for v in value)
+        if isinstance(value, (xr.DataArray, xr.Dataset)):
+            return value.nbytes
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            return value.nbytes
+        return 0
+
+    def hit(self, inst, name: str, value):
+        self.hits += 1
+        key = (id(inst), name)
+        if key in self._lru:
+            self._lru.move_to_end(key)
+            self._instances[key[0]][1].move_to_end(name)
+        else:  # Set before it was tracked, e.g. by unpickling
+            self._add(inst, name, value)
+
+    def miss(self, inst, name: str, value):
+        self.misses += 1
+        self._add(inst, name, value)
+
+    def assign(self, inst, name: str, value):
+        self._pinned.add((id(inst), name))
+        self._add(inst, name, value)
+
+    def pin(self, inst, *names):
+        """Never evict these properties of inst, whether or not they are computed yet"""
+        self._pinned.update((id(inst), name) for name in names)
+
+    def unpin(self, inst, *names):
+        self._pinned.difference_update((id(inst), name) for name in names)
+
+    def release(self, inst=None, *names):
+        """Drop cached values, pinned or not: the given properties of inst, all of inst's, or everything if inst is None
+        """
+        ids = list(self._instances) if inst is None else [id(inst)]
+        for key in ids:
+            if key in self._instances:
+                for name in list(names or self._instances[key][1]):
+                    self._drop(key, name)
+
+    def nbytes(self, inst=None) -> int:
+        """Bytes held for inst, or for every instance if inst is None"""
+        return self._nbytes if inst is None else self._instance_bytes.get(id(inst), 0)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'entries': len(self._lru),
+                'nbytes': self._nbytes, 'pinned': len(self._pinned)}
+
+    def _add(self, inst, name, value):
+        key = id(inst)
+        if key not in self._instances:
+            self._instances[key] = (weakref.ref(inst, lambda _, key=key: self._forget(key)), OrderedDict())
+            self._instance_bytes[key] = 0
+        self._drop(key, name, keep_value=True)
+        nbytes = self.sizeof(value)
+        self._lru[key, name] = nbytes
+        self._instances[key][1][name] = nbytes
+        self._instance_bytes[key] += nbytes
+        self._nbytes += nbytes
+        if self.max_instance_bytes is not None:
+            self._evict(self._instances[key][1], lambda: self._instance_bytes.get(key, 0) > self.max_instance_bytes,
+                        lambda entry: (key, entry))
+        if self.max_bytes is not None:
+            self._evict(self._lru, lambda: self._nbytes > self.max_bytes, lambda entry: entry)
+
+    def _evict(self, entries, over_budget, as_key):
+        for entry, nbytes in list(entries.items()):
+            if not over_budget():
+                return
+            key = as_key(entry)
+            if nbytes >= self.min_bytes and key not in self._pinned and key != next(reversed(self._lru)):
+                self._drop(*key)
+                self.evictions += 1
+
+    def _drop(self, key, name, keep_value=False):
+        nbytes = self._lru.pop((key, name), None)
+        if nbytes is None:
+            return
+        ref, names = self._instances[key]
+        del names[name]
+        self._instance_bytes[key] -= nbytes
+        self._nbytes -= nbytes
+        inst = ref()
+        if not keep_value and inst is not None:
+            inst.__dict__.pop(name, None)
+
+    def _forget(self, key):
+        """Stop tracking an instance that was garbage collected"""
+        _, names = self._instances.pop(key)
+        for name in names:
+            self._nbytes -= self._lru.pop((key, name))
+        del self._instance_bytes[key]
+        self._pinned = {pinned for pinned in self._pinned if pinned[0] != key}
+
+
+reify_cache = ReifyCache()  # Tracks every reify property; set its budgets to bound memory
+
+
+class StageRecord(NamedTuple):
+    """One timed run of a pipeline stage, see `Profiler`"""
+    stage: str  # e.g. 'FloorRecording.cop'
+    recording: Optional[str]  # name of the recording, cycle or file the stage ran on
+    start: float  # seconds since the profiler was first enabled
+    wall: float  # seconds
+    own_wall: float  # seconds not spent in nested stages
+    cpu: float  # process CPU seconds
+    peak_bytes: Optional[int]  # peak of the memory allocated during the stage, if memory tracing was on
+    nbytes: int  # bytes of numeric arrays in the stage's result, as counted by ReifyCache.sizeof
+    depth: int  # number of enclosing stages
+
+
+class Profiler(object):
+    """Records wall time, CPU time, peak allocation and result size of every `reify` property and `timeit` stage
+
+    Disabled by default, when a stage costs a single attribute check. Records can be exported as a table, JSON, CSV
+    or a Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+
+    Attributes
+    ----------
+    enabled : bool
+    memory : bool
+        Whether peak allocations are traced with tracemalloc, which slows Python code down considerably
+    records : List[StageRecord]
+        Finished stages, in the order they finished
+    """
+
+    def __init__(self):
+        self.enabled = self.memory = False
+        self.records = []
+        self._stack = []  # [wall start, cpu start, memory at start, peak seen, wall of nested stages] per open stage
+        self._origin = None
+        self._tracing = False
+
+    def enable(self, memory=False):
+        self.enabled, self.memory = True, memory
+        if self._origin is None:
+            self._origin = time.perf_counter()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def disable(self):
+        self.enabled = False
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = self.memory = False
+
+    def clear(self):
+        self.records = []
+        self._origin = time.perf_counter() if self.enabled else None
+
+    def call(self, stage: str, owner, func, *args, **kwargs):
+        """Return func(*args, **kwargs), recording it as `stage` of `owner` if the profiler is enabled"""
+        if not self.enabled:
+            return func(*args, **kwargs)
+        frame = self._enter()
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        finally:
+            self._exit(frame, stage, owner, result)
+
+    @staticmethod
+    def _owner_name(owner) -> Optional[str]:
+        if owner is None or isinstance(owner, str):
+            return owner
+        name = getattr(owner, 'name', None)
+        if name is None and isinstance(owner, BoardRecording):
+            name = f'board {owner.id}'
+        return None if name is None else str(name)
+
+    def _enter(self) -> list:
+        memory = peak = 0
+        if self.memory:
+            memory, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][3] = max(self._stack[-1][3], peak)
+            tracemalloc.reset_peak()
+        frame = [time.perf_counter(), time.process_time(), memory, 0, 0.0]
+        self._stack.append(frame)
+        return frame
+
+    def _exit(self, frame: list, stage: str, owner, result):
+        wall, cpu = time.perf_counter() - frame[0], time.process_time() - frame[1]
+        self._stack.pop()
+        peak_bytes = None
+        if self.memory:
+            peak = max(frame[3], tracemalloc.get_traced_memory()[1])
+            peak_bytes = peak - frame[2]
+            if self._stack:
+                self._stack[-1][3] = max(self._stack[-1][3], peak)
+        if self._stack:
+            self._stack[-1][4] += wall
+        self.records.append(StageRecord(stage, self._owner_name(owner), frame[0] - self._origin, wall, wall - frame[4],
+                                        cpu, peak_bytes, ReifyCache.sizeof(result), len(self._stack)))
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.records, columns=StageRecord._fields)
+
+    def summary(self) -> pd.DataFrame:
+        """Totals per stage, the stages that took the most time of their own first"""
+        df = self.to_frame()
+        grouped = df.groupby('stage').agg(calls=('wall', 'size'), wall=('wall', 'sum'), own_wall=('own_wall', 'sum'),
+                                          cpu=('cpu', 'sum'), peak_bytes=('peak_bytes', 'max'),
+                                          nbytes=('nbytes', 'sum'))
+        return grouped.sort_values('own_wall', ascending=False)
+
+    def to_json(self, path=None) -> Optional[str]:
+        """Records as a JSON list of objects, written to `path` or returned if it is None"""
+        text = json.dumps([record._asdict() for record in self.records])
+        if path is None:
+            return text
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def to_csv(self, path):
+        self.to_frame().to_csv(path, index=False)
+
+    def to_chrome_trace(self, path=None) -> Optional[str]:
+        """Records in the Chrome trace event format, written to `path` or returned if it is None"""
+        events = [{'name': record.stage, 'cat': 'smartfloor', 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                   'ts': record.start * 1e6, 'dur': record.wall * 1e6,
+                   'args': {'recording': record.recording, 'cpu_ms': record.cpu * 1000,
+                            'peak_bytes': record.peak_bytes, 'nbytes': record.nbytes}}
+                  for record in self.records]
+        text = json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
+        if path is None:
+            return text
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+profiler = Profiler()  # Records pipeline stages once enabled with profiler.enable()
+
+
+def timeit(method):
+    """Record every call of a pipeline stage with `profiler`, tagged by its first argument's name"""
+    stage = method.__qualname__
+
+    @functools.wraps(method)
+    def timed(*args, **kw):
+        if not profiler.enabled:
+            return method(*args, **kw)
+        return profiler.call(stage, args[0] if args else None, method, *args, **kw)
+    return timed
+
+
 class Descriptor(object):
     def __init__(self, func):
         self.func = func
-
-    def __get__(self, inst, type=None):
-        val = self.func(inst)
-        setattr(inst, self.func.__name__, val)
+        self.name = func.__name__
+
+    def __get__(self, inst, owner=None):
+        if inst is None:
+            return self
+        try:
+            val = inst.__dict__[self.name]
+        except KeyError:
+            if profiler.enabled:
+                val = profiler.call(f'{type(inst).__name__}.{self.name}', inst, self.func, inst)
+            else:
+                val = self.func(inst)
+            inst.__dict__[self.name] = val
+            reify_cache.miss(inst, self.name, val)
+        else:
+            reify_cache.hit(inst, self.name, val)
         return val
 
+    def __set__(self, inst, val):
+        inst.__dict__[self.name] = val
+        reify_cache.assign(inst, self.name, val)
+
+    def __delete__(self, inst):
+        inst.__dict__.pop(self.name, None)
+        reify_cache.release(inst, self.name)
+
 
 def reify(func):
     return functools.wraps(func)(Descriptor(func))
 
 
-def _df_from_csv(path) -> pd.DataFrame:
-    columns = ['board_id', 'time', *range(48)]  # column names
-    df_raw = pd.read_csv(path, engine='python', names=columns, index_col=1)
-    df_raw.index = pd.to_datetime(df_raw.index, unit='ms')
-    return df_raw
+class Packets(NamedTuple):
+    """Raw SmartFloor board packets as compact column arrays
+
+    Attributes
+    ----------
+    board_id : numpy.ndarray
+        (n,) uint16 ID of the board that sent each packet
+    time : numpy.ndarray
+        (n,) int64 packet timestamps in milliseconds since the epoch
+    sensors : numpy.ndarray
+        (n, 48) uint16 sensor readings, with columns in sensor id order
+    """
+    board_id: np.ndarray
+    time: np.ndarray
+    sensors: np.ndarray
+
+
+class CycleTensor(NamedTuple):
+    """Gait cycles of a recording, normalized onto a common number of samples
+
+    Attributes
+    ----------
+    windows : numpy.ndarray
+        (n_cycles, 2) start and end time of each cycle
+    data : numpy.ndarray
+        (n_cycles, length, 4) med and ant position, then med and ant velocity, of each cycle
+    med_scale : numpy.ndarray
+        (n_cycles,) twice the widest mediolateral excursion of each cycle, which med values are divided by
+    ant_scale : numpy.ndarray
+        (n_cycles,) anteroposterior distance covered by each cycle, which ant values are divided by
+    ant_offset : numpy.ndarray
+        (n_cycles,) anteroposterior position at the start of each cycle, subtracted from ant positions
+    """
+    windows: np.ndarray
+    data: np.ndarray
+    med_scale: np.ndarray
+    ant_scale: np.ndarray
+    ant_offset: np.ndarray
+
+
+N_SENSORS = 48  # sensor readings per board packet
+_PACKET_COLUMNS = ['board_id', 'time', *range(N_SENSORS)]
+_PACKET_DTYPES = {'board_id': np.uint16, 'time': np.int64, **{i: np.uint16 for i in range(N_SENSORS)}}
+
+
+def _packets_from_df(df: pd.DataFrame) -> Packets:
+    return Packets(board_id=df['board_id'].to_numpy(),
+                   time=df['time'].to_numpy(),
+                   sensors=df[list(range(N_SENSORS))].to_numpy())
+
+
+def read_packets(path, chunksize=None):
+    """Parse a raw SmartFloor .csv recording into typed packet arrays
+
+    Uses the compiled pandas parser with fixed dtypes, so no intermediate int64/object columns are built.
+
+    Parameters
+    ----------
+    path : str
+        Path to a raw recording, one packet per line: board_id, ms timestamp, 48 sensor readings
+    chunksize : int, optional
+        If given, parse lazily and yield one Packets object per `chunksize` lines
+
+    Returns
+    -------
+    packets : Packets or Iterator[Packets]
+        All packets in the file, or an iterator over chunks of them if `chunksize` is set
+    """
+    reader = pd.read_csv(path, engine='c', header=None, names=_PACKET_COLUMNS, dtype=_PACKET_DTYPES,
+                         chunksize=chunksize)
+    if chunksize is None:
+        return _packets_from_df(reader)
+    return (_packets_from_df(chunk) for chunk in reader)
+
+
+def _group_by_board(packets: Packets) -> Packets:
+    """Reorder packets so each board's packets are contiguous, keeping their original order within a board"""
+    order = np.argsort(packets.board_id, kind='stable')
+    return Packets(*(arr[order] for arr in packets))
+
+
+_CACHE_VERSION = 1
+
+
+def _file_digest(path) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_cache(cache_dir, path) -> Optional[Packets]:
+    """Memory-map the cached packets for a recording, or return None if the cache is missing or stale"""
+    try:
+        with open(f'{cache_dir}/meta.json') as f:
+            meta = json.load(f)
+        stat = os.stat(path)
+        if meta['version'] != _CACHE_VERSION or meta['size'] != stat.st_size:
+            return None
+        if meta['mtime_ns'] != stat.st_mtime_ns:
+            if meta['sha1'] != _file_digest(path):
+                return None
+            meta['mtime_ns'] = stat.st_mtime_ns  # Same contents, e.g. touched or copied, so skip hashing next time
+            try:
+                with open(f'{cache_dir}/meta.json', 'w') as f:
+                    json.dump(meta, f)
+            except OSError:
+                pass  # Caching is best effort, e.g. the data directory may be read-only
+        return Packets(*(np.load(f'{cache_dir}/{field}.npy', mmap_mode='r') for field in Packets._fields))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_cache(cache_dir, path, packets: Packets):
+    """Save packets as a set of .npy files, writing the metadata last so a partial write is never reused"""
+    stat = os.stat(path)
+    meta = {'version': _CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha1': _file_digest(path)}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(f'{cache_dir}/meta.json'):
+            os.remove(f'{cache_dir}/meta.json')
+        for field, arr in zip(Packets._fields, packets):
+            np.save(f'{cache_dir}/{field}.npy', arr)
+        with open(f'{cache_dir}/meta.json', 'w') as f:
+            json.dump(meta, f)
+    except OSError:
+        pass  # Caching is best effort, e.g. the data directory may be read-only
+
+
+@timeit
+def load_packets(path, cache=True) -> Packets:
+    """Load the packets of a raw recording, grouped by board, through a binary sidecar cache
+
+    The first load parses the .csv and saves the packets as memory-mappable .npy files in a `<path>.npcache`
+    directory. Later loads memory-map those files instead of parsing. The cache is keyed by the file's size,
+    modification time and SHA-1 digest, and is rebuilt whenever the .csv changes.
+
+    Parameters
+    ----------
+    path : str
+        Path to a raw SmartFloor .csv recording
+    cache : bool
+        Whether to read and write the sidecar cache at all
+
+    Returns
+    -------
+    packets : Packets
+        All packets in the file, contiguous per board
+    """
+    cache_dir = f'{path}.npcache'
+    packets = _read_cache(cache_dir, path) if cache else None
+    if packets is None:
+        packets = _group_by_board(read_packets(path))
+        if cache:
+            _write_cache(cache_dir, path, packets)
+    return packets
+
+
+def _df_from_packets(packets: Packets) -> pd.DataFrame:
+    df = pd.DataFrame(packets.sensors, columns=range(N_SENSORS),
+                      index=pd.DatetimeIndex(packets.time.astype('datetime64[ms]'), name='time'))
+    df.insert(0, 'board_id', packets.board_id)
+    return df
+
+
+def _df_from_csv(path, cache=False) -> pd.DataFrame:
+    return _df_from_packets(load_packets(path, cache=cache))
+
+
+PRECISIONS = {'double': np.float64, 'single': np.float32}  # float dtype of derived signals for each precision mode
 
 
 def _nonnegative_darray(da: xr.DataArray):
     return da.where(da > 0).fillna(0)
 
 
+def denoise_frames(frames: np.ndarray, noise: np.ndarray, dist: int) -> np.ndarray:
+    """Subtract base pressure and zero every tile outside the square around each frame's point of maximum pressure
+
+    Works on the (y, x, time) layout of `FloorRecording.samples`, where each tile's stream is contiguous, so every
+    step is one pass over the array.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        (y, x, time) sensor readings
+    noise : numpy.ndarray
+        (y, x) base pressure subtracted from every frame, or a (y, x, time) moving baseline
+    dist : int
+        Maximum permitted Chebyshev distance, in tiles, from the point of highest pressure
+
+    Returns
+    -------
+    pressure : numpy.ndarray
+        (y, x, time) nonnegative pressure, zero outside the square. Missing readings count as zero
+    """
+    pressure = frames - (noise[..., None] if noise.ndim == 2 else noise)
+    np.fmax(pressure, 0, out=pressure)
+    height, width, n = pressure.shape
+    peak = pressure.reshape(-1, n).max(axis=0)
+    # Ties go to the first maximum of the x, y stack: the leftmost column holding the peak, then its top row
+    column_peak = np.zeros((width, n), dtype=bool)
+    for row in pressure:
+        column_peak |= row == peak
+    x_max = np.argmax(column_peak, axis=0)
+    y_max = np.argmax(pressure[:, x_max, np.arange(n)] == peak, axis=0)
+    in_square = ((np.abs(np.arange(height)[:, None] - y_max) <= dist)[:, None, :]
+                 & (np.abs(np.arange(width)[:, None] - x_max) <= dist)[None, :, :])
+    np.multiply(pressure, in_square, out=pressure)
+    return pressure
+
+
+def moving_baseline(frames: np.ndarray, size: int) -> np.ndarray:
+    """Per-tile minimum of the readings over a centred window of `size` frames
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        (y, x, time) sensor readings
+    size : int
+        Window length in frames
+
+    Returns
+    -------
+    baseline : numpy.ndarray
+        (y, x, time) base pressure under each frame, ignoring missing readings
+    """
+    return minimum_filter1d(np.nan_to_num(frames, nan=np.inf), size, axis=-1, mode='nearest')
+
+
+def cop_weights(x: np.ndarray, y: np.ndarray, dtype=np.float64) -> np.ndarray:
+    """Weights that reduce a flattened (y, x) frame to its pressure magnitude and x and y moments
+
+    Parameters
+    ----------
+    x : numpy.ndarray
+        (width,) x coordinate of each column
+    y : numpy.ndarray
+        (height,) y coordinate of each row
+    dtype : numpy.dtype
+        Float dtype of the frames they will be applied to
+
+    Returns
+    -------
+    weights : numpy.ndarray
+        (3, height * width) rows of ones, x coordinates and y coordinates
+    """
+    yy, xx = np.meshgrid(y, x, indexing='ij')
+    return np.stack([np.ones_like(xx), xx, yy]).reshape(3, -1).astype(dtype)
+
+
+def center_of_pressure(frames: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Center of pressure of each frame, from one matrix product against `cop_weights`
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        (y, x, time) pressure of a recording, or a single (y, x) frame
+    weights : numpy.ndarray
+        Output of `cop_weights` for the frames' coordinates
+
+    Returns
+    -------
+    x, y, magnitude : numpy.ndarray
+        Center of pressure coordinates and total pressure, with the frames' trailing shape. The coordinates are NaN
+        for frames with no pressure
+    """
+    magnitude, x_moment, y_moment = (weights @ frames.reshape(weights.shape[1], -1)).reshape(3, *frames.shape[2:])
+    loaded = magnitude > 0
+    x = np.divide(x_moment, magnitude, out=np.full_like(x_moment, np.nan), where=loaded)
+    y = np.divide(y_moment, magnitude, out=np.full_like(y_moment, np.nan), where=loaded)
+    return x, y, magnitude
+
+
+def time_derivative(values: np.ndarray, dt: float, scheme='central', window=7, polyorder=2) -> np.ndarray:
+    """Rate of change of evenly spaced samples along the last axis
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        Samples, with time along the last axis
+    dt : float
+        Sample spacing in seconds
+    scheme : str
+        'central' for the mean of the forward and backward differences, NaN at both ends. 'savgol' for the derivative
+        of a Savitzky-Golay fit
+    window, polyorder : int
+        Window length and polynomial order of the Savitzky-Golay fit
+
+    Returns
+    -------
+    derivative : numpy.ndarray
+        Like `values`, in units per second
+    """
+    if scheme == 'central':
+        steps = np.diff(values, axis=-1)
+        derivative = np.full_like(values, np.nan)
+        derivative[..., 1:-1] = (steps[..., 1:] + steps[..., :-1]) / (2 * dt)  # NaN wherever a sample is missing
+        return derivative
+    if scheme == 'savgol':
+        derivative = savgol_filter(values, window, polyorder, deriv=1, delta=dt, axis=-1, mode='nearest')
+        return derivative.astype(values.dtype, copy=False)
+    raise ValueError(f'Unknown derivative scheme {scheme!r}')
+
+
+def moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    """Centred moving average along the last axis, placed like xarray's `rolling(center=True).mean()`
+
+    Windows containing a NaN, and the `window // 2` samples at the start and `(window - 1) // 2` at the end, are NaN
+    """
+    averaged = np.full_like(values, np.nan)
+    if values.shape[-1] >= window:
+        means = np.lib.stride_tricks.sliding_window_view(values, window, axis=-1).mean(axis=-1)
+        averaged[..., window // 2:window // 2 + means.shape[-1]] = means
+    return averaged
+
+
+def interpolate_boards(layout: 'FloorLayout', boards: List[Tuple[np.ndarray, np.ndarray]], t: np.ndarray,
+                       dtype=np.float64) -> np.ndarray:
+    """Linearly interpolate every board of a layout onto the same times, in one batched operation per board
+
+    Parameters
+    ----------
+    layout : FloorLayout
+        Where the boards are on the floor
+    boards : List[Tuple[numpy.ndarray, numpy.ndarray]]
+        For each board of `layout`, the int64 ns timestamps of its packets, increasing, and their (time, height, width)
+        readings as produced by `BoardRecording.demux`
+    t : numpy.ndarray
+        int64 ns times to sample at, outside a board's packets its first or last two packets are extrapolated
+    dtype : numpy.dtype
+        Float dtype of the output
+
+    Returns
+    -------
+    frames : numpy.ndarray
+        (y, x, time) readings of the whole floor, zero on tiles that no board covers
+
+    Raises
+    ------
+    ValueError
+        If a board has fewer than two packets, or its first or last two packets share a timestamp and `t` reaches
+        past them, so there is no interval to interpolate over
+    """
+    out = np.zeros((layout.height, layout.width, len(t)), dtype=dtype)
+    for board, sensor_map, (board_t, grid) in zip(layout.boards, layout.sensor_maps, boards):
+        if len(board_t) < 2:
+            raise ValueError(f'Board {board.board_id} has {len(board_t)} packets, at least 2 are needed to interpolate')
+        i = np.clip(np.searchsorted(board_t, t, side='right') - 1, 0, len(board_t) - 2)
+        span = board_t[i + 1] - board_t[i]
+        if not span.all():  # Only the clipped first or last interval can be empty
+            raise ValueError(f'Board {board.board_id} has duplicate timestamps at the start or end of its packets')
+        w = ((t - board_t[i]) / span).astype(dtype)
+        lo, hi = grid[i].astype(dtype), grid[i + 1].astype(dtype)
+        out[layout.rows(board, sensor_map), board.x:board.x + sensor_map.shape[1]] = np.moveaxis(
+            lo + (hi - lo) * w[:, None, None], 0, -1)
+    return out
+
+
+def walk_rotation(start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """Clockwise rotation taking x, y offsets to mediolateral, anteroposterior ones along a walk line
+
+    Parameters
+    ----------
+    start, end : numpy.ndarray
+        (2,) x, y position of the start and end of the walk line
+
+    Returns
+    -------
+    rotation : numpy.ndarray
+        (2, 2) matrix whose product with (2, n) x, y offsets gives (2, n) med, ant offsets
+    """
+    v_line = end - start
+    v_rot = np.array([v_line[1], -v_line[0]])  # Rotate v_line 90 degrees clockwise
+    c, s = v_rot / np.linalg.norm(v_rot)  # Cosine and sine from unit vector
+    return np.array([[c, s], [-s, c]])  # Clockwise rotation matrix
+
+
+def normalize_windows(windows: np.ndarray, times: np.ndarray, signals: List[np.ndarray], length: int,
+                      dtype=np.float64, t0=None) -> CycleTensor:
+    """Resample the mlap position and velocity of many time windows onto `length` samples each, at once
+
+    Parameters
+    ----------
+    windows : numpy.ndarray
+        (n_cycles, 2) start and end times
+    times : numpy.ndarray
+        Times of the signal samples, increasing
+    signals : List[numpy.ndarray]
+        med and ant position, then med and ant velocity, at `times`
+    length : int
+        Number of samples per cycle
+    dtype : numpy.dtype
+        Float dtype of the output
+    t0 : numpy.datetime64, optional
+        Time the sample times are measured from, by default the first of `times`. Signals cut from a longer
+        recording interpolate exactly like the whole recording when given its first time
+
+    Returns
+    -------
+    cycles : CycleTensor
+        Positions normalized so each cycle starts at ant = 0, ends at ant = 1, and spans med = -0.5 to 0.5 at
+        its widest. Velocities are divided by the same scales
+    """
+    windows = np.asarray(windows, dtype='datetime64[ns]').reshape(-1, 2)
+    t0 = np.datetime64(times[0] if t0 is None else t0, 'ns')
+    grid = (times - t0).astype('timedelta64[ns]').astype(np.float64)
+    start, end = ((windows[:, i] - t0).astype(np.int64).astype(np.float64) for i in (0, 1))
+    times = start[:, None] + (end - start)[:, None] * np.linspace(0, 1, length)
+    data = np.stack([np.interp(times, grid, signal) for signal in signals], axis=-1).astype(dtype)
+    med_scale = np.nanmax(np.abs(data[:, :, 0]), axis=1, initial=0) * 2
+    ant_offset = data[:, 0, 1].copy()
+    ant_scale = data[:, -1, 1] - ant_offset
+    data[:, :, 1] -= ant_offset[:, None]
+    data[:, :, [0, 2]] /= med_scale[:, None, None]
+    data[:, :, [1, 3]] /= ant_scale[:, None, None]
+    return CycleTensor(windows, data, med_scale, ant_scale, ant_offset)
+
+
+def _triplet_windows(values: np.ndarray) -> np.ndarray:
+    """(n - 2, 3) view of every run of 3 consecutive values"""
+    if len(values) < 3:
+        return np.empty((0, 3), dtype=values.dtype)
+    return np.lib.stride_tricks.sliding_window_view(values, 3)
+
+
+CYCLE_METRIC_WEIGHTS = {  # position and velocity weights of the metrics `pairwise_distances` computes directly
+    'weighted_pos': (1, 0),
+    'weighted_vel': (0, 1),
+    'weighted_mix': (5, 1),
+    'euclid': None,
+}
+
+
+def pairwise_distances(queries: np.ndarray, references: np.ndarray, metric='weighted_mix',
+                       max_bytes=64 << 20) -> np.ndarray:
+    """Distances between every pair of rows of two cycle feature matrices
+
+    Parameters
+    ----------
+    queries, references : numpy.ndarray
+        (n_q, 4 * length) and (n_r, 4 * length) features laid out like `GaitCycle.features`
+    metric : str
+        A key of `CYCLE_METRIC_WEIGHTS`. The weighted metrics are the weighted sum of the mean position and mean
+        velocity distances over the cycle, 'euclid' the distance between the whole feature vectors
+    max_bytes : int
+        Bound on the temporary differences computed at once; the pairs are processed in blocks of this size
+
+    Returns
+    -------
+    distances : numpy.ndarray
+        (n_q, n_r) float64 distances
+    """
+    if metric not in CYCLE_METRIC_WEIGHTS:
+        raise ValueError(f'Unknown metric {metric!r}, expected one of {list(CYCLE_METRIC_WEIGHTS)}')
+    queries, references = np.atleast_2d(queries), np.atleast_2d(references)
+    width = queries.shape[1]
+    distances = np.empty((len(queries), len(references)))
+    skip_nan = np.isnan(queries).any() or np.isnan(references).any()
+    ref_block = max(1, min(len(references), max_bytes // (8 * width)))
+    query_block = max(1, max_bytes // (8 * width * ref_block))
+    for r in range(0, len(references), ref_block):
+        ref = references[r:r + ref_block].astype(np.float64)
+        for q in range(0, len(queries), query_block):
+            diff = ref - queries[q:q + query_block, None].astype(np.float64)  # (query block, ref block, 4 * length)
+            distances[q:q + query_block, r:r + ref_block] = _feature_distance(diff, metric, skip_nan)
+    return distances
+
+
+def _feature_distance(diff: np.ndarray, metric: str, skip_nan=True) -> np.ndarray:
+    """Reduce feature differences over the last axis according to a `CYCLE_METRIC_WEIGHTS` metric
+
+    With `skip_nan`, missing samples are left out of the weighted metrics' means like xarray's `mean` does
+    """
+    if CYCLE_METRIC_WEIGHTS[metric] is None:
+        return np.sqrt(np.einsum('...i,...i->...', diff, diff))
+    np.square(diff, out=diff)
+    med_pos, ant_pos, med_vel, ant_vel = np.split(diff, 4, axis=-1)
+    total = 0
+    for weight, med, ant in zip(CYCLE_METRIC_WEIGHTS[metric], (med_pos, med_vel), (ant_pos, ant_vel)):
+        if weight:
+            dist = np.sqrt(med + ant)
+            if not skip_nan:
+                total = total + weight * dist.mean(axis=-1)
+                continue
+            valid = ~np.isnan(dist)
+            with np.errstate(invalid='ignore'):
+                total = total + weight * np.where(valid, dist, 0).sum(axis=-1) / valid.sum(axis=-1)
+    return total
+
+
+def top_k(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The k smallest distances of each row in ascending order, and their column indices
+
+    Uses a partial partition, so only the k selected entries of each row are sorted
+    """
+    distances = np.atleast_2d(distances)
+    k = min(k, distances.shape[1])
+    if k < distances.shape[1]:
+        indices = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    else:
+        indices = np.broadcast_to(np.arange(k), distances.shape)
+    order = np.argsort(np.take_along_axis(distances, indices, axis=1), axis=1, kind='stable')
+    indices = np.take_along_axis(indices, order, axis=1)
+    return np.take_along_axis(distances, indices, axis=1), indices
+
+
+class DTWNeighbors(NamedTuple):
+    """Result of `dtw_nearest`, with counts of how much work the lower bounds saved"""
+    distances: np.ndarray  # (n_queries, k) DTW distances in ascending order
+    indices: np.ndarray  # (n_queries, k) rows of the references the distances belong to, -1 where none was found
+    pruned: int  # pairs skipped because their lower bound exceeded the k-th best distance
+    abandoned: int  # pairs whose DTW was stopped once its partial cost exceeded the k-th best distance
+    computed: int  # pairs whose DTW ran to completion
+
+
+def cycle_trajectories(features: np.ndarray) -> np.ndarray:
+    """(n, length, 2) med/ant position trajectories of (n, 4 * length) cycle features, as used by the DTW metric"""
+    features = np.atleast_2d(features)
+    return features.reshape(len(features), 4, features.shape[1] // 4)[:, :2].transpose(0, 2, 1).astype(np.float64)
+
+
+def _point_distances(query: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """(n, length, length_c) Euclidean distances between every point of the query and of each candidate"""
+    return np.linalg.norm(candidates[:, None, :, :] - query[None, :, None, :], axis=-1)
+
+
+def _coupling_distances(cost: np.ndarray, combine, band=None, max_dist=np.inf) -> np.ndarray:
+    """Cost of the best monotone coupling through each (n, length, length_c) cost matrix
+
+    `combine(cost, previous)` accumulates a cell's cost onto the best of its three predecessors: np.add gives DTW and
+    np.maximum the discrete Frechet distance. The matrices are filled together one anti-diagonal at a time, keeping
+    only the last two anti-diagonals. Every coupling crosses one of any two consecutive anti-diagonals and the
+    accumulated cost never decreases along it, so once their smallest entry exceeds `max_dist` the matrix is
+    abandoned.
+    """
+    n, length, length_c = cost.shape
+    if band is not None:
+        offset = np.abs(np.arange(length)[:, None] - np.arange(length_c)[None, :])
+        cost = np.where(offset > band, np.inf, cost)
+    distances = np.full(n, np.inf)
+    active = np.arange(n)
+    prev2 = np.full((n, length + 1), np.inf)  # padded cells (i, d - i) of the anti-diagonal d - 2
+    prev2[:, 0] = 0
+    prev1 = np.full((n, length + 1), np.inf)
+    for d in range(2, length + length_c + 1):
+        rows = np.arange(max(1, d - length_c), min(length, d - 1) + 1)
+        diag = np.full_like(prev1, np.inf)
+        diag[:, rows] = combine(cost[:, rows - 1, d - rows - 1],
+                                np.minimum(prev2[:, rows - 1], np.minimum(prev1[:, rows - 1], prev1[:, rows])))
+        prev2, prev1 = prev1, diag
+        if max_dist < np.inf:
+            alive = np.minimum(prev2.min(axis=1), prev1.min(axis=1)) <= max_dist
+            if not alive.all():
+                active, cost, prev2, prev1 = active[alive], cost[alive], prev2[alive], prev1[alive]
+                if not len(active):
+                    break
+    distances[active] = prev1[:, length]
+    return distances
+
+
+def dtw_distances(query: np.ndarray, candidates: np.ndarray, band=None, max_dist=np.inf) -> np.ndarray:
+    """Dynamic time warping distance from one trajectory to each of many, summing Euclidean point distances
+
+    Parameters
+    ----------
+    query : numpy.ndarray
+        (length, d) trajectory
+    candidates : numpy.ndarray
+        (n, length_c, d) trajectories
+    band : int, optional
+        Sakoe-Chiba band half width; points more than `band` samples apart are never matched
+    max_dist : float
+        Candidates whose distance is known to exceed this are abandoned
+
+    Returns
+    -------
+    distances : numpy.ndarray
+        (n,) distances, inf for abandoned candidates
+    """
+    return _coupling_distances(_point_distances(query, candidates), np.add, band, max_dist)
+
+
+def frechet_distances(query: np.ndarray, candidates: np.ndarray, band=None, max_dist=np.inf) -> np.ndarray:
+    """Discrete Frechet distance from one trajectory to each of many, with the same arguments as `dtw_distances`"""
+    return _coupling_distances(_point_distances(query, candidates), np.maximum, band, max_dist)
+
+
+def hausdorff_distances(query: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Directed Hausdorff distance from one (length, d) trajectory to each of (n, length_c, d) trajectories"""
+    return _point_distances(query, candidates).min(axis=2).max(axis=1)
+
+
+def _is_simple_quad(quads: np.ndarray) -> np.ndarray:
+    """Whether most turns of (..., 4, 2) quadrilaterals go the same way, as in `similaritymeasures.is_simple_quad`"""
+    edges = np.roll(quads, -1, axis=-2) - quads
+    next_edges = np.roll(edges, -1, axis=-2)
+    cross = edges[..., 0] * next_edges[..., 1] - edges[..., 1] * next_edges[..., 0]
+    positive, negative = (cross > 0).sum(axis=-1), (cross < 0).sum(axis=-1)
+    agree = np.where((positive < negative)[..., None], cross <= 0, cross >= 0)
+    return agree.sum(axis=-1) > 2
+
+
+def _quad_area(quads: np.ndarray) -> np.ndarray:
+    """Shoelace area of (..., 4, 2) quadrilaterals"""
+    x, y = quads[..., 0], quads[..., 1]
+    return 0.5 * np.abs((x * np.roll(y, 1, axis=-1)).sum(axis=-1) - (y * np.roll(x, 1, axis=-1)).sum(axis=-1))
+
+
+def area_distances(query: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Area between one (length, 2) trajectory and each of (n, length, 2) trajectories of the same length
+
+    Sums the quadrilaterals spanned by consecutive point pairs, reordering their corners when they cross like
+    `similaritymeasures.area_between_two_curves` does
+    """
+    query = np.broadcast_to(query, candidates.shape)
+    quads = np.stack([query[:, :-1], query[:, 1:], candidates[:, 1:], candidates[:, :-1]], axis=-2)
+    swapped, reordered = quads[..., [1, 0, 2, 3], :], quads[..., [0, 2, 1, 3], :]
+    area = np.where(_is_simple_quad(quads), _quad_area(quads),
+                    np.where(_is_simple_quad(swapped), _quad_area(swapped), _quad_area(reordered)))
+    return area.sum(axis=-1)
+
+
+TRAJECTORY_METRICS = {  # one-vs-many distance of each trajectory metric, see `trajectory_distances`
+    'dtw': dtw_distances,
+    'frechet': frechet_distances,
+    'hausdorff': hausdorff_distances,
+    'area': area_distances,
+}
+
+
+def trajectory_distances(queries: np.ndarray, references: np.ndarray, metric='dtw', band=None) -> np.ndarray:
+    """(n_q, n_r) distances between (n_q, length, d) and (n_r, length, d) trajectories, see `cycle_trajectories`
+
+    `band` constrains the couplings of 'dtw' and 'frechet'
+    """
+    if metric not in TRAJECTORY_METRICS:
+        raise ValueError(f'Unknown metric {metric!r}, expected one of {list(TRAJECTORY_METRICS)}')
+    distance = TRAJECTORY_METRICS[metric]
+    kwargs = {'band': band} if metric in ('dtw', 'frechet') else {}
+    return np.array([distance(query, references, **kwargs) for query in queries]).reshape(len(queries),
+                                                                                          len(references))
+
+
+def _envelope(trajectories: np.ndarray, band: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Lower and upper bound of each point's reachable samples within the band"""
+    size = 2 * band + 1
+    return (minimum_filter1d(trajectories, size, axis=-2, mode='nearest'),
+            maximum_filter1d(trajectories, size, axis=-2, mode='nearest'))
+
+
+def dtw_lower_bound(query: np.ndarray, candidates: np.ndarray, query_envelope, candidate_envelopes) -> np.ndarray:
+    """LB_Keogh in both directions, with LB_Kim's exact first and last point distances in place of the end rows
+
+    A warping path matches the first and last points to each other and every other point to a sample inside its
+    envelope, so the sum of the distances to the envelopes can't exceed the DTW distance
+    """
+    ends = np.linalg.norm(candidates[:, [0, -1]] - query[[0, -1]], axis=-1).sum(axis=-1)
+    inner = slice(1, -1)
+    lower, upper = candidate_envelopes
+    forward = np.linalg.norm(query[inner] - np.clip(query[inner], lower[:, inner], upper[:, inner]), axis=-1)
+    lower, upper = query_envelope
+    backward = np.linalg.norm(candidates[:, inner] - np.clip(candidates[:, inner], lower[inner], upper[inner]),
+                              axis=-1)
+    return ends + np.maximum(forward.sum(axis=-1), backward.sum(axis=-1))
+
+
+def dtw_nearest(queries: np.ndarray, references: np.ndarray, k=1, band=None, chunk=32) -> DTWNeighbors:
+    """Exact k nearest references of each query under DTW, skipping most of the full DTW computations
+
+    References are visited in order of their lower bound, `chunk` at a time after the first k, and each chunk's DTW is
+    abandoned past the current k-th best distance. The search stops once the next lower bound exceeds it.
+
+    Parameters
+    ----------
+    queries, references : numpy.ndarray
+        (n_q, length, d) and (n_r, length, d) trajectories of equal length, see `cycle_trajectories`
+    k : int
+        Number of neighbors
+    band : int, optional
+        Sakoe-Chiba band half width, unconstrained if None
+    chunk : int
+        Number of references whose DTW is computed together
+
+    Returns
+    -------
+    neighbors : DTWNeighbors
+        (n_q, k) distances and reference rows of each query's neighbors, inf and -1 where fewer than k references
+        have a finite DTW distance
+    """
+    length = references.shape[1]
+    k = min(k, len(references))
+    window = length - 1 if band is None else min(band, length - 1)
+    envelopes = _envelope(references, window)
+    distances, indices = np.full((len(queries), k), np.inf), np.full((len(queries), k), -1)
+    pruned = abandoned = computed = 0
+    for q, query in enumerate(queries):
+        bounds = dtw_lower_bound(query, references, _envelope(query, window), envelopes)
+        order = np.argsort(bounds, kind='stable')
+        best, best_indices = np.empty(0), np.empty(0, dtype=int)
+        threshold, started = np.inf, 0
+        for start, stop in zip([0, *range(k, len(order), chunk)], [*range(k, len(order), chunk), len(order)]):
+            candidates = order[start:stop]  # the first k set the threshold for the rest
+            candidates = candidates[bounds[candidates] <= threshold]
+            if not len(candidates):
+                break
+            started += len(candidates)
+            dist = dtw_distances(query, references[candidates], band, threshold)
+            finished = np.isfinite(dist)
+            computed += np.count_nonzero(finished)
+            abandoned += np.count_nonzero(~finished)
+            best = np.concatenate([best, dist[finished]])
+            best_indices = np.concatenate([best_indices, candidates[finished]])
+            keep = np.argsort(best, kind='stable')[:k]
+            best, best_indices = best[keep], best_indices[keep]
+            if len(best) == k:
+                threshold = best[-1]
+        pruned += len(references) - started
+        distances[q, :len(best)], indices[q, :len(best)] = best, best_indices
+    return DTWNeighbors(distances, indices, pruned, abandoned, computed)
+
+
 def plot_gait_cycles(cycles):
+    import matplotlib.pyplot as plt  # only plotting needs matplotlib, loading data shouldn't pay for it
     fig = plt.figure(figsize=(15,7))
     n = len(cycles)
     w = 1
@@ -52,43 +1076,37 @@ def plot_gait_cycles(cycles):
         ax.set_xlim(-1, 1)
 
 
-def timeit(method, custom=''):
-    def timed(*args, **kw):
-        ts = time.time()
-        result = method(*args, **kw)
-        te = time.time()
-        if 'log_time' in kw:
-            name = kw.get('log_name', method.__name__.upper())
-            kw['log_time'][name] = int((te - ts) * 1000)
-        else:
-            print('%r  %2.2f ms' % (method.__name__, (te - ts) * 1000))
-        return result
-    return timed
-
-
 class BoardRecording:
     """A single board on the SmartFloor
 
     Attributes
     ----------
+    time : numpy.ndarray
+        Timestamps of this board's packets
+    grid : numpy.ndarray
+        (time, height, width) readings of this board's mapped sensors, in their physical arrangement
     df : pandas.DataFrame
-        Raw SmartFloor data, filtered for just this board and with the 'board_id' column removed
+        Raw readings of this board's mapped sensors, with one column per sensor id
     id : int
-        The board ID number, one of {17, 18, 19, 21}
+        The board ID number
     x : int
         Where the left-most tile of this board begins on the floor (each tile represents one unit)
     y : int
         Where the bottom-most tile of this board begins on the floor (each tile represents one unit)
+    width, height : int
+        Size of this board on the floor in tiles, after any rotation
+    sensor_map : numpy.ndarray
+        Sensor id of each tile of this board as placed on the floor, top row first
     da : xarray.DataArray
         DataArray with x, y, and time dimensions, such that the time dimension can be indexed by datetime
     hz : xarray.DataArray
         The sample rate (in Hz) of the board over time
     Board.sensor_map : numpy.ndarray
-        Mapping of sensor ids within the physical layout of a board
+        Mapping of sensor ids within the physical layout of a standard board
     Board.width : int
-        Number of tiles a board is wide
+        Number of tiles a standard board is wide
     Board.height : int
-        Number of tiles a board is high
+        Number of tiles a standard board is high
     """
     sensor_map = [  # arrangement of sensor ids on each board
         [18, 19, 6, 7],
@@ -103,28 +1121,83 @@ class BoardRecording:
     width, height = 4, 8
 
     @timeit
-    def __init__(self, df_floor: pd.DataFrame, board_id: int, x: int, y: int):
+    def __init__(self, time: np.ndarray, grid: np.ndarray, board_id: int, x: int, y: int, dtype=np.float64,
+                 sensor_map=None):
         """
         Parameters
         ----------
-        df_floor : pandas.DataFrame
-            DataFrame representing raw SmartFloor data
+        time : numpy.ndarray
+            Timestamps of this board's packets
+        grid : numpy.ndarray
+            (time, height, width) readings laid out by `sensor_map`, as produced by `demux`
         board_id : int
-            The board ID number, one of {17, 18, 18, 21}
+            The board ID number
         x : int
             Where the left-most tile of this board begins on the floor (each tile represents one unit)
         y : int
             Where the bottom-most tile of this board begins on the floor (each tile represents one unit)
+        dtype : numpy.dtype
+            Float dtype of derived signals. Raw readings are always kept as uint16
+        sensor_map : numpy.ndarray, optional
+            Arrangement of sensor ids the grid was demultiplexed with, by default the standard `sensor_map`
         """
-        # Extract this board's data, and remove the (now useless) board ID column
-        self.df = df_floor[df_floor['board_id'] == board_id].drop(columns=['board_id'])
+        self.time = time
+        self.grid = grid.astype(np.uint16, copy=False)
         self.id = board_id
+        self.dtype = dtype
+        self.sensor_map = np.asarray(BoardRecording.sensor_map if sensor_map is None else sensor_map)
+        self.height, self.width = self.grid.shape[1:]
         #
         self.x = x
         self.y = y
         self.da = self.get_darray()
         self.hz = self._get_hz(self.da)
 
+    @staticmethod
+    def demux(df_floor: pd.DataFrame, board_ids: List[int], sensor_maps=None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Split raw SmartFloor data into per-board readings in a single pass
+
+        Packets are grouped by board with one stable sort, and the sensors of each board's packets are arranged by its
+        sensor map with one fancy index, so the cost is linear in packets whatever the number of boards.
+
+        Parameters
+        ----------
+        df_floor : pandas.DataFrame
+            DataFrame representing raw SmartFloor data
+        board_ids : List[int]
+            IDs of the boards to extract
+        sensor_maps : List[numpy.ndarray], optional
+            Arrangement of sensor ids of each board, by default the standard `sensor_map` for all of them
+
+        Returns
+        -------
+        boards : List[Tuple[numpy.ndarray, numpy.ndarray]]
+            For each board ID, the timestamps of its packets and a contiguous (time, height, width) grid of readings
+        """
+        ids = df_floor['board_id'].to_numpy()
+        order = np.argsort(ids, kind='stable')
+        sorted_ids = ids[order]
+        lo = np.searchsorted(sorted_ids, board_ids, side='left')
+        hi = np.searchsorted(sorted_ids, board_ids, side='right')
+        sensors = df_floor[list(range(N_SENSORS))].to_numpy()
+        time = df_floor.index.to_numpy()
+        if sensor_maps is None:
+            sensor_maps = [BoardRecording.sensor_map] * len(board_ids)
+        boards = []
+        for i, j, sensor_map in zip(lo, hi, sensor_maps):
+            rows = order[i:j]
+            board_time, board_grid = time[rows], sensors[rows[:, None, None], np.asarray(sensor_map)]
+            if np.any(board_time[1:] < board_time[:-1]):  # Packets were logged out of order
+                by_time = np.argsort(board_time, kind='stable')
+                board_time, board_grid = board_time[by_time], board_grid[by_time]
+            boards.append((board_time, board_grid))
+        return boards
+
+    @reify
+    def df(self) -> pd.DataFrame:
+        return pd.DataFrame(self.grid.reshape(len(self.time), -1), index=pd.DatetimeIndex(self.time, name='time'),
+                            columns=np.ravel(self.sensor_map))
+
     def mapped_stream_arr(self) -> np.ndarray:
         """Get pressure reading streams for each sensor in their assigned location
 
@@ -136,10 +1209,10 @@ class BoardRecording:
             axis 1: columns of the board
             axis 2: time
         """
-        return np.array([[self.df[sensor_id] for sensor_id in row] for row in BoardRecording.sensor_map])
+        return np.moveaxis(self.grid, 0, -1)
 
     def get_darray(self) -> xr.DataArray:
-        """Build a DataArray from the current DataFrame data
+        """Build a DataArray from the current grid of readings
 
         Returns
         -------
@@ -148,12 +1221,12 @@ class BoardRecording:
         """
         return xr.DataArray(self.mapped_stream_arr(),
                             dims=['y', 'x', 'time'],
-                            coords={'time': self.df.index,
-                                    'x': np.arange(self.x, self.x + 4),
-                                    'y': np.arange(self.y, self.y + 8)[::-1]})
+                            coords={'time': self.time,
+                                    'x': np.arange(self.x, self.x + self.width),
+                                    'y': np.arange(self.y, self.y + self.height)[::-1]})
 
     def update_darray(self):
-        """Update the internal DataArray inplace based on current DataFrame data
+        """Update the internal DataArray inplace based on the current grid of readings
 
         """
         self.da = self.get_darray()
@@ -174,56 +1247,338 @@ class BoardRecording:
     def _get_hz(self, da):
         ns_diff = (da.time - da.time.shift(time=1))
         board_hz = np.timedelta64(1, 's') / ns_diff
-        return board_hz
+        return board_hz.astype(self.dtype)
+
+
+class BoardPlacement(NamedTuple):
+    """Where one board sits on the floor"""
+    board_id: int
+    x: int  # left-most tile column the board covers
+    y: int  # bottom-most tile row the board covers
+    rotation: int = 0  # degrees counter-clockwise, seen from above, a multiple of 90
+    board_type: str = 'standard'
+
+
+class FloorLayout:
+    """Positions, orientations and sensor maps of the boards that make up a floor
+
+    Boards can sit anywhere on a 2-D grid of tiles, in any of four orientations, so corridors and rooms of any size
+    are described the same way as the original strip. Tiles that no board covers read zero.
+
+    Attributes
+    ----------
+    boards : List[BoardPlacement]
+        Placement of every board, in the order their readings are stored
+    board_types : Dict[str, numpy.ndarray]
+        (height, width) sensor id of each tile of every type of board, top row first, before rotation
+    sensor_maps : List[numpy.ndarray]
+        Sensor id of each tile of every board as placed on the floor, top row first
+    width, height : int
+        Size of the floor in tiles
+    Layout.board_types : Dict[str, numpy.ndarray]
+        Board types every layout knows about
+    """
+    board_types = {'standard': np.array(BoardRecording.sensor_map)}
+
+    def __init__(self, boards: List[BoardPlacement], board_types=None):
+        """
+        Parameters
+        ----------
+        boards : List[BoardPlacement]
+        board_types : Dict[str, array_like], optional
+            Extra board types, or replacements for the default ones
+        """
+        self.boards = [BoardPlacement(*board) for board in boards]
+        self.board_types = {**FloorLayout.board_types,
+                            **{name: np.asarray(sensor_map) for name, sensor_map in (board_types or {}).items()}}
+        if len(set(self.board_ids)) != len(self.boards):
+            raise ValueError('Every board of a layout needs a distinct id')
+        for board in self.boards:
+            if board.board_type not in self.board_types:
+                raise ValueError(f'Board {board.board_id} has unknown type {board.board_type!r}')
+            if board.rotation % 90:
+                raise ValueError(f'Board {board.board_id} is rotated by {board.rotation}, not a multiple of 90 degrees')
+        self.sensor_maps = [np.rot90(self.board_types[board.board_type], board.rotation // 90)
+                            for board in self.boards]
+        self.width = max((board.x + sensor_map.shape[1] for board, sensor_map in zip(self.boards, self.sensor_maps)),
+                         default=0)
+        self.height = max((board.y + sensor_map.shape[0] for board, sensor_map in zip(self.boards, self.sensor_maps)),
+                          default=0)
+        if (self.coverage() > 1).any():
+            raise ValueError('Boards of a layout must not overlap')
+
+    def __repr__(self):
+        return f'<FloorLayout of {len(self.boards)} boards, {self.width}x{self.height} tiles>'
+
+    @property
+    def board_ids(self) -> List[int]:
+        return [board.board_id for board in self.boards]
+
+    def rows(self, board: BoardPlacement, sensor_map: np.ndarray) -> slice:
+        """Rows of (y, x) floor arrays covered by a board, whose first row is the top of the floor"""
+        return slice(self.height - board.y - sensor_map.shape[0], self.height - board.y)
+
+    def coverage(self) -> np.ndarray:
+        """(y, x) number of boards covering each tile, top row first"""
+        count = np.zeros((self.height, self.width), dtype=int)
+        for board, sensor_map in zip(self.boards, self.sensor_maps):
+            count[self.rows(board, sensor_map), board.x:board.x + sensor_map.shape[1]] += 1
+        return count
+
+    @staticmethod
+    def strip(board_ids: List[int], board_type='standard') -> 'FloorLayout':
+        """Boards side by side from left to right, like the original floor"""
+        width = FloorLayout.board_types[board_type].shape[1]
+        return FloorLayout([BoardPlacement(board_id, i * width, 0, 0, board_type)
+                            for i, board_id in enumerate(board_ids)])
+
+    @staticmethod
+    def grid(board_ids: List[int], columns: int, board_type='standard') -> 'FloorLayout':
+        """Boards in rows of `columns`, filled left to right from the bottom row up"""
+        height, width = FloorLayout.board_types[board_type].shape
+        return FloorLayout([BoardPlacement(board_id, (i % columns) * width, (i // columns) * height, 0, board_type)
+                            for i, board_id in enumerate(board_ids)])
+
+    @staticmethod
+    def from_dict(config: dict) -> 'FloorLayout':
+        """Build a layout from a config like
+        {"board_types": {"name": [[sensor ids, top row first], ...]},
+         "boards": [{"id": 19, "x": 0, "y": 0, "rotation": 0, "type": "standard"}, ...]}
+        where `board_types`, `rotation` and `type` are optional
+        """
+        return FloorLayout([BoardPlacement(board['id'], board['x'], board['y'], board.get('rotation', 0),
+                                           board.get('type', 'standard'))
+                            for board in config['boards']], config.get('board_types'))
+
+    def to_dict(self) -> dict:
+        used = {board.board_type for board in self.boards}
+        return {'board_types': {name: self.board_types[name].tolist() for name in sorted(used)},
+                'boards': [{'id': int(board.board_id), 'x': int(board.x), 'y': int(board.y),
+                            'rotation': int(board.rotation), 'type': board.board_type} for board in self.boards]}
+
+    @staticmethod
+    def from_config(path) -> 'FloorLayout':
+        """Read a layout from a JSON config file, see `from_dict`"""
+        with open(path) as f:
+            return FloorLayout.from_dict(json.load(f))
+
+    def save(self, path):
+        """Write the layout as a JSON config file readable by `from_config`"""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class TrimDetector:
+    """Finds when someone is on the floor from the pressure of each raw packet, in one pass as packets arrive
+
+    Each packet's pressure is the sum of its board's mapped readings more than `deadband` above that board's first
+    readings. The floor's pressure after a packet is the sum of the last pressure every board reported, kept as a
+    running total, so only one number per packet is stored and no (y, x, time) array is ever built. Like
+    `FloorRecording.loaded_window`, the floor counts as loaded wherever its pressure is above the mean over the
+    recording, but without the mask around the point of maximum pressure: the noise it removed adds about the same
+    amount to every packet, and the threshold moves with it. The deadband keeps that noise small on large floors.
+
+    Attributes
+    ----------
+    layout : FloorLayout
+        Boards whose packets are counted, packets of other boards are ignored
+    deadband : float
+        Readings within this of their base reading count as unloaded. Unloaded SmartFloor sensors stay within a
+        couple of counts
+    noise : numpy.ndarray
+        (board, sensor) base readings, the first packet of each board
+    """
+
+    def __init__(self, layout: 'FloorLayout' = None, deadband=2.0):
+        self.layout = layout or FloorLayout.strip(FloorRecording.board_map)
+        self.deadband = deadband
+        n_boards = len(self.layout.boards)
+        self._ids = np.array(self.layout.board_ids)
+        self._id_order = np.argsort(self._ids)
+        self._mapped = np.zeros((n_boards, N_SENSORS))  # 1 for the sensors each board has on its tiles
+        for i, sensor_map in enumerate(self.layout.sensor_maps):
+            self._mapped[i, np.ravel(sensor_map)] = 1
+        self.noise = np.zeros((n_boards, N_SENSORS))
+        self._seen = np.zeros(n_boards, dtype=bool)
+        self._last = np.zeros(n_boards)  # pressure of the latest packet of each board
+        self._total = 0.0
+        self._times, self._totals = [], []
+
+    def __len__(self):
+        return sum(len(times) for times in self._times)
+
+    def _slots(self, board_ids: np.ndarray) -> np.ndarray:
+        """Index of each packet's board in the layout, or -1 for boards outside it"""
+        i = np.searchsorted(self._ids[self._id_order], board_ids)
+        i = np.minimum(i, len(self._ids) - 1)
+        slots = self._id_order[i]
+        return np.where(self._ids[slots] == board_ids, slots, -1)
+
+    def push(self, packets: Packets):
+        """Add a chunk of packets, in the order they arrived"""
+        slot = self._slots(packets.board_id)
+        known = slot >= 0
+        slot, time, sensors = slot[known], np.asarray(packets.time)[known], packets.sensors[known]
+        if not len(slot):
+            return
+        first_seen = 0
+        if not self._seen.all():
+            boards, first = np.unique(slot, return_index=True)
+            new = ~self._seen[boards]
+            self.noise[boards[new]] = sensors[first[new]]
+            self._seen[boards[new]] = True
+            if self._seen.all():  # Only keep totals once every board has reported
+                first_seen = first[new].max()
+            else:
+                first_seen = len(slot)
+        pressure = np.fmax(sensors - self.noise[slot] - self.deadband, 0)
+        magnitude = np.einsum('ij,ij->i', pressure, self._mapped[slot])
+        # Each packet replaces the previous pressure of its board in the floor total
+        order = np.argsort(slot, kind='stable')
+        by_board, sorted_magnitude = slot[order], magnitude[order]
+        starts = np.r_[True, by_board[1:] != by_board[:-1]]
+        ends = np.r_[by_board[1:] != by_board[:-1], True]
+        previous = np.empty_like(magnitude)
+        previous[order[1:]] = sorted_magnitude[:-1]
+        previous[order[starts]] = self._last[by_board[starts]]
+        self._last[by_board[ends]] = sorted_magnitude[ends]
+        totals = self._total + np.cumsum(magnitude - previous)
+        self._total = totals[-1]
+        self._times.append(time[first_seen:].astype(np.int64))
+        self._totals.append(totals[first_seen:])
+
+    def extend(self, chunks: Iterable[Packets]) -> 'TrimDetector':
+        """Push every chunk, e.g. from `read_packets(path, chunksize)`"""
+        for packets in chunks:
+            self.push(packets)
+        return self
+
+    @property
+    def times(self) -> np.ndarray:
+        """ms timestamp of every packet counted since all boards reported"""
+        self._times = [np.concatenate(self._times)] if self._times else []
+        return self._times[0] if self._times else np.empty(0, dtype=np.int64)
+
+    @property
+    def totals(self) -> np.ndarray:
+        """Floor pressure after each packet of `times`"""
+        self._totals = [np.concatenate(self._totals)] if self._totals else []
+        return self._totals[0] if self._totals else np.empty(0)
+
+    def windows(self, min_gap=None, min_length=None) -> np.ndarray:
+        """Start and end times of the spans where the floor is loaded
+
+        Parameters
+        ----------
+        min_gap : str or pandas.Timedelta, optional
+            Shortest unloaded span that separates two walks. By default there is a single window from the first to the
+            last loaded packet, like `FloorRecording.loaded_window`
+        min_length : str or pandas.Timedelta, optional
+            Walks shorter than this are dropped
+
+        Returns
+        -------
+        windows : numpy.ndarray
+            (n, 2) datetime64[ms] start and end times, in order
+        """
+        times, totals = self.times, self.totals
+        loaded = np.flatnonzero(totals > totals.mean()) if len(totals) else np.empty(0, dtype=int)
+        if not len(loaded):
+            return np.empty((0, 2), dtype='datetime64[ms]')
+        if min_gap is None:
+            split = np.zeros(len(loaded) - 1, dtype=bool)
+        else:
+            split = np.diff(times[loaded]) >= pd.Timedelta(min_gap) / pd.Timedelta('1ms')
+        windows = np.stack([times[loaded[np.r_[True, split]]], times[loaded[np.r_[split, True]]]], axis=1)
+        if min_length is not None:
+            windows = windows[windows[:, 1] - windows[:, 0] >= pd.Timedelta(min_length) / pd.Timedelta('1ms')]
+        return windows.astype('datetime64[ms]')
 
 
 class FloorRecording:
-    """A strip of SmartFloor boards
+    """A floor of SmartFloor boards
 
     Attributes
     ----------
     df : pandas.DataFrame
         Raw SmartFloor recording
+    layout : FloorLayout
+        Where the boards are on the floor
     boards : List[BoardRecording]
-        Board objects that make up the floor, in left to right order
+        Board objects that make up the floor, in the order of `layout`
     da : xarray.DataArray
-        Interpolated mapping of all sensor readings with x, y, and time dimensions
+        Interpolated mapping of all sensor readings with x, y, and time dimensions, at the union of the boards'
+        timestamps. Built on first access.
         Note that (0, 0) is located at the bottom left of the floor
+    sample_times : pandas.DatetimeIndex
+        Regular `freq` time grid of `samples`
+    samples : xarray.DataArray
+        Sensor readings resampled onto `sample_times`, with x, y, and time dimensions. Built on first access, and
+        rebuilt if `reify_cache` evicted it
     noise : xarray.DataArray
         Base pressure readings on the floor over the x, y plane
+    baseline : pandas.Timedelta, optional
+        Window of the moving baseline subtracted by `pressure`, or None to subtract `noise`
+    derivative : str
+        Scheme used by `time_derivative` for the COP velocity, acceleration and jerk
+    cycle_length : int
+        Number of samples each gait cycle is normalized to
+    dtype : numpy.dtype
+        Float dtype of `samples`, `pressure` and every signal derived from them, set by `precision`
     Floor.board_map : List[int]
-        List of board IDs in the order they appear left to right on the floor
+        Board IDs of the default layout, a strip of four boards, in the order they appear left to right
     """
 
     board_map = [19, 17, 21, 18]
 
     @timeit
-    def __init__(self, df: pd.DataFrame, freq='40ms', start=None, end=None, name=None, trimmed=False):
+    def __init__(self, df: pd.DataFrame, freq='40ms', start=None, end=None, name=None, trimmed=False,
+                 precision='double', baseline=None, derivative='central', cycle_length=40, layout=None):
         """
         Parameters
         ----------
         df : pandas.DataFrame
             Raw SmartFloor recording
+        precision : str
+            'double' to derive float64 signals, or 'single' for float32 signals at half the memory.
+            Raw readings are kept as uint16 either way
+        baseline : str, optional
+            Length of a moving window, e.g. '10s', whose per-tile minimum is used as the base pressure instead of
+            the first frame. Useful when the sensors drift over long recordings
+        derivative : str
+            'central' differences, or 'savgol' for Savitzky-Golay derivatives of the COP signals
+        cycle_length : int
+            Number of samples each gait cycle is normalized to
+        layout : FloorLayout or str, optional
+            Board layout or the path of its JSON config, by default a strip of the `board_map` boards
         """
         self.df = df
-        self.boards = [BoardRecording(df, board_id, x * BoardRecording.width, 0)
-                       for (x, board_id) in enumerate(FloorRecording.board_map)]
+        self.baseline = pd.Timedelta(baseline) if baseline is not None else None
+        self.derivative = derivative
+        self.cycle_length = cycle_length
+        self.dtype = PRECISIONS[precision]
+        if layout is None:
+            layout = FloorLayout.strip(FloorRecording.board_map)
+        self.layout = FloorLayout.from_config(layout) if isinstance(layout, str) else layout
+        boards = BoardRecording.demux(df, self.layout.board_ids, self.layout.sensor_maps)
+        self.boards = [BoardRecording(time, grid, board.board_id, board.x, board.y, dtype=self.dtype,
+                                      sensor_map=sensor_map)
+                       for board, sensor_map, (time, grid) in zip(self.layout.boards, self.layout.sensor_maps, boards)]
         all_start, all_end = FloorRecording._range(self.boards)
         self.freq = pd.Timedelta(freq)
         self.name = name
-        self.da = self._get_darray()
-        self.noise = self.da.isel(time=0)
+        self.noise = self._resample([all_start]).isel(time=0)
         start = start or all_start
         end = end or all_end
         if trimmed:
             start, end = self.loaded_window
-        sample_times = pd.date_range(start, end, freq=pd.Timedelta(freq))
-        self.samples = self.da.interp(time=sample_times)
+        self.sample_times = pd.date_range(start, end, freq=pd.Timedelta(freq))
 
     @staticmethod
-    def from_csv(path, name=None, *args, **kwargs):
+    def from_csv(path, name=None, *args, cache=True, **kwargs):
+        """Load a raw .csv recording, reusing its binary sidecar cache unless `cache` is False"""
         name = name or re.match(r'.*/(.*)\.csv', path).groups()[0]  # By default use the csv file name
-        return FloorRecording(_df_from_csv(path), name=name, *args, **kwargs)
+        return FloorRecording(_df_from_csv(path, cache=cache), name=name, *args, **kwargs)
 
     def __repr__(self):
         return f'<FloorRecording {self.name}>'
@@ -239,21 +1594,65 @@ class FloorRecording:
         high : datetime
             The last time at which all boards are recording
         """
-        lo = max(board.df.index[0] for board in boards)
-        hi = min(board.df.index[-1] for board in boards)
+        for board in boards:
+            if len(board.time) < 2:
+                raise ValueError(f'Board {board.id} has {len(board.time)} packets, at least 2 are needed to '
+                                 f'interpolate')
+        lo = max(board.time[0] for board in boards)
+        hi = min(board.time[-1] for board in boards)
         return lo, hi
 
+    @timeit
+    def _resample(self, times) -> xr.DataArray:
+        """Linearly interpolate every board directly onto the given times
+
+        Each board's (time, height, width) grid is interpolated in one batched operation over all of its sensors, so
+        the union of all boards' timestamps is never built. Times outside the range where all boards are recording
+        are NaN, and tiles of the layout that no board covers are zero.
+
+        Parameters
+        ----------
+        times : array_like
+            Datetimes to sample at
+
+        Returns
+        -------
+        samples : xarray.DataArray
+            Readings for the entire floor with x, y, and time dimensions
+        """
+        times = pd.DatetimeIndex(times)
+        t = np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+        height, width = self.layout.height, self.layout.width
+        out = interpolate_boards(self.layout, [(board.time.astype('datetime64[ns]').astype(np.int64), board.grid)
+                                               for board in self.boards], t, self.dtype)
+        all_start, all_end = (pd.Timestamp(t).value for t in FloorRecording._range(self.boards))
+        out[..., (t < all_start) | (t > all_end)] = np.nan
+        return xr.DataArray(out, dims=['y', 'x', 'time'],
+                            coords={'time': times, 'x': np.arange(0, width), 'y': np.arange(0, height)[::-1]})
+
+    @reify
+    def samples(self) -> xr.DataArray:
+        return self._resample(self.sample_times)
+
+    @reify
+    def da(self) -> xr.DataArray:
+        """Readings of all boards at the union of their raw timestamps, only built on demand"""
+        return self._get_darray().astype(self.dtype, copy=False)
+
     def _get_darray(self) -> xr.DataArray:
         """Get a DataArray mapping of all the boards
 
+        Every board is linearly interpolated onto the union of the boards' timestamps within the range where all of
+        them are recording.
+
         Returns
         -------
         darray : xarray.DataArray
             Readings for the entire floor with x, y, and time dimensions
         """
-        da = xr.concat([board.da for board in self.boards], dim='x')
-        da = da.assign_coords(y=np.arange(0, 8)[::-1], x=np.arange(0, 16))
-        return _nonnegative_darray(da.interpolate_na(dim='time', method='linear').dropna(dim='time'))
+        times = np.unique(np.concatenate([board.time for board in self.boards]))
+        start, end = FloorRecording._range(self.boards)
+        return self._resample(times[(times >= start) & (times <= end)])
 
     @staticmethod
     def _get_cop_dataset(da: xr.DataArray) -> xr.Dataset:
@@ -269,36 +1668,33 @@ class FloorRecording:
         ds : xarray.Dataset
             Contains x, y, and magnitude data variables along a time dimension
         """
-        x_cop = (da * da.x).sum(dim=('x', 'y')) / da.sum(dim=('x', 'y'))
-        y_cop = (da * da.y).sum(dim=('x', 'y')) / da.sum(dim=('x', 'y'))
-        magnitude = da.sum(dim=('x', 'y'))
-        return xr.Dataset({'x': x_cop, 'y': y_cop, 'magnitude': magnitude})
+        x_cop, y_cop, magnitude = center_of_pressure(da.transpose('y', 'x', 'time').values,
+                                                     cop_weights(da.x.values, da.y.values, da.dtype))
+        return xr.Dataset({'x': ('time', x_cop), 'y': ('time', y_cop), 'magnitude': ('time', magnitude)},
+                          coords={'time': da.time})
 
-    def _masked_by_max(self, da: xr.DataArray, dist: int) -> xr.DataArray:
-        """Mask away values that are a certain distance away from the point of maximum pressure
+    @timeit
+    def _denoise(self, da: xr.DataArray) -> xr.DataArray:
+        """Subtract the base pressure and keep only the tiles within 3 of the point of maximum pressure
 
         Parameters
         ----------
         da : xarray.DataArray
             Full mapping of the floor data
-        dist : int
-            Maximum permitted distance from the point of highest pressure
 
         Returns
         -------
-        mask : xarray.DataArray
-            Like the input, but values outside the desired square are set to zero
+        pressure : xarray.DataArray
+            Like the input, but nonnegative and zero outside the square around the maximum
         """
-        stacked = da.stack(tile=('x', 'y'))
-        coords_max = stacked.tile.isel(tile=stacked.argmax('tile'))
-        x_max, y_max = zip(*coords_max.data)
-        ds = xr.Dataset({'x': (['time'], list(x_max)), 'y': (['time'], list(y_max))}, coords={'time': stacked.time})
-        masked = (da.where((abs(da.x - ds.x) <= dist)).where(abs(da.y - ds.y) <= dist))
-        return masked
-
-    def _denoise(self, da: xr.DataArray):
-        init_pass = _nonnegative_darray(da - self.noise)
-        return self._masked_by_max(init_pass, 3).fillna(0)
+        frames = da.transpose('y', 'x', 'time').values
+        if self.baseline is None:
+            noise = self.noise.transpose('y', 'x').values
+        else:
+            spacing = pd.Timedelta(np.median(np.diff(da.time.values)))
+            noise = moving_baseline(frames, max(1, round(self.baseline / spacing)))
+        pressure = denoise_frames(frames, noise, 3)
+        return xr.DataArray(pressure, dims=['y', 'x', 'time'], coords=da.coords).transpose(*da.dims)
 
     @reify
     def pressure(self):
@@ -309,60 +1705,88 @@ class FloorRecording:
         return self._get_cop_dataset(self.pressure)
 
     @reify
-    def cop_vel(self):
+    def kinematics(self) -> xr.Dataset:
+        """Velocity, acceleration and jerk of the COP, with their magnitudes and smoothed versions
+
+        Every derivative order of x, y and magnitude is computed on one contiguous (order, signal, time) array.
+        The `cop_vel`, `cop_accel` and `cop_jerk` families of properties are views onto this dataset.
+
+        Returns
+        -------
+        ds : xarray.Dataset
+            For each of vel, accel and jerk: `<order>_x`, `<order>_y` and `<order>_magnitude` derivatives,
+            `<order>_mag` speed in the x, y plane, `<order>_mag_roc` its rate of change, and `_smoothed` versions of
+            the last two over a 10 sample centred window
+        """
+        dt = self.freq / pd.Timedelta('1s')
+        orders = ['vel', 'accel', 'jerk']
         cop = self.cop
-        return (cop.shift(time=-1) - cop).rolling(time=2).mean() / (self.freq / pd.Timedelta('1s'))
+        signals = np.empty((len(orders) + 1, 3, len(cop.time)), dtype=cop.x.dtype)
+        signals[0] = [cop.x.values, cop.y.values, cop.magnitude.values]
+        for i in range(1, len(signals)):
+            signals[i] = time_derivative(signals[i - 1], dt, self.derivative)
+        mag = np.sqrt(np.square(signals[1:, 0]) + np.square(signals[1:, 1]))
+        mag_roc = time_derivative(mag, dt, self.derivative)
+        mag_smoothed, mag_roc_smoothed = moving_average(np.stack([mag, mag_roc]), 10)
+        data_vars = {}
+        for i, order in enumerate(orders):
+            data_vars.update({f'{order}_x': signals[i + 1, 0], f'{order}_y': signals[i + 1, 1],
+                              f'{order}_magnitude': signals[i + 1, 2], f'{order}_mag': mag[i],
+                              f'{order}_mag_roc': mag_roc[i], f'{order}_mag_smoothed': mag_smoothed[i],
+                              f'{order}_mag_roc_smoothed': mag_roc_smoothed[i]})
+        return xr.Dataset({name: ('time', values) for name, values in data_vars.items()}, coords={'time': cop.time})
+
+    def _kinematics_view(self, order: str) -> xr.Dataset:
+        ds = self.kinematics
+        return xr.Dataset({'x': ds[f'{order}_x'], 'y': ds[f'{order}_y'], 'magnitude': ds[f'{order}_magnitude']})
+
+    @reify
+    def cop_vel(self):
+        return self._kinematics_view('vel')
 
     @reify
     def cop_vel_mag(self):
-        vel = self.cop_vel
-        return np.sqrt(np.square(vel.x) + np.square(vel.y))
+        return self.kinematics.vel_mag
 
     @reify
     def cop_vel_mag_smoothed(self):
-        return self.cop_vel_mag.rolling(time=10, center=True).mean().dropna('time')
+        return self.kinematics.vel_mag_smoothed.dropna('time')
 
     @reify
     def cop_vel_mag_roc(self):
         """Rate of change of velocity magnitude (change in speed, change in acceleration in direction of motion"""
-        speed = self.cop_vel_mag
-        return (speed.shift(time=-1) - speed).rolling(time=2).mean() / (self.freq / pd.Timedelta('1s'))
+        return self.kinematics.vel_mag_roc
 
     @reify
     def cop_vel_mag_roc_smoothed(self):
-        return self.cop_vel_mag_roc.rolling(time=10, center=True).mean().dropna('time')
+        return self.kinematics.vel_mag_roc_smoothed.dropna('time')
 
     @reify
     def cop_vel_mag_roc_smoothed2(self):
         speed = self.cop_vel_mag_smoothed
-        return (speed.shift(time=-1) - speed).rolling(time=2).mean() / (self.freq / pd.Timedelta('1s'))
+        return speed.copy(data=time_derivative(speed.values, self.freq / pd.Timedelta('1s'), self.derivative))
 
     @reify
     def cop_accel(self):
-        vel = self.cop_vel
-        return (vel.shift(time=-1) - vel).rolling(time=2).mean() / (self.freq / pd.Timedelta('1s'))
+        return self._kinematics_view('accel')
 
     @reify
     def cop_accel_mag(self):
         """Magnitude of the COP acceleration vector"""
-        accel = self.cop_accel
-        return np.sqrt(np.square(accel.x) + np.square(accel.y))
+        return self.kinematics.accel_mag
 
     @reify
     def cop_accel_mag_roc(self):
         """Rate of change of acceleration magnitude"""
-        accel_mag = self.cop_accel_mag
-        return (accel_mag.shift(time=-1) - accel_mag).rolling(time=2).mean() / (self.freq / pd.Timedelta('1s'))
+        return self.kinematics.accel_mag_roc
 
     @reify
     def cop_jerk(self):
-        vel = self.cop_vel
-        return (vel.shift(time=-1) - vel).rolling(time=2).mean() / (self.freq / pd.Timedelta('1s'))
+        return self._kinematics_view('jerk')
 
     @reify
     def cop_jerk_mag(self):
-        jerk = self.cop_jerk
-        return np.sqrt(np.square(jerk.x) + np.square(jerk.y))
+        return self.kinematics.jerk_mag
 
     @reify
     def _anchors(self):
@@ -403,34 +1827,47 @@ class FloorRecording:
 
     @staticmethod
     def _step_dirs(steps: xr.Dataset):
-        gait_cycles = steps.rolling(time=3).construct('window').dropna('time').groupby('time')
-        feet = xr.DataArray([FloorRecording._middle_foot_dir(sl) for _, sl in gait_cycles], dims='time',
-                            coords={'time': steps.time[1:-1]})
+        """Label every step as a right or left foot from the turn it makes between its neighbours
+
+        The middle step of each complete triplet is a right foot when the stride from the first to the third step
+        runs counter-clockwise of the first to the middle step, i.e. their 2D cross product is positive
+        """
+        windows = {name: _triplet_windows(steps[name].values) for name in steps.data_vars}
+        complete = np.logical_and.reduce([~pd.isnull(window).any(axis=1) for window in windows.values()])
+        x, y = windows['x'], windows['y']
+        v_step = (x[:, 1] - x[:, 0], y[:, 1] - y[:, 0])
+        v_stride = (x[:, 2] - x[:, 0], y[:, 2] - y[:, 0])
+        # Dot product of v_stride and 90CCW rotation of v_step
+        turn = v_stride[1] * v_step[0] - v_stride[0] * v_step[1]
+        feet = np.full(len(steps.time), np.nan, dtype=object)
+        feet[1:len(feet) - 1][complete] = np.where(turn[complete] > 0, 'right', 'left')
         # Assume first and last steps follow typical alternation
-        feet = feet.reindex_like(steps)
-        return feet.fillna(feet.shift(time=2)).fillna(feet.shift(time=-2))
+        missing = pd.isnull(feet)
+        feet[2:][missing[2:]] = feet[:-2][missing[2:]]
+        missing = pd.isnull(feet)
+        feet[:-2][missing[:-2]] = feet[2:][missing[:-2]]
+        return xr.DataArray(feet, dims='time', coords={'time': steps.time})
 
     @staticmethod
-    def _middle_foot_dir(cycle: xr.Dataset):
-        """Determine whether the middle foot in the cycle is a right or left foot
-        """
-        step1 = cycle.isel(window=0)
-        step2 = cycle.isel(window=1)
-        step3 = cycle.isel(window=2)
-        v_step = np.array([step2.x - step1.x, step2.y - step1.y])
-        v_stride = np.array([step3.x - step1.x, step3.y - step1.y])
-        # Dot product of v_stride and 90CCW rotation of v_step
-        dir = v_stride.dot([-v_step[1], v_step[0]])
-        return 'right' if dir > 0 else 'left'
+    def _right_triplets(ds: xr.Dataset) -> xr.Dataset:
+        """Every complete run of 3 consecutive entries whose first is a right foot, along a new cycle dimension
+
+        Returns
+        -------
+        triplets : xarray.Dataset
+            The variables of `ds` with cycle and window dimensions. The time coordinate of each cycle is its last entry
+        """
+        windows = {name: _triplet_windows(ds[name].values) for name in ds.data_vars}
+        keep = np.logical_and.reduce([~pd.isnull(window).any(axis=1) for window in windows.values()])
+        keep &= windows['dir'][:, 0] == 'right'
+        return xr.Dataset({name: (['cycle', 'window'], window[keep]) for name, window in windows.items()},
+                          coords={'time': ('cycle', ds.time.values[2:][keep])})
 
     @reify
     def footstep_cycles(self):
         """Groups of 3 support positions, starting and ending on the right foot
         """
-        footsteps = self.footstep_positions
-        cycle_groups = footsteps.rolling(time=3).construct('window').dropna('time').groupby('time')
-        cycles = xr.concat(np.array(list(cycle_groups))[:, 1], 'cycle')
-        return cycles.where(cycles.isel(window=0).dir == 'right').dropna('cycle')
+        return self._right_triplets(self.footstep_positions)
 
     @reify
     def heelstrike_triplets(self):
@@ -438,15 +1875,13 @@ class FloorRecording:
         """
         heels = self.heelstrikes
         heels = heels.assign(step_time=heels.time)  # The time coordinates will not be so useful later
-        cycle_groups = heels.rolling(time=3).construct('window').dropna('time').groupby('time')
-        cycles = xr.concat(np.array(list(cycle_groups))[:, 1], 'cycle')
-        return cycles.where(cycles.isel(window=0).dir == 'right').dropna('cycle')
+        return self._right_triplets(heels)
 
     @reify
     def heelstrike_triplet_windows(self):
         """A list of the start and end times of heelstrike triplets, with exceptionally long ones filtered"""
-        windows = np.array([(cycle.step_time[0].values, cycle.step_time[-1].values)
-                            for _, cycle in self.heelstrike_triplets.groupby('cycle')])
+        step_times = self.heelstrike_triplets.step_time.values
+        windows = np.stack([step_times[:, 0], step_times[:, -1]], axis=1)
         durations = windows[:, 1] - windows[:, 0]
         return windows[durations < durations.mean() * 1.5]
 
@@ -473,11 +1908,9 @@ class FloorRecording:
             Dataset containing (med, ant) data variables, with the origin at the start of the walk line
         """
         start, end = self.walk_line
-        v_line = (end - start).to_array()
-        v_rot = np.array([v_line[1], -v_line[0]])  # Rotate v_line 90 degrees clockwise
-        c, s = v_rot / np.linalg.norm(v_rot)  # Cosine and sine from unit vector
-        rot_matrix = np.array([[c, s], [-s, c]])  # Clockwise rotation matrix
-        med, ant = rot_matrix.dot(ds[['x', 'y']].to_array().values)
+        rot_matrix = walk_rotation(start.to_array().values, end.to_array().values)
+        xy = ds[['x', 'y']].to_array().values
+        med, ant = rot_matrix.astype(xy.dtype).dot(xy)
         return xr.Dataset({'med': (['time'], med), 'ant': (['time'], ant)},  {'time': ds.time})
 
     @reify
@@ -499,28 +1932,112 @@ class FloorRecording:
         ds = self.cop_vel_mlap
         return [ds.sel(time=slice(*w)) for w in self.heelstrike_triplet_windows]
 
+    @timeit
+    def normalize_cycles(self, windows: np.ndarray) -> CycleTensor:
+        """Resample the mlap position and velocity of many time windows onto `cycle_length` samples each, at once
+
+        Parameters
+        ----------
+        windows : numpy.ndarray
+            (n_cycles, 2) start and end times
+
+        Returns
+        -------
+        cycles : CycleTensor
+            Positions normalized so each cycle starts at ant = 0, ends at ant = 1, and spans med = -0.5 to 0.5 at
+            its widest. Velocities are divided by the same scales
+        """
+        pos, vel = self.cop_mlap, self.cop_vel_mlap
+        return normalize_windows(windows, pos.time.values, [pos.med.values, pos.ant.values, vel.med.values,
+                                                            vel.ant.values], self.cycle_length, self.dtype)
+
+    @reify
+    def cycle_tensor(self) -> CycleTensor:
+        """All gait cycles of the recording, from `heelstrike_triplet_windows`, normalized in one batch"""
+        return self.normalize_cycles(self.heelstrike_triplet_windows)
+
     @reify
     def gait_cycles(self):
-        return np.array([GaitCycle(self, window, name=f'{self.name}_c{i}')
+        return np.array([GaitCycle(self, window, name=f'{self.name}_c{i}', index=i)
                          for i, window in enumerate(self.heelstrike_triplet_windows)])
 
+    @reify
+    def trim_detector(self) -> TrimDetector:
+        """Floor pressure after every raw packet, for finding when someone is on the floor
+
+        The packets are pushed in time order, as they arrived, in chunks so only a chunk of readings is ever copied.
+        """
+        ids = self.df['board_id'].to_numpy()
+        times = self.df.index.to_numpy().astype('datetime64[ms]').astype(np.int64)
+        order = np.argsort(times, kind='stable')  # Cached packets are grouped by board
+        sensors = self.df[list(range(N_SENSORS))]
+        chunk = 1 << 16
+        return TrimDetector(self.layout).extend(
+            Packets(ids[rows], times[rows], sensors.iloc[rows].to_numpy())
+            for rows in (order[i:i + chunk] for i in range(0, len(order), chunk)))
+
+    def loaded_windows(self, min_gap='2s', min_length=None) -> np.ndarray:
+        """Start and end times of each separate walk on the floor, see `TrimDetector.windows`"""
+        return self.trim_detector.windows(min_gap, min_length)
+
     @reify
     def loaded_window(self):
-        mag = self._denoise(self.da).sum(('x', 'y'))
-        loaded_range = mag.where(mag > mag.mean(), drop=True).time.values
-        return loaded_range[0], loaded_range[-1]
+        """First and last time the floor is loaded, found in one pass over the raw packets by `trim_detector`
+
+        Raises
+        ------
+        ValueError
+            If the floor is never loaded above its mean pressure, e.g. nobody walks on it or every board is idle
+        """
+        windows = self.trim_detector.windows()
+        if len(windows) != 1:
+            raise ValueError(f'{self.name}: expected one loaded window, found {len(windows)}')
+        (start, end), = windows
+        return start, end
 
 
 class GaitCycle:
-    """Gait cycle normalized to a fixed number of samples"""
-    def __init__(self, floor, window, name=None):
+    """Gait cycle normalized to a fixed number of samples
+
+    A view onto one row of a `CycleTensor`, by default the floor's own `cycle_tensor`
+    """
+    metrics = {  # GaitCycle method computing each named distance
+        'weighted_pos': 'dist_weighted_pos',
+        'weighted_vel': 'dist_weighted_vel',
+        'weighted_mix': 'dist_weighted_mix',
+        'euclid': 'dist_euclid_all',
+        'frechet': 'dist_frechet',
+        'dtw': 'dist_dtw',
+        'area': 'dist_area',
+        'hausdorff': 'dist_hausdorff',
+    }
+
+    def __init__(self, floor, window, name=None, index=None, tensor=None):
+        """
+        Parameters
+        ----------
+        floor : FloorRecording, optional
+            Recording the cycle was taken from. May be None if `tensor` is given
+        window : Tuple[datetime, datetime]
+            Start and end time of the cycle
+        name : str, optional
+        index : int, optional
+            Row of the cycle in `tensor`. If None, the window is normalized on its own
+        tensor : CycleTensor, optional
+            Normalized cycles this one is a row of, by default `floor.cycle_tensor`
+        """
         self.floor = floor
         self.date_window = window
-        self.date_range = pd.date_range(*window, periods=len(self))
         self.name = name
+        if index is None:
+            self._tensor, self._index = floor.normalize_cycles([window]), 0
+        else:
+            self._tensor, self._index = tensor if tensor is not None else floor.cycle_tensor, index
+        self.dtype = self._tensor.data.dtype
+        self.date_range = pd.date_range(*window, periods=len(self))
 
     def __len__(self):
-        return 40
+        return self._tensor.data.shape[1]
 
     def __repr__(self):
         return f'<GaitCycle {self.name}>'
@@ -557,8 +2074,6 @@ class GaitCycle:
 
     def dist_frechet(self, other):
         dist_pos = similaritymeasures.frechet_dist(self.cop_mlap.to_array().T, other.cop_mlap.to_array().T)
-        # dist_vel = similaritymeasures.frechet_dist(self.cop_mlap.to_array().T, other.cop_mlap.to_array().T)
-        print(f'{self} is {dist_pos:.2f} from {other}')
         return dist_pos
 
     def dist_dtw(self, other):
@@ -578,37 +2093,25 @@ class GaitCycle:
 
     @reify
     def ant_scale(self):
-        pos_i = self.floor.cop_mlap.interp(time=self.date_window[0])
-        pos_f = self.floor.cop_mlap.interp(time=self.date_window[1])
-        dist = pos_f - pos_i
-        return dist.ant.item()
+        return self._tensor.ant_scale[self._index].item()
 
     @reify
     def med_scale(self):
-        pos = self.floor.cop_mlap.interp(time=self.date_range)
-        pos_left = pos.med.min()
-        pos_right = pos.med.max()
-        return max(abs(pos_left), abs(pos_right)) * 2
+        return self._tensor.med_scale[self._index].item()
 
     @reify
     def ant_offset(self):
-        pos_i = self.floor.cop_mlap.interp(time=self.date_window[0])
-        return pos_i.ant.item()
+        return self._tensor.ant_offset[self._index].item()
 
     @reify
     def cop_mlap(self):
-        pos = self.floor.cop_mlap.interp(time=self.date_range).drop('time')
-        pos['med'] = pos.med / self.med_scale
-        pos['ant'] = pos.ant - self.ant_offset
-        pos['ant'] = pos.ant / self.ant_scale
-        return pos
+        data = self._tensor.data[self._index]
+        return xr.Dataset({'med': ('time', data[:, 0]), 'ant': ('time', data[:, 1])})
 
     @reify
     def cop_vel_mlap(self):
-        vel_mlap = self.floor.cop_vel_mlap.interp(time=self.date_range).drop('time')
-        vel_mlap['med'] = vel_mlap.med / self.med_scale
-        vel_mlap['ant'] = vel_mlap.ant / self.ant_scale
-        return vel_mlap
+        data = self._tensor.data[self._index]
+        return xr.Dataset({'med': ('time', data[:, 2]), 'ant': ('time', data[:, 3])})
 
     @reify
     def duration(self):
@@ -617,15 +2120,85 @@ class GaitCycle:
     @reify
     def features(self):
         """ DEPRECATED """
-        vel_mlap = self.cop_vel_mlap
-        pos_mlap = self.cop_mlap
-        return np.concatenate((pos_mlap.med, pos_mlap.ant, vel_mlap.med, vel_mlap.ant))
+        return self._tensor.data[self._index].T.ravel()
+
+
+class FileResult(NamedTuple):
+    """Outcome of loading one recording in `FloorRecordingBatch.cycles_from_csv`"""
+    path: str
+    cycles: Optional['GaitCycleBatch']  # None if the file failed
+    seconds: float
+    error: Optional[str] = None  # formatted traceback of the failure
+
+
+def _cycles_from_file(path, args, kwargs) -> FileResult:
+    """Worker of `FloorRecordingBatch.cycles_from_csv`: load one recording and keep only its normalized cycles"""
+    start = time.perf_counter()
+    try:
+        floor = FloorRecording.from_csv(path, *args, **kwargs)
+        return FileResult(path, GaitCycleBatch.from_floors([floor]), time.perf_counter() - start)
+    except Exception:
+        return FileResult(path, None, time.perf_counter() - start, traceback.format_exc())
+
+
+def print_progress(done: int, total: int, result: FileResult):
+    """Default progress report of `FloorRecordingBatch.cycles_from_csv`, one line per file"""
+    outcome = f'{len(result.cycles)} cycles' if result.error is None else 'FAILED ' + result.error.splitlines()[-1]
+    print(f'[{done}/{total}] {result.path}: {outcome} in {result.seconds:.2f} s')
 
 
 class FloorRecordingBatch:
     def __init__(self, floors):
         self.floors = floors
 
+    @staticmethod
+    def cycles_from_csv(paths: List[str], *args, workers=None, report: Optional[Callable] = print_progress,
+                        **kwargs) -> Tuple['GaitCycleBatch', List[FileResult]]:
+        """Load many recordings in parallel processes and gather their gait cycles
+
+        Each worker returns only the cycles of its file, never the recording. A file that fails to load is reported
+        and skipped instead of stopping the others.
+
+        Parameters
+        ----------
+        paths : List[str]
+            File paths to the raw smartfloor .csv recordings
+        *args, **kwargs:
+            Arguments to be passed to FloorRecording constructor for each path
+        workers : int, optional
+            Number of worker processes, by default one per CPU. 1 loads the files in this process
+        report : Callable, optional
+            Called as report(done, total, result) as each file finishes
+
+        Returns
+        -------
+        cycles : GaitCycleBatch
+            Cycles of every file that loaded, in the order of `paths`
+        results : List[FileResult]
+            Outcome of each file, in the order of `paths`
+        """
+        results = {}
+
+        def finished(result):
+            results[result.path] = result
+            if report is not None:
+                report(len(results), len(paths), result)
+
+        if workers == 1:
+            for path in paths:
+                finished(_cycles_from_file(path, args, kwargs))
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                futures = {pool.submit(_cycles_from_file, path, args, kwargs): path for path in paths}
+                for future in as_completed(futures):
+                    try:
+                        finished(future.result())
+                    except Exception:  # the worker itself died, e.g. out of memory
+                        finished(FileResult(futures[future], None, float('nan'), traceback.format_exc()))
+        results = [results[path] for path in paths]
+        loaded = [result.cycles for result in results if result.cycles is not None]
+        return GaitCycleBatch.concatenate(loaded) if loaded else GaitCycleBatch.from_floors([]), results
+
     @staticmethod
     def from_csv(paths: List[str], *args, **kwargs):
         """Create a batch of floor recordings from a list of .csv file paths
@@ -650,23 +2223,226 @@ class FloorRecordingBatch:
 
     @reify
     def gait_cycle_batch(self):
-        return GaitCycleBatch(self.gait_cycles)
+        return GaitCycleBatch.from_floors(self.floors)
+
+
+_BATCH_VERSION = 1  # layout of saved GaitCycleBatch directories, bump on any change to it
 
 
 class GaitCycleBatch:
-    def __init__(self, cycles):
-        self.cycles = np.array(cycles)
+    """Gait cycles stored column-wise, so that selections and queries work on whole arrays
+
+    Indexing with an int gives a GaitCycle view of one row. Indexing with a slice, index array or boolean mask gives
+    a new batch.
+
+    Attributes
+    ----------
+    features : numpy.ndarray
+        (n, 4 * length) float32 rows laid out like `GaitCycle.features`: med position, ant position, med velocity,
+        ant velocity
+    names : numpy.ndarray
+        (n,) cycle names, e.g. '5_lhob_1_c3'
+    recordings : numpy.ndarray
+        (n,) names of the recordings the cycles were taken from
+    participants : numpy.ndarray
+        (n,) participant number parsed from the recording name, or -1
+    styles : numpy.ndarray
+        (n,) gait style parsed from the recording name, e.g. 'lhob'
+    trials : numpy.ndarray
+        (n,) trial label parsed from the recording name
+    windows : numpy.ndarray
+        (n, 2) start and end time of each cycle
+    med_scale, ant_scale, ant_offset : numpy.ndarray
+        (n,) normalization of each cycle, as in CycleTensor
+    floors : numpy.ndarray, optional
+        (n,) FloorRecording of each cycle, only kept when requested since it pins the whole recording
+    """
+    _columns = ('features', 'names', 'recordings', 'participants', 'styles', 'trials', 'windows',
+                'med_scale', 'ant_scale', 'ant_offset')
+
+    def __init__(self, features, names, recordings, windows, med_scale, ant_scale, ant_offset, floors=None,
+                 participants=None, styles=None, trials=None):
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.names = np.asarray(names, dtype=str)
+        self.recordings = np.asarray(recordings, dtype=str)
+        self.windows = np.asarray(windows, dtype='datetime64[ns]').reshape(-1, 2)
+        self.med_scale, self.ant_scale, self.ant_offset = (np.asarray(scale, dtype=np.float32)
+                                                           for scale in (med_scale, ant_scale, ant_offset))
+        self.floors = None if floors is None else np.asarray(floors, dtype=object)
+        if participants is None:
+            participants, styles, trials = GaitCycleBatch._parse_recordings(self.recordings)
+        self.participants = np.asarray(participants, dtype=int)
+        self.styles = np.asarray(styles, dtype=str)
+        self.trials = np.asarray(trials, dtype=str)
+
+    @staticmethod
+    def _parse_recordings(recordings: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Participant, style and trial of recordings named like '<participant>_<style>_<trial>'"""
+        unique, inverse = np.unique(recordings, return_inverse=True)
+        parsed = [re.match(r'^(\d+)_([^_]*)_?(.*)$', name) for name in unique]
+        parsed = np.array([(int(m[1]), m[2], m[3]) if m else (-1, '', '') for m in parsed], dtype=object).reshape(-1, 3)
+        return tuple(parsed[inverse.ravel(), i] for i in range(3))
+
+    @staticmethod
+    def from_floors(floors: List['FloorRecording'], keep_floors=False) -> 'GaitCycleBatch':
+        """Gather the normalized cycles of many recordings, named like `FloorRecording.gait_cycles`"""
+        tensors = [floor.cycle_tensor for floor in floors] or [CycleTensor(np.empty((0, 2)), np.empty((0, 0, 4)),
+                                                                           *[np.empty(0)] * 3)]
+        counts = [len(tensor.windows) for tensor in tensors]
+        floor_of_cycle = [floor for floor, count in zip(floors, counts) for _ in range(count)]
+        return GaitCycleBatch(
+            features=np.concatenate([tensor.data.transpose(0, 2, 1).reshape(count, 4 * tensor.data.shape[1])
+                                     for tensor, count in zip(tensors, counts)]),
+            names=[f'{floor.name}_c{i}' for floor, count in zip(floors, counts) for i in range(count)],
+            recordings=[str(floor.name) for floor in floor_of_cycle],
+            windows=np.concatenate([tensor.windows for tensor in tensors]),
+            **{scale: np.concatenate([getattr(tensor, scale) for tensor in tensors])
+               for scale in ('med_scale', 'ant_scale', 'ant_offset')},
+            floors=floor_of_cycle if keep_floors else None)
+
+    @staticmethod
+    def from_cycles(cycles: List['GaitCycle'], keep_floors=False) -> 'GaitCycleBatch':
+        """Gather individual GaitCycle objects"""
+        cycles = list(cycles)
+        return GaitCycleBatch(
+            features=np.array([cycle.features for cycle in cycles]).reshape(len(cycles), -1),
+            names=[cycle.name for cycle in cycles],
+            recordings=[cycle.floor.name if cycle.floor is not None else '' for cycle in cycles],
+            windows=np.array([cycle.date_window for cycle in cycles]).reshape(-1, 2),
+            med_scale=[cycle.med_scale for cycle in cycles], ant_scale=[cycle.ant_scale for cycle in cycles],
+            ant_offset=[cycle.ant_offset for cycle in cycles],
+            floors=[cycle.floor for cycle in cycles] if keep_floors else None)
+
+    @staticmethod
+    def concatenate(batches: List['GaitCycleBatch']) -> 'GaitCycleBatch':
+        keep_floors = all(batch.floors is not None for batch in batches)
+        columns = {name: np.concatenate([getattr(batch, name) for batch in batches])
+                   for name in GaitCycleBatch._columns}
+        floors = np.concatenate([batch.floors for batch in batches]) if keep_floors else None
+        return GaitCycleBatch(floors=floors, **columns)
+
+    def save(self, path):
+        """ Write the batch as a directory of .npy columns and a meta.json schema, see `GaitCycleBatch.load`
+
+        Floors are not saved. The metadata is written last, so an interrupted save is never loaded
+        """
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(f'{path}/meta.json'):
+            os.remove(f'{path}/meta.json')
+        for name in GaitCycleBatch._columns:
+            np.save(f'{path}/{name}.npy', getattr(self, name))
+        meta = {'version': _BATCH_VERSION, 'columns': list(GaitCycleBatch._columns), 'cycles': len(self),
+                'length': self.length}
+        with open(f'{path}/meta.json', 'w') as f:
+            json.dump(meta, f)
+
+    @staticmethod
+    def load(path, mmap=True) -> 'GaitCycleBatch':
+        """ Read a batch written by `GaitCycleBatch.save`
+
+        Parameters
+        ----------
+        path : str
+            Directory of the saved batch
+        mmap : bool
+            Memory-map the columns read-only instead of reading them into memory
+
+        Raises
+        ------
+        ValueError
+            If the directory was written with a different layout version
+        """
+        with open(f'{path}/meta.json') as f:
+            meta = json.load(f)
+        if meta['version'] != _BATCH_VERSION:
+            raise ValueError(f'{path} holds a version {meta["version"]} cycle batch, expected {_BATCH_VERSION}')
+        return GaitCycleBatch(**{name: np.load(f'{path}/{name}.npy', mmap_mode='r' if mmap else None)
+                                 for name in meta['columns']})
+
+    @property
+    def length(self) -> int:
+        """Number of samples per cycle"""
+        return self.features.shape[1] // 4
+
+    @property
+    def tensor(self) -> CycleTensor:
+        """The batch as a CycleTensor, viewing the feature matrix without copying it"""
+        data = self.features.reshape(len(self), 4, self.length).transpose(0, 2, 1)
+        return CycleTensor(self.windows, data, self.med_scale, self.ant_scale, self.ant_offset)
+
+    @property
+    def cycles(self) -> np.ndarray:
+        """GaitCycle views of every row"""
+        cycles = np.empty(len(self), dtype=object)
+        cycles[:] = list(self)
+        return cycles
 
     def __len__(self):
-        return len(self.cycles)
+        return len(self.names)
 
     def __getitem__(self, index):
-        return self.cycles[index]
+        if isinstance(index, (int, np.integer)):
+            index = range(len(self))[index]
+            floor = self.floors[index] if self.floors is not None else None
+            return GaitCycle(floor, tuple(self.windows[index]), name=str(self.names[index]), index=index,
+                             tensor=self.tensor)
+        return GaitCycleBatch(floors=self.floors[index] if self.floors is not None else None,
+                              **{name: getattr(self, name)[index] for name in GaitCycleBatch._columns})
 
     def __iter__(self):
-        return self.cycles.__iter__()
+        tensor = self.tensor
+        for i in range(len(self)):
+            floor = self.floors[i] if self.floors is not None else None
+            yield GaitCycle(floor, tuple(self.windows[i]), name=str(self.names[i]), index=i, tensor=tensor)
+
+    def __repr__(self):
+        return f'<GaitCycleBatch of {len(self)} cycles>'
 
-    def query_cycle(self, other: 'GaitCycle', metric='weighted-diff'):
+    def build_index(self, backend='kdtree', **kwargs):
+        """ Index these cycles for fast 'euclid' nearest neighbor lookup, see `cycleindex`
+
+        Parameters
+        ----------
+        backend : str
+            'kdtree' for exact search or 'ivf' for approximate search that scales to very large libraries
+        kwargs
+            Options of `cycleindex.KDTreeIndex` or `cycleindex.IVFIndex`
+        """
+        import cycleindex  # cycleindex builds on this module
+        return {'kdtree': cycleindex.KDTreeIndex, 'ivf': cycleindex.IVFIndex}[backend](self, **kwargs)
+
+    @timeit
+    def distances(self, other: 'GaitCycleBatch', metric='weighted_mix', band=None) -> np.ndarray:
+        """ (len(other), len(self)) distances from each cycle of `other` to each cycle of this batch
+
+        Metrics in `CYCLE_METRIC_WEIGHTS` are computed on the feature matrices in one pass and those in
+        `TRAJECTORY_METRICS` on the position trajectories one query at a time, 'dtw' and 'frechet' optionally within a
+        Sakoe-Chiba `band`
+        """
+        if metric in CYCLE_METRIC_WEIGHTS:
+            return pairwise_distances(other.features, self.features, metric)
+        return trajectory_distances(cycle_trajectories(other.features), cycle_trajectories(self.features), metric,
+                                    band)
+
+    @timeit
+    def nearest(self, other: 'GaitCycleBatch', k=1, metric='weighted_mix', band=None) -> Tuple[np.ndarray, np.ndarray]:
+        """ The k cycles of this batch closest to each cycle of `other`
+
+        'dtw' queries use the pruned search of `dtw_nearest`, which gives the same neighbors as the full matrix
+
+        Returns
+        -------
+        distances : numpy.ndarray
+            (len(other), k) distances in ascending order
+        indices : numpy.ndarray
+            (len(other), k) rows of this batch the distances belong to, -1 where a 'dtw' query found fewer than k
+        """
+        if metric == 'dtw':
+            neighbors = dtw_nearest(cycle_trajectories(other.features), cycle_trajectories(self.features), k, band)
+            return neighbors.distances, neighbors.indices
+        return top_k(self.distances(other, metric), k)
+
+    def query_cycle(self, other: 'GaitCycle', metric='weighted_mix', k=None, band=None):
         """ Order the gait cycles by their similarity to a query cycle
 
         Parameters
@@ -674,32 +2450,27 @@ class GaitCycleBatch:
         other : GaitCycle
             Cycle to lookup
         metric : str
-            Cycle to lookup
+            Name of the distance measure, see `GaitCycle.metrics`
+        k : int, optional
+            Only return the k nearest cycles
+        band : int, optional
+            Sakoe-Chiba band half width for 'dtw'
 
         Returns
         -------
-        distances : List[int]
+        distances : numpy.ndarray
             Distances of each neighbor from the query
         neighbors : GaitCycleBatch
             Cycles in this batch in ascending order of distance from the query
         """
-        metric_dist = {
-            'weighted_pos': other.dist_weighted_pos,
-            'weighted_vel': other.dist_weighted_vel,
-            'weighted_mix': other.dist_weighted_mix,
-            'euclid': other.dist_euclid_all,
-            'frechet': other.dist_frechet,
-            'dtw': other.dist_dtw,
-            'area': other.dist_area,
-            'hausdorff': other.dist_hausdorff
-        }[metric]
-        vec_f = np.vectorize(metric_dist)
-        distances = vec_f(self.cycles)
-        neighbors = self.cycles[distances.argsort()]
-        return np.sort(distances), GaitCycleBatch(neighbors)
-
-    def query_batch(self, other: 'GaitCycleBatch', *args, **kwargs):
-        return np.moveaxis(np.array([self.query_cycle(cycle, *args, **kwargs) for cycle in other]), 1, 0)
+        distances, indices = self.nearest(GaitCycleBatch.from_cycles([other]), k or len(self), metric, band)
+        return distances[0], self[indices[0]]
+
+    def query_batch(self, other: 'GaitCycleBatch', metric='weighted_mix', k=None, band=None):
+        """Query every cycle of `other`, returning (n_other, k) sorted distances and an array of neighbor cycles"""
+        distances, indices = self.nearest(other, k or len(self), metric, band)
+        cycles = self.cycles
+        return distances, cycles[indices] if len(cycles) else np.empty(indices.shape, dtype=object)
 
     def partition_names(self, pattern, reverse=False):
         """Split the batch into two batches based on a naming pattern
@@ -717,6 +2488,6 @@ class GaitCycleBatch:
             Cycles whose name doesn't match the pattern
         """
         regex_hit = re.compile(pattern)
-        hits = GaitCycleBatch([cycle for cycle in self.cycles if regex_hit.match(cycle.name)])
-        misses = GaitCycleBatch([cycle for cycle in self.cycles if not regex_hit.match(cycle.name)])
+        hit = np.array([regex_hit.match(name) is not None for name in self.names], dtype=bool)
+        hits, misses = self[hit], self[~hit]
         return (hits, misses) if not reverse else (misses, hits)
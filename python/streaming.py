@@ -0,0 +1,301 @@
+# Using NumPy style docstrings
+import socket
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from smartfloor import (FloorLayout, FloorRecording, N_SENSORS, center_of_pressure, cop_weights, denoise_frames,
+                        read_packets)
+
+Packet = Tuple[int, int, np.ndarray]  # board_id, ms timestamp, 48 sensor readings
+
+
+class StreamingFloor:
+    """A live SmartFloor that processes board packets as they arrive
+
+    Packets are interpolated per board onto a common clock of `freq` ticks, the same way FloorRecording resamples a
+    finished recording, and placed on the floor by its `layout`. Each tick is denoised and reduced to a center of
+    pressure immediately, with the same `denoise_frames` and `center_of_pressure` as a recording. Only the last
+    `history` ticks are kept, in fixed size ring buffers, so memory use does not grow with the length of the stream.
+
+    A tick is only emitted once every board has covered it, so a board that stops sending stalls the output, and the
+    other boards stop filling once they are `history` ticks ahead. With `stale_after` set, a board silent for that long
+    behind the newest packet has its last readings held until it sends again. Boards holding the output back are
+    listed by `stalled`.
+
+    Attributes
+    ----------
+    layout : FloorLayout
+        Where the boards are on the floor, packets of other boards are ignored
+    board_map : List[int]
+        Board IDs in the order of `layout`
+    freq : pandas.Timedelta
+        Spacing of the output ticks
+    history : int
+        Number of ticks held in the ring buffers
+    n_ticks : int
+        Total number of ticks emitted so far
+    noise : numpy.ndarray
+        (y, x) base pressure, taken from the first tick like FloorRecording.noise
+    on_tick : Callable, optional
+        Called as on_tick(floor) after every new tick
+    stale_after : pandas.Timedelta, optional
+        How far a board may fall behind the newest packet before its last readings are held, None to wait for it
+    """
+
+    def __init__(self, freq='40ms', history=250, board_map=None, mask_dist=3, on_tick=None, stale_after=None,
+                 layout=None):
+        """
+        Parameters
+        ----------
+        board_map : List[int], optional
+            Board IDs left to right, for a strip of boards when no `layout` is given
+        layout : FloorLayout or str, optional
+            Board layout or the path of its JSON config, by default a strip of the `board_map` boards
+        """
+        if layout is None:
+            layout = FloorLayout.strip(list(board_map or FloorRecording.board_map))
+        self.layout = FloorLayout.from_config(layout) if isinstance(layout, str) else layout
+        self.board_map = self.layout.board_ids
+        self.freq = pd.Timedelta(freq)
+        self.history = history
+        self.mask_dist = mask_dist
+        self.on_tick: Optional[Callable[['StreamingFloor'], None]] = on_tick
+        self.n_ticks = 0
+        self.noise = None
+        self.stale_after = pd.Timedelta(stale_after) if stale_after is not None else None
+
+        n_boards = len(self.board_map)
+        height, width = self.layout.height, self.layout.width
+        self._slot = {board_id: i for i, board_id in enumerate(self.board_map)}
+        self._sensor_maps = self.layout.sensor_maps
+        # (y, x) tiles of the floor covered by each board
+        self._tiles = [(self.layout.rows(board, sensor_map), slice(board.x, board.x + sensor_map.shape[1]))
+                       for board, sensor_map in zip(self.layout.boards, self._sensor_maps)]
+        self._step = int(self.freq / pd.Timedelta('1ms'))
+        self._start = None
+        # Last two packets of each board, enough to interpolate any tick between them
+        self._seen = np.zeros(n_boards, dtype=bool)
+        self._prev_t = np.zeros(n_boards, dtype=np.int64)
+        self._cur_t = np.zeros(n_boards, dtype=np.int64)
+        self._prev_grid = [np.zeros(sensor_map.shape, dtype=np.float32) for sensor_map in self._sensor_maps]
+        self._cur_grid = [np.zeros(sensor_map.shape, dtype=np.float32) for sensor_map in self._sensor_maps]
+        # Ticks already interpolated for some boards but still waiting on others, tiles no board covers stay zero
+        self._filled = np.zeros(n_boards, dtype=np.int64)
+        self._pending = np.zeros((history, height, width), dtype=np.float32)
+        # Ring buffers
+        self._times = np.zeros(history, dtype=np.int64)
+        self._samples = np.zeros((history, height, width), dtype=np.float32)
+        self._pressure = np.zeros((history, height, width), dtype=np.float32)
+        self._cop = np.zeros((history, 3), dtype=np.float32)
+        # Coordinates, with (0, 0) at the bottom left of the floor
+        self.x = np.arange(width)
+        self.y = np.arange(height)[::-1]
+        self._cop_weights = cop_weights(self.x, self.y, np.float32)
+
+    def push(self, board_id: int, time_ms: int, sensors: np.ndarray) -> int:
+        """Add one board packet and emit any ticks that are now covered by all boards
+
+        Parameters
+        ----------
+        board_id : int
+            ID of the board that sent the packet, packets from boards outside `board_map` are ignored
+        time_ms : int
+            Packet timestamp in milliseconds since the epoch
+        sensors : numpy.ndarray
+            The board's 48 sensor readings in sensor id order
+
+        Returns
+        -------
+        n : int
+            Number of ticks emitted by this packet
+        """
+        i = self._slot.get(board_id)
+        if i is None or (self._seen[i] and time_ms <= self._cur_t[i]):
+            return 0  # Unknown board, or a late/duplicate packet
+        self._prev_t[i], self._cur_t[i] = (self._cur_t[i] if self._seen[i] else time_ms), time_ms
+        grid = np.asarray(sensors)[self._sensor_maps[i]].astype(np.float32)
+        self._prev_grid[i], self._cur_grid[i] = (self._cur_grid[i] if self._seen[i] else grid), grid
+        self._seen[i] = True
+        if self._start is None:
+            if not self._seen.all():
+                return 0
+            self._start = int(self._cur_t.max())  # First time at which all boards are recording
+            for j in range(len(self.board_map)):
+                self._fill(j)
+        else:
+            self._fill(i)
+            if self.stale_after is not None:
+                for j in np.flatnonzero(self._cur_t < time_ms - self.stale_after / pd.Timedelta('1ms')):
+                    self._hold(j, time_ms - self.stale_after / pd.Timedelta('1ms'))
+        n = 0
+        while self._filled.min() > self.n_ticks:
+            self._emit()
+            n += 1
+        return n
+
+    def extend(self, packets: Iterable[Packet]) -> int:
+        """Push a sequence of (board_id, time_ms, sensors) packets, returning the number of ticks emitted"""
+        return sum(self.push(*packet) for packet in packets)
+
+    def _fill(self, i: int):
+        """Interpolate board i onto every tick up to its latest packet"""
+        k = self._filled[i]
+        prev_t, cur_t = self._prev_t[i], self._cur_t[i]
+        span = cur_t - prev_t
+        prev_grid, cur_grid = self._prev_grid[i], self._cur_grid[i]
+        rows, cols = self._tiles[i]
+        while self._start + k * self._step <= cur_t and k - self.n_ticks < self.history:
+            w = 1 if span == 0 else min(max((self._start + k * self._step - prev_t) / span, 0), 1)
+            self._pending[k % self.history, rows, cols] = prev_grid + (cur_grid - prev_grid) * w
+            k += 1
+        self._filled[i] = k
+
+    def _hold(self, i: int, until: float):
+        """Carry board i's last readings onto every tick up to `until`, while it is silent"""
+        k = self._filled[i]
+        rows, cols = self._tiles[i]
+        while self._start + k * self._step <= until and k - self.n_ticks < self.history:
+            self._pending[k % self.history, rows, cols] = self._cur_grid[i]
+            k += 1
+        self._filled[i] = k
+
+    @property
+    def stalled(self) -> List[int]:
+        """IDs of the boards that have sent nothing within `history` ticks of the newest packet, or `stale_after`
+
+        These are the boards holding back the output, as no tick is emitted until every board has covered it.
+        """
+        if not self._seen.any():
+            return []
+        lag = (self.stale_after if self.stale_after is not None else self.history * self.freq) / pd.Timedelta('1ms')
+        newest = self._cur_t[self._seen].max()
+        return [board_id for board_id, seen, t in zip(self.board_map, self._seen, self._cur_t)
+                if not seen or t < newest - lag]
+
+    def _emit(self):
+        k = self.n_ticks % self.history
+        frame = self._pending[k]
+        if self.noise is None:
+            self.noise = frame.copy()
+        self._times[k] = self._start + self.n_ticks * self._step
+        self._samples[k] = frame
+        self._pressure[k] = denoise_frames(frame[..., None], self.noise, self.mask_dist)[..., 0]
+        self._cop[k] = center_of_pressure(self._pressure[k], self._cop_weights)
+        self.n_ticks += 1
+        if self.on_tick is not None:
+            self.on_tick(self)
+
+    def _order(self) -> np.ndarray:
+        """Ring buffer positions of the held ticks, oldest first"""
+        n = min(self.n_ticks, self.history)
+        return (np.arange(self.n_ticks - n, self.n_ticks)) % self.history
+
+    @property
+    def times(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self._times[self._order()].astype('datetime64[ms]'), name='time')
+
+    @property
+    def samples(self) -> xr.DataArray:
+        """Resampled raw readings of the held ticks, with y, x, and time dimensions"""
+        return self._grid_darray(self._samples)
+
+    @property
+    def pressure(self) -> xr.DataArray:
+        """Denoised pressure of the held ticks, with y, x, and time dimensions"""
+        return self._grid_darray(self._pressure)
+
+    @property
+    def cop(self) -> xr.Dataset:
+        """Center of pressure of the held ticks, with x, y, and magnitude data variables"""
+        x, y, magnitude = self._cop[self._order()].T
+        return xr.Dataset({'x': ('time', x), 'y': ('time', y), 'magnitude': ('time', magnitude)},
+                          coords={'time': self.times})
+
+    @property
+    def latest(self) -> Tuple[pd.Timestamp, np.ndarray, np.ndarray]:
+        """Time, (y, x) pressure frame and (x, y, magnitude) center of pressure of the newest tick"""
+        k = (self.n_ticks - 1) % self.history
+        return pd.Timestamp(self._times[k], unit='ms'), self._pressure[k], self._cop[k]
+
+    def _grid_darray(self, buffer: np.ndarray) -> xr.DataArray:
+        return xr.DataArray(buffer[self._order()], dims=['time', 'y', 'x'],
+                            coords={'time': self.times, 'x': self.x, 'y': self.y}).transpose('y', 'x', 'time')
+
+
+def replay_csv(path, speed: Optional[float] = 1.0, chunksize=1 << 16) -> Iterator[Packet]:
+    """Yield the packets of a recorded .csv in file order, paced like the original recording
+
+    Parameters
+    ----------
+    path : str
+        Raw SmartFloor .csv recording
+    speed : float, optional
+        Playback speed relative to real time, or None to yield packets as fast as possible
+    chunksize : int
+        Number of lines parsed at a time, so arbitrarily long recordings can be replayed
+
+    Yields
+    ------
+    packet : Tuple[int, int, numpy.ndarray]
+        board_id, ms timestamp and sensor readings
+    """
+    t0_wall, t0_rec = None, None
+    for chunk in read_packets(path, chunksize=chunksize):
+        for board_id, t, sensors in zip(chunk.board_id.tolist(), chunk.time.tolist(), chunk.sensors):
+            if speed is not None:
+                if t0_wall is None:
+                    t0_wall, t0_rec = time.perf_counter(), t
+                delay = (t - t0_rec) / 1000 / speed - (time.perf_counter() - t0_wall)
+                if delay > 0:
+                    time.sleep(delay)
+            yield board_id, t, sensors
+
+
+def format_packet(board_id: int, time_ms: int, sensors: np.ndarray) -> bytes:
+    """Encode a packet as one line of the raw .csv format, which is also the wire format"""
+    return (f'{board_id},{time_ms},' + ','.join(map(str, sensors.tolist())) + '\n').encode()
+
+
+def parse_packet(line: bytes) -> Packet:
+    values = np.array(line.split(b','), dtype=np.int64)
+    if values.size != N_SENSORS + 2:
+        raise ValueError(f'Expected {N_SENSORS + 2} fields in a packet, got {values.size}')
+    return int(values[0]), int(values[1]), values[2:].astype(np.uint16)
+
+
+def read_socket(host='0.0.0.0', port=5005, protocol='udp') -> Iterator[Packet]:
+    """Yield packets received over the network, one .csv formatted packet per line
+
+    Parameters
+    ----------
+    host : str
+        Address to listen on
+    port : int
+        Port to listen on
+    protocol : str
+        'udp' to receive datagrams, or 'tcp' to accept a single connection and read a line stream from it
+    """
+    if protocol == 'udp':
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind((host, port))
+            while True:
+                data, _ = sock.recvfrom(65536)
+                for line in data.splitlines():
+                    if line:
+                        yield parse_packet(line)
+    elif protocol == 'tcp':
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((host, port))
+            server.listen(1)
+            conn, _ = server.accept()
+            with conn, conn.makefile('rb') as stream:
+                for line in stream:
+                    if line.strip():
+                        yield parse_packet(line.strip())
+    else:
+        raise ValueError(f"Unknown protocol '{protocol}', expected 'udp' or 'tcp'")
@@ -0,0 +1,183 @@
+# Using NumPy style docstrings
+from typing import List, NamedTuple
+
+import numpy as np
+
+from smartfloor import N_SENSORS, FloorLayout, FloorRecording, Packets
+
+START_MS = 1_541_900_000_000  # ms timestamp of the first packet of every synthetic recording
+
+
+class Footsteps(NamedTuple):
+    """Schedule of a synthetic walk, one entry per foot contact"""
+    start: np.ndarray  # s from the start of the recording
+    x: np.ndarray  # floor position of the middle of the foot, in tiles
+    y: np.ndarray
+    direction: np.ndarray  # +1 when walking towards increasing x, -1 when walking back
+    right: np.ndarray  # whether it is a right foot
+
+
+def walk(width: int, height: int, duration: float, idle=2.0, step_period=0.7, step_length=2.0, step_width=1.2,
+         sway=0.1, rng=None) -> Footsteps:
+    """Footsteps walking back and forth along the x axis of a floor, alternating feet
+
+    Each pass runs from one end of the floor to the other, and the next pass starts with a turning step on the spot.
+
+    Parameters
+    ----------
+    width, height : int
+        Size of the floor in tiles
+    duration : float
+        Length of the recording in seconds. Steps are taken from `idle` seconds in until `idle` seconds before the end
+    step_period : float
+        Seconds between consecutive foot contacts
+    step_length : float
+        Tiles between consecutive footsteps along a pass
+    step_width : float
+        Tiles between the left and right foot across a pass
+    sway : float
+        Standard deviation of random sideways foot placement, in tiles
+    rng : numpy.random.Generator, optional
+    """
+    rng = rng or np.random.default_rng()
+    n_steps = max(0, int((duration - 2 * idle) / step_period))
+    per_pass = max(1, int((width - 2) // step_length))
+    k = np.arange(n_steps)
+    passes, i = np.divmod(k, per_pass + 1)
+    direction = np.where(passes % 2 == 0, 1, -1)
+    x = 1 + np.where(direction > 0, i, per_pass - i) * step_length
+    right = k % 2 == 0
+    y = (height - 1) / 2 + direction * np.where(right, -0.5, 0.5) * step_width + rng.normal(0, sway, n_steps)
+    start = idle + k * step_period + rng.normal(0, 0.03 * step_period, n_steps)
+    return Footsteps(start, x, np.clip(y, 0, height - 1), direction, right)
+
+
+def board_timestamps(n_boards: int, duration: float, hz=25.0, jitter=1.0, rng=None) -> List[np.ndarray]:
+    """ms timestamps of every board's packets, each board free-running at `hz` with its own phase
+
+    Packets are delayed by an exponentially distributed `jitter` ms on top of the nominal period, like the boards'
+    logged timestamps drift later than their nominal rate.
+
+    Returns
+    -------
+    times : List[numpy.ndarray]
+        Increasing int64 timestamps for each board
+    """
+    rng = rng or np.random.default_rng()
+    period = 1000 / hz
+    n = int(duration * hz)
+    return [START_MS + np.floor(rng.uniform(0, period) + np.cumsum(period + rng.exponential(jitter, n))
+                                - period).astype(np.int64)
+            for _ in range(n_boards)]
+
+
+def foot_pressure(times: np.ndarray, tile_x: np.ndarray, tile_y: np.ndarray, steps: Footsteps, step_period=0.7,
+                  stance=1.25, peak=400.0, spread=0.45, foot_length=0.8) -> np.ndarray:
+    """Pressure on the tiles of a board at each of its packet times, from every foot in contact
+
+    A foot stays down for `stance` step periods, so the two feet overlap at every step. Its load rises and falls as a
+    half sine while its centre of pressure rolls from heel to toe, and spreads over neighbouring tiles as a Gaussian.
+
+    Parameters
+    ----------
+    times : numpy.ndarray
+        (n,) packet times in s from the start of the recording
+    tile_x, tile_y : numpy.ndarray
+        (height, width) floor position of each tile of the board, laid out like `BoardRecording.grid`
+
+    Returns
+    -------
+    grid : numpy.ndarray
+        (n, height, width) float pressure, laid out like `BoardRecording.grid`
+    """
+    grid = np.zeros((len(times), *tile_x.shape))
+    if not len(steps.start):
+        return grid
+    latest = np.searchsorted(steps.start, times, side='right') - 1
+    for back in range(int(np.ceil(stance)) + 1):  # every contact that may still be down
+        step = latest - back
+        valid = step >= 0
+        step = np.where(valid, step, 0)
+        phase = (times - steps.start[step]) / (stance * step_period)
+        down = valid & (phase >= 0) & (phase <= 1)
+        if not down.any():
+            continue
+        step, phase = step[down], phase[down]
+        load = peak * np.sin(np.pi * phase)
+        cx = steps.x[step] + steps.direction[step] * (phase - 0.5) * foot_length
+        cy = steps.y[step]
+        squared = (tile_x - cx[:, None, None]) ** 2 + (tile_y - cy[:, None, None]) ** 2
+        grid[down] += load[:, None, None] * np.exp(-squared / (2 * spread ** 2))
+    return grid
+
+
+def grid_layout(n_boards: int) -> FloorLayout:
+    """A roughly square room of standard boards, twice as many columns as rows, like the four board strip"""
+    columns = max(1, int(round(2 * np.sqrt(n_boards))))
+    return FloorLayout.grid(range(n_boards), columns)
+
+
+def synthetic_packets(duration=30.0, hz=25.0, layout=None, noise=0.5, offset=15.0, jitter=1.0, idle=2.0,
+                      step_period=0.7, step_length=2.0, step_width=1.2, peak=400.0, seed=0) -> Packets:
+    """Raw packets of a person walking across a floor, interleaved in time like a logged recording
+
+    The walk goes back and forth along the x axis, through the middle of the floor.
+
+    Parameters
+    ----------
+    duration : float
+        Length of the recording in seconds
+    hz : float
+        Nominal packet rate of each board
+    layout : FloorLayout, optional
+        Boards of the floor, by default a strip of the `FloorRecording.board_map` boards
+    noise : float
+        Standard deviation of the per-packet sensor noise, about 0.4 for the boards of the sample recording
+    offset : float
+        Mean of the constant per-sensor base reading
+    jitter : float
+        Mean extra delay between consecutive packets of a board, in ms
+    idle : float
+        Seconds with nobody on the floor at the start and end of the recording
+    step_period, step_length, step_width : float
+        Gait parameters, see `walk`
+    peak : float
+        Reading of the most loaded tile under a foot at mid-stance
+    seed : int
+
+    Returns
+    -------
+    packets : Packets
+        One row per packet, ordered by timestamp
+    """
+    rng = np.random.default_rng(seed)
+    layout = layout or FloorLayout.strip(FloorRecording.board_map)
+    steps = walk(layout.width, layout.height, duration, idle, step_period, step_length, step_width, rng=rng)
+    board_times = board_timestamps(len(layout.boards), duration, hz, jitter, rng)
+    board = np.repeat(np.arange(len(layout.boards)), [len(times) for times in board_times])
+    time = np.concatenate(board_times)
+    order = np.argsort(time, kind='stable')
+    board, time = board[order], time[order]
+    base = rng.gamma(2, offset / 2, (len(layout.boards), N_SENSORS))
+    sensors = base[board] + rng.normal(0, noise, (len(time), N_SENSORS))
+    for i, (placement, sensor_map) in enumerate(zip(layout.boards, layout.sensor_maps)):
+        rows = np.flatnonzero(board == i)
+        height, width = sensor_map.shape
+        tile_y, tile_x = np.meshgrid(placement.y + np.arange(height)[::-1], placement.x + np.arange(width),
+                                     indexing='ij')
+        grid = foot_pressure((time[rows] - START_MS) / 1000, tile_x, tile_y, steps, step_period, peak=peak)
+        sensors[rows[:, None, None], sensor_map] += grid
+    sensors = np.clip(np.rint(sensors), 0, np.iinfo(np.uint16).max).astype(np.uint16)
+    return Packets(np.array(layout.board_ids, dtype=np.uint16)[board], time, sensors)
+
+
+def write_csv(path, packets: Packets):
+    """Write packets in the raw SmartFloor .csv format read by `smartfloor.read_packets`"""
+    rows = np.column_stack([packets.board_id, packets.time, packets.sensors])
+    np.savetxt(path, rows, fmt='%d', delimiter=',')
+
+
+def synthetic_csv(path, **kwargs) -> str:
+    """Generate a recording with `synthetic_packets(**kwargs)` and write it to `path`, which is returned"""
+    write_csv(path, synthetic_packets(**kwargs))
+    return path